@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+"""
+Decode throughput of the byte stream codec (devprop.can_bus.byte_stream) compared with the original
+per-frame implementation of SerialWrappedCanAdapter, which is reproduced below for reference.
+"""
+
+import argparse
+import struct
+import time
+
+from cobs import cobs
+
+from devprop.can_bus.adapter import Message
+from devprop.can_bus.byte_stream import FrameDecoder, encode_frames
+
+
+def legacy_crc16_kermit(data):
+    crc = 0
+
+    for i in range(len(data)):
+        crc ^= data[i]
+        for j in range(0,8):
+            if (crc & 1) > 0:
+                crc = (crc >> 1) ^ 0x8408
+            else:
+                crc = crc >> 1
+
+    return crc
+
+
+def legacy_decode(buffer: bytearray, data: bytes):
+    buffer += data
+    messages = []
+
+    while True:
+        terminator_pos = buffer.find(b"\x00")
+
+        if terminator_pos < 0:
+            break
+
+        encoded = buffer[0:terminator_pos]
+        buffer[:] = buffer[terminator_pos + 1:]
+
+        if len(encoded) == 0:
+            continue
+
+        try:
+            frame = cobs.decode(encoded)
+        except cobs.DecodeError:
+            continue
+
+        crc, = struct.unpack("<H", frame[-2:])
+
+        if crc != legacy_crc16_kermit(frame[:-2]):
+            continue
+
+        id, = struct.unpack("<I", frame[:4])
+        messages.append(Message(id=id, data=frame[4:-2]))
+
+    return messages
+
+
+def run(name, decode, chunks, count):
+    start = time.perf_counter()
+    start_cpu = time.process_time()
+
+    decoded = 0
+
+    for chunk in chunks:
+        decoded += len(decode(chunk))
+
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - start_cpu
+
+    assert decoded == count
+    print(f"{name:10s} {count / elapsed:10.0f} frames/s  {cpu / count * 1e6:6.2f} us/frame CPU")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", dest="count", type=int, default=200_000)
+    parser.add_argument("--chunk", type=int, default=4096, help="size of the chunks received from the port")
+    args = parser.parse_args()
+
+    messages = [Message(id=0x1EF00000 | i % 0x10000, data=bytes((i + j) % 256 for j in range(i % 9)))
+                for i in range(args.count)]
+    stream = encode_frames(messages)
+    chunks = [stream[i:i + args.chunk] for i in range(0, len(stream), args.chunk)]
+
+    buffer = bytearray()
+    run("legacy", lambda chunk: legacy_decode(buffer, chunk), chunks, args.count)
+    run("batch", FrameDecoder().feed, chunks, args.count)
+
+
+if __name__ == "__main__":
+    main()
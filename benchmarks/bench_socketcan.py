@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+"""
+Compare the native SocketCAN adapter with the python-can path: frames per second and CPU time per frame,
+for both transmission and reception.
+
+Requires a virtual CAN interface:
+
+    sudo modprobe vcan
+    sudo ip link add dev vcan0 type vcan
+    sudo ip link set vcan0 up
+"""
+
+import argparse
+import threading
+import time
+
+from devprop.can_bus.adapter import BusAdapter
+from devprop.can_bus.python_can_adapter import PythonCanAdapter
+from devprop.can_bus.socketcan_adapter import SocketCanAdapter
+from devprop.protocol_can_ext_v1.messages import make_filters, make_read_property_response
+from devprop.protocol_can_ext_v1.model import Direction
+
+
+def run(name: str, tx: BusAdapter, rx: BusAdapter, count: int, burst: int) -> None:
+    rx.set_filters(make_filters(Direction.DEVICE_TO_CLIENT))
+    messages = [make_read_property_response(i % 32, 1 + i % 200, bytes([i & 0xFF, 0])) for i in range(burst)]
+
+    received = 0
+
+    def receiver():
+        nonlocal received
+
+        # measure CPU time of the receiving thread only
+        start_cpu = time.thread_time()
+
+        try:
+            while received < count:
+                rx.receive(time.monotonic() + 1)
+                received += 1
+        except TimeoutError:
+            pass
+
+        receiver.cpu = time.thread_time() - start_cpu
+
+    thread = threading.Thread(target=receiver)
+    thread.start()
+
+    start = time.perf_counter()
+    start_cpu = time.thread_time()
+
+    for i in range(0, count, burst):
+        tx.send_many(messages[:count - i])
+
+    tx_cpu = time.thread_time() - start_cpu
+    thread.join()
+    elapsed = time.perf_counter() - start
+
+    print(f"{name:12s} {received:8d}/{count} frames  {received / elapsed:10.0f} frames/s  "
+          f"TX {tx_cpu / count * 1e6:6.2f} us/frame  RX {receiver.cpu / max(received, 1) * 1e6:6.2f} us/frame CPU")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--interface", default="vcan0")
+    parser.add_argument("-n", dest="count", type=int, default=100_000)
+    parser.add_argument("--burst", type=int, default=32)
+    args = parser.parse_args()
+
+    run("socketcan", SocketCanAdapter(args.interface), SocketCanAdapter(args.interface), args.count, args.burst)
+
+    run("python-can",
+        PythonCanAdapter(interface="socketcan", channel=args.interface),
+        PythonCanAdapter(interface="socketcan", channel=args.interface),
+        args.count, args.burst)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,7 @@ from enum import IntEnum, Enum
 import threading
 import logging
 import sys
-from typing import Optional, Type, TypeVar
+from typing import Any, Callable, Optional, Type, TypeVar
 import queue
 
 class CMD(Enum):
@@ -50,6 +50,12 @@ class DTH(Enum):
 	def has_value(cls, value : int) -> bool:
 		return value in cls._value2member_map_
 
+# raw frame type codes & fixed parts of CAN message events, for the fast parsing path
+_DTH_MESSAGE_STD_ID = DTH.MESSAGE_STD_ID.value[0]
+_DTH_MESSAGE_EXT_ID = DTH.MESSAGE_EXT_ID.value[0]
+_CAN_STD_HEADER = struct.Struct('<BIH')	# timestamp (low 8 bits), timestamp (high 32 bits), SID
+_CAN_EXT_HEADER = struct.Struct('<BII')	# timestamp (low 8 bits), timestamp (high 32 bits), EID
+
 class PROTOCOL:
 	VERSION = 3
 
@@ -303,8 +309,10 @@ class Ocarina:
 	ser : serial.Serial
 	eventListener : threading.Thread
 	eventQueue : queue.Queue
+	canMsgFactory : Optional[Callable[[IDTYPE, int, bytes, int], Any]]
 
-	def __init__(self, port : str, maxRxQueueSize : Optional[int] = None, logger : logging.Logger = None) -> None:
+	def __init__(self, port : str, maxRxQueueSize : Optional[int] = None, logger : logging.Logger = None,
+			canMsgFactory : Optional[Callable[[IDTYPE, int, bytes, int], Any]] = None) -> None:
 		"""
 		Ocarina API class
 
@@ -314,6 +322,9 @@ class Ocarina:
 		:type maxRxQueueSize: Optional[int], optional
 		:param logger: parent logger instance to get child logger from, defaults to None (gets child logger from root logger)
 		:type logger: logging.Logger, optional
+		:param canMsgFactory: called as canMsgFactory(idType, id, data, timestamp) for every received CAN message;
+			its result is put into eventQueue instead of a CanMsgEvent (or nothing, if it returns None), defaults to None
+		:type canMsgFactory: Optional[Callable[[IDTYPE, int, bytes, int], Any]], optional
 		"""
 		self.log = (logger if logger else logging.getLogger()).getChild("OCA")
 		self.ser = None # because when next line fails, self.ser would not exist and we would have troubles in destructor
@@ -323,6 +334,7 @@ class Ocarina:
 		# flush RX buffers
 		self.nop()#hack to trigger potential input buffer autoflush when there is some garbage
 		self._connect()
+		self.canMsgFactory = canMsgFactory
 		self.eventQueue = queue.Queue()
 		self.eventListener = threading.Thread(target=self._event_listener, daemon=True)
 		self.eventListener.start()
@@ -380,80 +392,132 @@ class Ocarina:
 	def _event_listener(self):
 		"""
 		Internal function extracting event from data and putting them into eventQueue. Runs in separate thread.
+
+		Data is read from the port in bulk, and CAN message frames (by far the most frequent under bus load)
+		are parsed in place, without intermediate Payload/CanMsgID objects.
 		"""
 		elog = self.log.getChild("EVTRX")
 		elog.info("event listener started")
 
+		buffer = bytearray()
+
 		# TODO: decide, how to handle queue overflow, right now, overflow is not even caught and is propagater further
 		while(True):
-			frameType = self._read(1)
-			if len(frameType)==0:
+			chunk = self._read(max(1, self.ser.in_waiting))
+			if len(chunk)==0:
 				elog.warning("communication timeouted, at least heartbeats should come...")
 				continue
 
-			frameLength = struct.unpack('B', self._read(1))[0]
-			payload = Payload(self._read(frameLength))
+			buffer += chunk
+			consumed = self._parse_events(buffer, elog)
+			del buffer[:consumed]
 
-			if DTH.has_value(frameType):
-				frameType = DTH(frameType)
-				elog.debug(f"got event {frameType} with payload length {payload.length()} bytes")
-			else:
-				elog.warning(f"unknown event. {frameType} with payload length {payload.length()} bytes, protocol changed?")
-				continue
+	def _parse_events(self, buffer : bytearray, elog : logging.Logger) -> int:
+		"""
+		Internal, parses all complete events in buffer.
 
-			if frameType == DTH.INTERFACE_ID:
-				self.eventQueue.put_nowait(IfaceIdEvent(payload.pop().decode()))
+		:return: number of bytes consumed
+		"""
+		view = memoryview(buffer)
+		pos = 0
+		end = len(buffer)
 
-			elif frameType == DTH.MESSAGE_STD_ID:
-				ts = payload.popu8() + (payload.popu32()<<8)#in us
-				sid = CanMsgID(payload.popu16(), IDTYPE.STD)
-				data = payload.pop()
-				self.eventQueue.put_nowait(CanMsgEvent(sid, data, ts))
+		try:
+			while end - pos >= 2:
+				frameType = buffer[pos]
+				frameLength = buffer[pos + 1]
 
-			elif frameType == DTH.MESSAGE_EXT_ID:
-				ts = payload.popu8() + (payload.popu32()<<8)#in us
-				eid = CanMsgID(payload.popu32(), IDTYPE.EXT)
-				data = payload.pop()
-				self.eventQueue.put_nowait(CanMsgEvent(eid, data, ts))
-			
-			elif frameType == DTH.ERROR_ON_CAN:
-				ts = payload.popu8() + (payload.popu32()<<8)#in us
-				TEC = payload.popu8()
-				REC = payload.popu8()
-				mixed = payload.popu8()
-				state = CANBUSSTATE(mixed&0xF)
-				eType = CANERROR(mixed>>4).name
-				self.eventQueue.put_nowait(CANErrorEvent(TEC, REC, state, eType, ts))
-
-			elif frameType == DTH.ERROR_FLAGS:
-				value = payload.popu32()
-				self.eventQueue.put_nowait(ErrorFlagsEvent(value))
-			
-			elif frameType == DTH.COUNTERS:
-				rxed = payload.popu32()
-				txed = payload.popu32()
-				self.eventQueue.put_nowait(CountersEvent(rxed, txed))
+				if end - pos < 2 + frameLength:
+					break
 
-			elif frameType == DTH.HEARTBEAT:
-				HeartbeatEvent()
-			
-			elif frameType == DTH.CONFIG:
-				raw = payload.popu8()
-				self.eventQueue.put_nowait(ConfigEvent(bitrate = BITRATE.fromIdentifier(raw & 0xF), silent = bool(raw & (1<<4)), loopback = bool(raw & (1<<5)), forward = bool(raw & (1<<6))))
-			
-			elif frameType == DTH.VERSION:
-				protocol = payload.popu8()
-				sw = payload.popu8()
-				hw = payload.popu8()
-				hwRevision = payload.popu8()
-				self.eventQueue.put_nowait(VersionEvent(protocol, sw, hw, hwRevision))
-
-			else:
-				elog.warning(f"unhandled event. {frameType} with payload length {payload.len()} bytes")
-			
-			if not payload.isEmpty():
-				elog.warning(f"payload of event {frameType} was not fully consumed, protocol changed?") #some part of response was not read
-			
+				start = pos + 2
+				pos = start + frameLength
+
+				if frameType == _DTH_MESSAGE_EXT_ID and frameLength >= _CAN_EXT_HEADER.size:
+					ts_low, ts_high, eid = _CAN_EXT_HEADER.unpack_from(view, start)
+					self._put_can_message(IDTYPE.EXT, eid, bytes(view[start + _CAN_EXT_HEADER.size:pos]), ts_low + (ts_high << 8))
+				elif frameType == _DTH_MESSAGE_STD_ID and frameLength >= _CAN_STD_HEADER.size:
+					ts_low, ts_high, sid = _CAN_STD_HEADER.unpack_from(view, start)
+					self._put_can_message(IDTYPE.STD, sid, bytes(view[start + _CAN_STD_HEADER.size:pos]), ts_low + (ts_high << 8))
+				else:
+					self._parse_event(bytes([frameType]), Payload(bytes(view[start:pos])), elog)
+		finally:
+			view.release()
+
+		return pos
+
+	def _put_can_message(self, idType : IDTYPE, id : int, data : bytes, timestamp : int) -> None:
+		if self.canMsgFactory is not None:
+			msg = self.canMsgFactory(idType, id, data, timestamp)
+			if msg is not None:
+				self.eventQueue.put_nowait(msg)
+		else:
+			self.eventQueue.put_nowait(CanMsgEvent(CanMsgID(id, idType), data, timestamp))
+
+	def _parse_event(self, frameType : bytes, payload : Payload, elog : logging.Logger) -> None:
+		"""
+		Internal, decodes a single event and puts it into eventQueue.
+		"""
+		if DTH.has_value(frameType):
+			frameType = DTH(frameType)
+			elog.debug(f"got event {frameType} with payload length {payload.length()} bytes")
+		else:
+			elog.warning(f"unknown event. {frameType} with payload length {payload.length()} bytes, protocol changed?")
+			return
+
+		if frameType == DTH.INTERFACE_ID:
+			self.eventQueue.put_nowait(IfaceIdEvent(payload.pop().decode()))
+
+		elif frameType == DTH.MESSAGE_STD_ID:
+			ts = payload.popu8() + (payload.popu32()<<8)#in us
+			sid = CanMsgID(payload.popu16(), IDTYPE.STD)
+			data = payload.pop()
+			self.eventQueue.put_nowait(CanMsgEvent(sid, data, ts))
+
+		elif frameType == DTH.MESSAGE_EXT_ID:
+			ts = payload.popu8() + (payload.popu32()<<8)#in us
+			eid = CanMsgID(payload.popu32(), IDTYPE.EXT)
+			data = payload.pop()
+			self.eventQueue.put_nowait(CanMsgEvent(eid, data, ts))
+		
+		elif frameType == DTH.ERROR_ON_CAN:
+			ts = payload.popu8() + (payload.popu32()<<8)#in us
+			TEC = payload.popu8()
+			REC = payload.popu8()
+			mixed = payload.popu8()
+			state = CANBUSSTATE(mixed&0xF)
+			eType = CANERROR(mixed>>4).name
+			self.eventQueue.put_nowait(CANErrorEvent(TEC, REC, state, eType, ts))
+
+		elif frameType == DTH.ERROR_FLAGS:
+			value = payload.popu32()
+			self.eventQueue.put_nowait(ErrorFlagsEvent(value))
+		
+		elif frameType == DTH.COUNTERS:
+			rxed = payload.popu32()
+			txed = payload.popu32()
+			self.eventQueue.put_nowait(CountersEvent(rxed, txed))
+
+		elif frameType == DTH.HEARTBEAT:
+			HeartbeatEvent()
+		
+		elif frameType == DTH.CONFIG:
+			raw = payload.popu8()
+			self.eventQueue.put_nowait(ConfigEvent(bitrate = BITRATE.fromIdentifier(raw & 0xF), silent = bool(raw & (1<<4)), loopback = bool(raw & (1<<5)), forward = bool(raw & (1<<6))))
+		
+		elif frameType == DTH.VERSION:
+			protocol = payload.popu8()
+			sw = payload.popu8()
+			hw = payload.popu8()
+			hwRevision = payload.popu8()
+			self.eventQueue.put_nowait(VersionEvent(protocol, sw, hw, hwRevision))
+
+		else:
+			elog.warning(f"unhandled event. {frameType} with payload length {payload.length()} bytes")
+		
+		if not payload.isEmpty():
+			elog.warning(f"payload of event {frameType} was not fully consumed, protocol changed?") #some part of response was not read
+		
 
 	def read_event(self, timeout : Optional[float] = None) -> Event:
 		"""
@@ -522,7 +586,7 @@ class Ocarina:
 		if not isinstance(sid, int):
 			raise TypeError("sid must have integer type")
 		if sid >= 2**11:
-			raise ValueError("sid must be in range <{0:4d}[{0:3X}];{1:4d}[{1:3X}]>",format(0, 2**11-1))
+			raise ValueError("sid must be in range <{0:4d}[{0:3X}];{1:4d}[{1:3X}]>".format(0, 2**11 - 1))
 		if len(data) > 8:
 			raise ValueError("data too long")
 		self._write_command(CMD.SEND_MESSAGE_STD_ID, \
@@ -540,14 +604,36 @@ class Ocarina:
 		:raises ValueError: if eid >= 2^29
 		:raises ValueError: if len(data) > 8
 		"""
+		self._check_message_ext(eid, data)
+		self._write_command(CMD.SEND_MESSAGE_EXT_ID, \
+		struct.pack('I', eid) + bytes(data))
+
+	@staticmethod
+	def _check_message_ext(eid : int, data):
 		if not isinstance(eid, int):
 			raise TypeError("eid must have integer type")
 		if eid >= 2**29:
-			raise ValueError("eid must be in range <{0:4d}[{0:3X}];{1:4d}[{1:3X}]>",format(0, 2**29-1))
+			raise ValueError("eid must be in range <{0:4d}[{0:3X}];{1:4d}[{1:3X}]>".format(0, 2**29 - 1))
 		if len(data) > 8:
 			raise ValueError("data too long")
-		self._write_command(CMD.SEND_MESSAGE_EXT_ID, \
-		struct.pack('I', eid) + bytes(data))
+
+	def send_messages_ext(self, messages):
+		"""
+		Send a burst of EXT ID messages to CAN bus with a single write to the port
+		
+		:param messages: messages to send
+		:type messages: iterable of (eid, data) tuples, see send_message_ext
+		:raises TypeError: if any eid is not integer
+		:raises ValueError: if any eid >= 2^29 or any data longer than 8 bytes
+		"""
+		buffer = bytearray()
+		for eid, data in messages:
+			self._check_message_ext(eid, data)
+			payload = struct.pack('I', eid) + bytes(data)
+			buffer += CMD.SEND_MESSAGE_EXT_ID.value + bytes([len(payload)]) + payload
+		if buffer:
+			written = self._write(bytes(buffer))
+			assert(written == len(buffer))
 
 	def query_error_flags(self):
 		"""
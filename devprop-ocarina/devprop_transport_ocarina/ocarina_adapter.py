@@ -1,9 +1,10 @@
-import time
 import logging
-from typing import Optional
+import queue
+import time
+from typing import Optional, Sequence
 
 from devprop.can_bus.adapter import BusAdapter, Message
-from devprop.protocol_can_ext_v1.messages import stringify
+from devprop.can_bus.trace import RX, TX
 
 from . import ocarina
 
@@ -12,7 +13,7 @@ logger = logging.getLogger(__name__)
 
 class OcarinaAdapter(BusAdapter):
     def __init__(self, port: str):
-        self._ocarina = ocarina.Ocarina(port)
+        self._ocarina = ocarina.Ocarina(port, canMsgFactory=self._make_message)
 
         # Not clear if it is our business to set these...
         self._ocarina.set_bitrate_auto()
@@ -21,27 +22,38 @@ class OcarinaAdapter(BusAdapter):
 
         self._ocarina.set_message_forwarding(True)
 
+    def _make_message(self, id_type: ocarina.IDTYPE, id: int, data: bytes, timestamp: int) -> Optional[Message]:
+        # called from the Ocarina event listener thread for every received frame;
+        # only extended frames passing the filters are of interest, the rest is dropped before reaching the queue
+        if id_type is ocarina.IDTYPE.EXT and self._accepts(id):
+            return Message(id=id, data=data)
+        else:
+            return None
+
     def receive(self, deadline: Optional[float] = None) -> Message:
         while True:
-            if deadline is not None:
-                timeout = deadline - time.monotonic()
+            # once the deadline has passed, an event that is already queued is still taken
+            timeout = max(deadline - time.monotonic(), 0) if deadline is not None else None
 
-                if timeout < 0:
-                    raise TimeoutError()
-            else:
-                timeout = None
+            try:
+                event = self._ocarina.read_event(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError() from None
 
-            event = self._ocarina.read_event(timeout=timeout)
-
-            if isinstance(event, ocarina.CanMsgEvent) and event.id.type is ocarina.IDTYPE.EXT:
-                msg = Message(id=event.id.value, data=event.data)
+            if isinstance(event, Message):
+                msg = event
                 break
 
-        logger.debug("Rx frame %08xh [%-23s] %s", msg.id, msg.data.hex(" "), stringify(msg))
+        if self.tracer is not None:
+            self.tracer.record(RX, msg)
 
         return msg
 
     def send(self, msg: Message):
-        logger.debug("Tx frame %08xh [%-23s] %s", msg.id, msg.data.hex(" "), stringify(msg))
+        self.send_many([msg])
+
+    def send_many(self, messages: Sequence[Message]) -> None:
+        if self.tracer is not None:
+            self.tracer.record_many(TX, messages)
 
-        self._ocarina.send_message_ext(msg.id, msg.data)
+        self._ocarina.send_messages_ext([(msg.id, msg.data) for msg in messages])
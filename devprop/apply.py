@@ -0,0 +1,137 @@
+"""
+Applying a set of property values (e.g. a calibration profile) with as few bus writes as possible:
+
+1. read the current values of all readable properties,
+2. write only those which differ (at the resolution of the property, i.e. after encoding to raw values),
+3. read back the written values to verify them.
+"""
+
+from dataclasses import dataclass
+from enum import Enum
+import logging
+from typing import List, Optional, Tuple
+
+from .client import Node
+from .model import Property
+from .property import decode_value, encode_value
+
+logger = logging.getLogger(__name__)
+
+
+class ApplyStatus(Enum):
+    UNCHANGED = "unchanged"
+    WRITTEN = "written"
+    NOT_WRITABLE = "not writable"
+    OUT_OF_RANGE = "out of range"
+    TIMEOUT = "timeout"
+    ERROR = "error"
+    VERIFY_FAILED = "verify failed"
+
+
+@dataclass
+class ApplyResult:
+    node: Node
+    property: Property
+    value: float
+    status: ApplyStatus
+    previous_value: Optional[float] = None
+    final_value: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status in {ApplyStatus.UNCHANGED, ApplyStatus.WRITTEN}
+
+
+def _fail(result: ApplyResult, error: Exception, stage: str) -> None:
+    result.status = ApplyStatus.TIMEOUT if isinstance(error, TimeoutError) else ApplyStatus.ERROR
+    result.error = f"{stage}: {error}" if str(error) else stage
+
+
+def apply_properties(client, items: List[Tuple[Node, Property, float]], timeout_sec: float,
+                     verify: bool = True) -> List[ApplyResult]:
+    """
+    :param client: Client or DaemonClient
+    :param items: (node, property, physical value) to apply
+    :return: outcome for each item
+    """
+    results = [ApplyResult(node, prop, value, ApplyStatus.WRITTEN) for node, prop, value in items]
+    encoded: List[Optional[bytes]] = [None] * len(items)
+
+    for i, result in enumerate(results):
+        if not result.property.writable:
+            result.status = ApplyStatus.NOT_WRITABLE
+            continue
+
+        try:
+            encoded[i] = encode_value(result.property, result.value)
+        except Exception as ex:
+            result.status = ApplyStatus.OUT_OF_RANGE
+            result.error = str(ex)
+
+    def pending(readable_only: bool) -> List[int]:
+        return [i for i, result in enumerate(results)
+                if result.status is ApplyStatus.WRITTEN and (result.property.readable or not readable_only)]
+
+    # 1. current values; a failed read is not fatal, the property is simply written
+    to_read = pending(readable_only=True)
+    reads = client.execute_queries([(results[i].node, results[i].property, None) for i in to_read],
+                                   timeout_sec=timeout_sec)
+
+    for i, (value, error) in zip(to_read, reads):
+        if error is not None:
+            logger.warning("%s: could not read current value: %s", results[i].node.get_property_path(results[i].property),
+                           error)
+            continue
+
+        try:
+            results[i].previous_value = decode_value(results[i].property, value)
+        except Exception as ex:
+            _fail(results[i], ex, f"read: invalid value [{value.hex(' ')}]")
+            continue
+
+        if value == encoded[i]:
+            results[i].status = ApplyStatus.UNCHANGED
+            results[i].final_value = results[i].previous_value
+
+    # 2. writes
+    to_write = pending(readable_only=False)
+    writes = client.execute_queries([(results[i].node, results[i].property, encoded[i]) for i in to_write],
+                                    timeout_sec=timeout_sec)
+
+    for i, (value, error) in zip(to_write, writes):
+        if error is not None:
+            _fail(results[i], error, "write")
+            continue
+
+        try:
+            results[i].final_value = decode_value(results[i].property, value)
+        except Exception as ex:
+            _fail(results[i], ex, f"write: invalid value [{value.hex(' ')}]")
+            continue
+
+        # the device responds with the value in effect, which differs if it clamped or rejected ours
+        if value != encoded[i]:
+            results[i].status = ApplyStatus.VERIFY_FAILED
+
+    # 3. read-back
+    if verify:
+        to_verify = pending(readable_only=True)
+        reads = client.execute_queries([(results[i].node, results[i].property, None) for i in to_verify],
+                                       timeout_sec=timeout_sec)
+
+        for i, (value, error) in zip(to_verify, reads):
+            if error is not None:
+                _fail(results[i], error, "verify")
+                continue
+
+            try:
+                results[i].final_value = decode_value(results[i].property, value)
+            except Exception as ex:
+                _fail(results[i], ex, f"verify: invalid value [{value.hex(' ')}]")
+                continue
+
+            if value != encoded[i]:
+                results[i].status = ApplyStatus.VERIFY_FAILED
+
+    return results
@@ -0,0 +1,133 @@
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .model import Property
+from .protocol_can_ext_v1.model import NodeId
+
+logger = logging.getLogger(__name__)
+
+
+# callback(node_id, property, raw_value)
+ChangeCallback = Callable[[NodeId, Property, bytes], None]
+
+CacheKey = Tuple[NodeId, int]
+
+
+@dataclass
+class CacheEntry:
+    value: bytes
+    updated_at: float
+
+
+@dataclass
+class _Subscription:
+    callback: ChangeCallback
+    node_id: Optional[NodeId]
+    property_index: Optional[int]
+
+    def wants(self, node_id: NodeId, property_index: int) -> bool:
+        return ((self.node_id is None or self.node_id == node_id) and
+                (self.property_index is None or self.property_index == property_index))
+
+
+class PropertyCache:
+    """
+    Client-side cache of raw property values, keyed by (node_id, property_index).
+
+    A cached value is served for `ttl_sec` after it was last read or written. Properties with a constant implementation
+    (`implementation: type: const` in the YAML manifest) never expire; note that this attribute is only known when the
+    manifest was loaded from YAML, as the manifests downloaded from devices do not carry it.
+    """
+
+    def __init__(self, default_ttl_sec: float = 0.0):
+        self.default_ttl_sec = default_ttl_sec
+
+        self._entries: Dict[CacheKey, CacheEntry] = {}
+        self._ttl_overrides: Dict[CacheKey, float] = {}
+        self._subscriptions: List[_Subscription] = []
+        self._lock = threading.Lock()
+
+    def set_ttl(self, node_id: NodeId, property_index: int, ttl_sec: Optional[float]) -> None:
+        """
+        Override the TTL of a single property (`math.inf` = never expires, None = back to default).
+        """
+        with self._lock:
+            if ttl_sec is None:
+                self._ttl_overrides.pop((node_id, property_index), None)
+            else:
+                self._ttl_overrides[(node_id, property_index)] = ttl_sec
+
+    def get_ttl(self, node_id: NodeId, property: Property) -> float:
+        try:
+            return self._ttl_overrides[(node_id, property.index)]
+        except KeyError:
+            pass
+
+        if property.implementation_type == "const":
+            return math.inf
+
+        return self.default_ttl_sec
+
+    def lookup(self, node_id: NodeId, property: Property) -> Optional[bytes]:
+        """
+        :return: the cached raw value if still valid, otherwise None
+        """
+        entry = self._entries.get((node_id, property.index))
+
+        if entry is None or time.monotonic() - entry.updated_at >= self.get_ttl(node_id, property):
+            return None
+
+        return entry.value
+
+    def update(self, node_id: NodeId, property: Property, value: bytes) -> None:
+        key = (node_id, property.index)
+
+        with self._lock:
+            previous = self._entries.get(key)
+            self._entries[key] = CacheEntry(value, time.monotonic())
+
+            if previous is not None and previous.value == value:
+                return
+
+            callbacks = [subscription.callback for subscription in self._subscriptions
+                         if subscription.wants(node_id, property.index)]
+
+        # called without the lock held, so that callbacks may use the cache (or the client) themselves
+        for callback in callbacks:
+            try:
+                callback(node_id, property, value)
+            except Exception as ex:
+                logger.exception(ex)
+
+    def invalidate(self, node_id: Optional[NodeId] = None, property_index: Optional[int] = None) -> None:
+        with self._lock:
+            if node_id is None and property_index is None:
+                self._entries.clear()
+                return
+
+            for key in list(self._entries.keys()):
+                if (node_id is None or key[0] == node_id) and (property_index is None or key[1] == property_index):
+                    del self._entries[key]
+
+    def subscribe(self, callback: ChangeCallback, node_id: Optional[NodeId] = None,
+                  property_index: Optional[int] = None) -> object:
+        """
+        Register a callback for changes of cached values (including the first time a value is cached).
+        `node_id` and `property_index` optionally narrow down the properties of interest.
+
+        :return: handle to pass to `unsubscribe`
+        """
+        subscription = _Subscription(callback, node_id, property_index)
+
+        with self._lock:
+            self._subscriptions.append(subscription)
+
+        return subscription
+
+    def unsubscribe(self, handle: object) -> None:
+        with self._lock:
+            self._subscriptions.remove(handle)
@@ -1,7 +1,12 @@
+import heapq
+import itertools
 import time
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence, TYPE_CHECKING, Union
+
+if TYPE_CHECKING:
+    from .trace import FrameTracer
 
 
 @dataclass
@@ -10,15 +15,141 @@ class Message:
     data: bytes
 
 
+@dataclass
+class FrameFilter:
+    """
+    Acceptance filter for extended frames: a frame passes if `(frame.id & mask) == (id & mask)`.
+    """
+
+    id: int
+    mask: int
+
+    def accepts(self, id: int) -> bool:
+        return (id & self.mask) == (self.id & self.mask)
+
+
+class TransactionObserver:
+    """
+    Receives timestamped events (time.monotonic()) for all transactions executed on a bus; see `BusAdapter.observer`.
+    Called from the thread driving the transaction, or from the receive thread of a hub, so implementations must be
+    thread-safe.
+    """
+
+    def transaction_started(self, sm: "StateMachine", timestamp: float) -> None:
+        pass
+
+    def frame_sent(self, sm: "StateMachine", msg: Message, timestamp: float) -> None:
+        pass
+
+    def frame_received(self, sm: "StateMachine", msg: Message, timestamp: float) -> None:
+        pass
+
+    def transaction_finished(self, sm: "StateMachine", error: Optional[Exception], timestamp: float) -> None:
+        pass
+
+
 class BusAdapter(ABC):
+    _filters: Optional[List[FrameFilter]] = None
+
+    # opt-in instrumentation of transactions (e.g. profiler.Profiler); None costs nothing but an attribute check
+    observer: Optional[TransactionObserver] = None
+
+    # opt-in tracing of the frames sent & received (see trace.FrameTracer), likewise free while None
+    tracer: Optional["FrameTracer"] = None
+
+    # frame received by the default implementation of `wait`, to be returned by the next `poll`
+    _lookahead: Optional[Message] = None
+
     @abstractmethod
     def receive(self, deadline: Optional[float] = None) -> Message:
+        """
+        Return the next received frame, waiting for it until `deadline` (time.monotonic(); None = indefinitely).
+        Frames that have already arrived are returned even if the deadline has passed.
+
+        :raises TimeoutError: if no frame is available by the deadline
+        """
         ...
 
+    def poll(self) -> Optional[Message]:
+        """
+        Return a frame that has already been received, without waiting; None if there is none.
+
+        Adapters with a receive buffer override `poll` & `wait` natively (and then implement `receive` on top of them
+        with `_receive_by_polling`); the defaults are built on `receive`.
+        """
+        if self._lookahead is not None:
+            msg, self._lookahead = self._lookahead, None
+            return msg
+
+        try:
+            return self.receive(deadline=time.monotonic())
+        except TimeoutError:
+            return None
+
+    def wait(self, until: Optional[float]) -> bool:
+        """
+        Block until a frame can be obtained by `poll`, or until `until` (time.monotonic(); None = indefinitely).
+
+        :return: whether a frame is available (a True return may be spurious, i.e. `poll` may still return None)
+        """
+        if self._lookahead is not None:
+            return True
+
+        try:
+            self._lookahead = self.receive(deadline=until)
+        except TimeoutError:
+            return False
+
+        return True
+
+    def _receive_by_polling(self, deadline: Optional[float]) -> Message:
+        while True:
+            msg = self.poll()
+
+            if msg is not None:
+                return msg
+
+            if not self.wait(deadline):
+                raise TimeoutError()
+
     @abstractmethod
     def send(self, msg: Message) -> None:
         ...
 
+    def send_many(self, messages: Sequence[Message]) -> None:
+        """
+        Send a burst of frames in order. Adapters override this to coalesce the burst into as few writes as possible;
+        implementations block (rather than drop frames) while the transmit queue is full.
+        """
+        for msg in messages:
+            self.send(msg)
+
+    def set_filters(self, filters: Optional[List[FrameFilter]]) -> None:
+        """
+        Only receive frames passing at least one of `filters` (None = receive everything).
+
+        Adapters should push the filters down to the hardware/kernel where possible. The default implementation
+        only records them; adapters without native filtering call `_accepts` to drop frames as early as possible.
+        """
+        self._filters = filters
+
+    def _accepts(self, id: int) -> bool:
+        return self._filters is None or any(filter.accepts(id) for filter in self._filters)
+
+    def execute(self, sm: "StateMachine", deadline: float) -> None:
+        # Adapters shared between multiple clients (see hub.BusHub) override this to route responses
+        run_state_machine(self, sm, deadline)
+
+    def execute_many(self, sms: Sequence["StateMachine"],
+                     deadline: Union[float, Sequence[float]]) -> List[Optional[Exception]]:
+        """
+        Run several transactions concurrently. Transactions with equal keys must not be passed together.
+
+        :param deadline: common deadline, or one deadline per state machine
+        :return: for each state machine, None if it finished successfully, otherwise the exception it failed with
+        """
+        return run_state_machines(self, sms, deadline)
+
 
 class StateMachine(ABC):
     def is_finished(self) -> bool:
@@ -30,21 +161,219 @@ class StateMachine(ABC):
     def frame_received(self, msg: Message) -> None:
         raise NotImplementedError()
 
+    def matches(self, msg: Message) -> bool:
+        """
+        Whether `msg` might be a response to this transaction. Only matching frames are passed to `frame_received`.
+        """
+        return True
+
+    def get_key(self) -> Optional[Hashable]:
+        """
+        Transactions with equal keys (e.g., the same node & property) compete for the same responses
+        and must not be executed concurrently. None means no restriction.
+        """
+        return None
+
+    def get_keys(self) -> Iterable[Hashable]:
+        """
+        All keys of the transaction, for transactions that span several of them (e.g. a batch of properties).
+        """
+        key = self.get_key()
+        return [] if key is None else [key]
+
+    def get_retry_time(self) -> Optional[float]:
+        """
+        Time (time.monotonic()) at which `get_frame_to_send` should be called again even if nothing has been received
+        in the meantime, e.g. to repeat requests whose responses were lost. None = only after receiving a frame.
+        """
+        return None
+
+
+class DeadlineQueue:
+    """
+    Min-heap of (deadline, item), from which the items whose deadline has passed are taken in order.
+    Items can be cancelled (e.g. when their transaction completes) in O(1); cancelled entries are skipped lazily.
+    """
+
+    def __init__(self):
+        self._heap: List[list] = []
+        self._entries: Dict[Any, list] = {}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self._entries
+
+    def push(self, deadline: float, item: Hashable) -> None:
+        self.cancel(item)
+
+        # the counter breaks ties, so that items never need to be comparable
+        entry = [deadline, next(self._counter), item, True]
+        self._entries[item] = entry
+        heapq.heappush(self._heap, entry)
+
+    def cancel(self, item: Hashable) -> None:
+        entry = self._entries.pop(item, None)
+
+        if entry is not None:
+            entry[-1] = False
+
+    def next_deadline(self) -> Optional[float]:
+        while self._heap and not self._heap[0][-1]:
+            heapq.heappop(self._heap)
+
+        return self._heap[0][0] if self._heap else None
+
+    def pop_expired(self, now: float) -> List[Any]:
+        expired = []
+
+        while True:
+            deadline = self.next_deadline()
+
+            if deadline is None or deadline > now:
+                return expired
+
+            _, _, item, _ = heapq.heappop(self._heap)
+            del self._entries[item]
+            expired.append(item)
+
+
+def run_state_machine(bus: BusAdapter, sm: StateMachine, deadline: float) -> None:
+    error, = run_state_machines(bus, [sm], deadline)
+
+    if error is not None:
+        raise error
+
+
+def execute_state_machine(bus: BusAdapter, sm: StateMachine, deadline: float) -> None:
+    bus.execute(sm, deadline)
+
+
+def run_state_machines(bus: BusAdapter, sms: Sequence[StateMachine],
+                       deadline: Union[float, Sequence[float]]) -> List[Optional[Exception]]:
+    """
+    Run transactions concurrently, each until its own deadline, with a single wait on the bus at a time.
+
+    Every received frame is dispatched before any deadline is checked, so that a response which has already arrived
+    is never discarded as a timeout.
+    """
+    errors: List[Optional[Exception]] = [None] * len(sms)
+    deadlines = DeadlineQueue()
+    active = set()
+    observer = bus.observer
+
+    for i, sm in enumerate(sms):
+        if not sm.is_finished():
+            deadlines.push(deadline if isinstance(deadline, (int, float)) else deadline[i], i)
+            active.add(i)
+
+            if observer is not None:
+                observer.transaction_started(sm, time.monotonic())
+
+    # state machines which may have frames to send: at the start, after having received something, and at their
+    # retry time
+    ready = set(active)
+    retries = DeadlineQueue()
+    sent_by: List[StateMachine] = []
+
+    def retire(i: int, error: Optional[Exception] = None) -> None:
+        errors[i] = error
+        active.discard(i)
+        deadlines.cancel(i)
+        retries.cancel(i)
+
+        if observer is not None:
+            observer.transaction_finished(sms[i], error, time.monotonic())
+
+    while active:
+        frames_to_send = []
+
+        for i in sorted(ready & active):
+            if sms[i].is_finished():
+                retire(i)
+                continue
+
+            while True:
+                frame_to_send = sms[i].get_frame_to_send()
+
+                if frame_to_send is None:
+                    break
+
+                frames_to_send.append(frame_to_send)
+
+                if observer is not None:
+                    sent_by.append(sms[i])
+
+            retry_time = sms[i].get_retry_time()
+
+            if retry_time is not None:
+                retries.push(retry_time, i)
+            else:
+                retries.cancel(i)
+
+        ready.clear()
+
+        if frames_to_send:
+            if observer is not None:
+                now = time.monotonic()
+
+                for sm, msg in zip(sent_by, frames_to_send):
+                    observer.frame_sent(sm, msg, now)
+
+                sent_by.clear()
+
+            bus.send_many(frames_to_send)
+
+        # take everything that is already there before looking at the clock
+        received = False
+
+        while active:
+            msg = bus.poll()
+
+            if msg is None:
+                break
+
+            received = True
+
+            for i in list(active):
+                try:
+                    if not sms[i].matches(msg):
+                        continue
+                except Exception as ex:
+                    retire(i, ex)
+                    continue
+
+                if observer is not None:
+                    observer.frame_received(sms[i], msg, time.monotonic())
+
+                try:
+                    sms[i].frame_received(msg)
+                except Exception as ex:
+                    retire(i, ex)
+                    continue
+
+                if sms[i].is_finished():
+                    retire(i)
+                else:
+                    ready.add(i)
+
+        now = time.monotonic()
 
-def execute_state_machine(bus, sm: StateMachine, deadline: float) -> None:
-    while not sm.is_finished():
-        if time.monotonic() > deadline:
-            raise TimeoutError()
+        for i in deadlines.pop_expired(now):
+            retire(i, TimeoutError())
 
-        frame_to_send = sm.get_frame_to_send()
+        ready.update(retries.pop_expired(now))
 
-        if frame_to_send is not None:
-            bus.send(frame_to_send)
+        # the state machines that received something may have more to send
+        if active and not received and not ready:
+            wakeup = deadlines.next_deadline()
+            next_retry = retries.next_deadline()
 
-        # It's not that it would be fundamentally impossible to burst multiple frames at once,
-        # but for now there is no need and we don't handle it well
-        assert sm.get_frame_to_send() is None
+            if next_retry is not None:
+                wakeup = min(wakeup, next_retry)
 
-        msg = bus.receive(deadline)
+            bus.wait(wakeup)
 
-        sm.frame_received(msg)
+    return errors
@@ -0,0 +1,188 @@
+"""
+CAN frames wrapped in a byte stream (see doc/byte_stream_wrapping.md), independent of the medium carrying it.
+"""
+
+import collections
+import logging
+import struct
+import time
+from abc import abstractmethod
+from typing import Deque, Iterable, List, Optional, Sequence
+
+from cobs import cobs
+
+from .adapter import BusAdapter, Message
+from .trace import RX, TX
+
+logger = logging.getLogger(__name__)
+
+
+_ID = struct.Struct("<I")
+_CRC = struct.Struct("<H")
+
+# Longer runs of data without a delimiter cannot be valid frames and are discarded
+MAX_ENCODED_FRAME_LENGTH = 1024
+
+
+def _make_crc16_kermit_table():
+    table = []
+
+    for byte in range(256):
+        crc = byte
+        for j in range(0,8):
+            if (crc & 1) > 0:
+                crc = (crc >> 1) ^ 0x8408
+            else:
+                crc = crc >> 1
+        table.append(crc)
+
+    return table
+
+
+_CRC16_KERMIT_TABLE = _make_crc16_kermit_table()
+
+
+def crc16_kermit(data):
+    # table-driven: one lookup per byte instead of 8 shift & xor steps
+    crc = 0
+    table = _CRC16_KERMIT_TABLE
+
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+
+    return crc
+
+
+def encode_frames(messages: Iterable[Message]) -> bytes:
+    """
+    Encode messages for transmission, delimited such that the receiver can resynchronize at the first one.
+    """
+    buffer = bytearray(b"\x00")
+
+    for msg in messages:
+        frame = _ID.pack(msg.id) + msg.data
+        buffer += cobs.encode(frame + _CRC.pack(crc16_kermit(frame)))
+        buffer += b"\x00"
+
+    return bytes(buffer)
+
+
+def decode_frame(encoded: bytes) -> Optional[Message]:
+    """
+    Decode a single frame (without the delimiters).
+
+    :return: the message, or None if the frame is corrupted
+    """
+    try:
+        frame = cobs.decode(encoded)
+    except cobs.DecodeError:
+        return None
+
+    if len(frame) < _ID.size + _CRC.size:
+        return None
+
+    # validate in place, without slicing the frame apart first
+    crc, = _CRC.unpack_from(frame, len(frame) - _CRC.size)
+
+    if crc != crc16_kermit(memoryview(frame)[:-_CRC.size]):
+        return None
+
+    id, = _ID.unpack_from(frame)
+    return Message(id=id, data=frame[_ID.size:-_CRC.size])
+
+
+class FrameDecoder:
+    """
+    Incremental decoder: feed it data as it arrives, get back all messages completed by it.
+    Corrupted frames are silently dropped.
+    """
+
+    def __init__(self):
+        self._pending = b""
+
+    def feed(self, data: bytes) -> List[Message]:
+        # split the whole chunk at once; the last part is the (possibly empty) beginning of an incomplete frame
+        parts = (self._pending + data).split(b"\x00")
+        self._pending = parts.pop()
+
+        if len(self._pending) > MAX_ENCODED_FRAME_LENGTH:
+            self._pending = b""
+
+        messages = []
+
+        for encoded in parts:
+            if encoded:
+                msg = decode_frame(encoded)
+
+                if msg is not None:
+                    messages.append(msg)
+
+        return messages
+
+
+class ByteStreamAdapter(BusAdapter):
+    """
+    Base for adapters exchanging COBS-wrapped frames over a byte stream; subclasses only move bytes.
+    """
+
+    def __init__(self):
+        self._decoder = FrameDecoder()
+        self._rx_queue: Deque[Message] = collections.deque()
+
+    @abstractmethod
+    def _read(self, timeout: Optional[float]) -> bytes:
+        """
+        Read whatever is available, waiting up to `timeout` seconds (None = indefinitely) for at least one byte.
+
+        :return: received data; empty on timeout
+        """
+        ...
+
+    @abstractmethod
+    def _write(self, data: bytes) -> None:
+        ...
+
+    def receive(self, deadline: Optional[float] = None) -> Message:
+        return self._receive_by_polling(deadline)
+
+    def poll(self) -> Optional[Message]:
+        if not self._rx_queue:
+            self._feed(self._read(0))
+
+        if not self._rx_queue:
+            return None
+
+        msg = self._rx_queue.popleft()
+
+        if self.tracer is not None:
+            self.tracer.record(RX, msg)
+
+        return msg
+
+    def wait(self, until: Optional[float]) -> bool:
+        while not self._rx_queue:
+            timeout = max(until - time.monotonic(), 0) if until is not None else None
+            self._feed(self._read(timeout))
+
+            # a chunk may hold only part of a frame, or only frames that are filtered out
+            if not self._rx_queue and until is not None and time.monotonic() >= until:
+                return False
+
+        return True
+
+    def _feed(self, data: bytes) -> None:
+        if data:
+            self._rx_queue.extend(msg for msg in self._decoder.feed(data) if self._accepts(msg.id))
+
+    def send(self, msg: Message) -> None:
+        self.send_many([msg])
+
+    def send_many(self, messages: Sequence[Message]) -> None:
+        if not messages:
+            return
+
+        if self.tracer is not None:
+            self.tracer.record_many(TX, messages)
+
+        # the whole burst goes out in a single write
+        self._write(encode_frames(messages))
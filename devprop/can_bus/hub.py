@@ -0,0 +1,250 @@
+import collections
+import logging
+import threading
+import time
+from typing import Deque, Dict, Hashable, List, Optional, Sequence, Union
+
+from .adapter import BusAdapter, DeadlineQueue, FrameFilter, Message, StateMachine
+
+logger = logging.getLogger(__name__)
+
+
+# How often the receive thread wakes up to check if it should quit
+_RECEIVE_SLICE_SEC = 0.1
+
+
+class _Transaction:
+    def __init__(self, sm: StateMachine):
+        self.sm = sm
+        self.error: Optional[BaseException] = None
+
+
+class _KeyLock:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = 0
+
+
+class BusHub(BusAdapter):
+    """
+    Shares one bus adapter between any number of clients (threads) by demultiplexing received frames.
+
+    A background thread receives all frames and hands each of them to the in-flight transactions that it matches
+    (see `StateMachine.matches`), so that concurrent clients do not steal each other's responses. Transactions
+    with the same key (typically the same node & property) are serialized.
+
+    Frames not matched by any transaction can be obtained through `receive`.
+    """
+
+    def __init__(self, adapter: BusAdapter, unsolicited_queue_length: int = 1024):
+        self._adapter = adapter
+
+        # protects _transactions, _key_locks, _unsolicited, and the state of all state machines
+        self._cond = threading.Condition()
+        self._send_lock = threading.Lock()
+        self._transactions: List[_Transaction] = []
+        self._key_locks: Dict[Hashable, _KeyLock] = {}
+        self._unsolicited: Deque[Message] = collections.deque(maxlen=unsolicited_queue_length)
+
+        self._closed = False
+        self._thread = threading.Thread(target=self._receive_loop, name="BusHub", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._closed = True
+        self._thread.join()
+
+    def receive(self, deadline: Optional[float] = None) -> Message:
+        return self._receive_by_polling(deadline)
+
+    def poll(self) -> Optional[Message]:
+        with self._cond:
+            return self._unsolicited.popleft() if self._unsolicited else None
+
+    def wait(self, until: Optional[float]) -> bool:
+        with self._cond:
+            timeout = max(until - time.monotonic(), 0) if until is not None else None
+            return bool(self._cond.wait_for(lambda: self._unsolicited, timeout))
+
+    def set_filters(self, filters: Optional[List[FrameFilter]]) -> None:
+        self._adapter.set_filters(filters)
+
+    def send(self, msg: Message) -> None:
+        with self._send_lock:
+            self._adapter.send(msg)
+
+    def send_many(self, messages: Sequence[Message]) -> None:
+        with self._send_lock:
+            self._adapter.send_many(messages)
+
+    def execute(self, sm: StateMachine, deadline: float) -> None:
+        error, = self.execute_many([sm], deadline)
+
+        if error is not None:
+            raise error
+
+    def execute_many(self, sms: Sequence[StateMachine],
+                     deadline: Union[float, Sequence[float]]) -> List[Optional[Exception]]:
+        deadlines = [deadline] * len(sms) if isinstance(deadline, (int, float)) else list(deadline)
+
+        if not sms:
+            return []
+
+        # always lock keys in the same order, so that concurrent batches cannot deadlock
+        keys = sorted({key for sm in sms for key in sm.get_keys()}, key=repr)
+        key_locks = []
+
+        with self._cond:
+            for key in keys:
+                key_lock = self._key_locks.setdefault(key, _KeyLock())
+                key_lock.users += 1
+                key_locks.append(key_lock)
+
+        acquired = []
+
+        try:
+            for key_lock in key_locks:
+                if not key_lock.lock.acquire(timeout=max(max(deadlines) - time.monotonic(), 0)):
+                    return [TimeoutError()] * len(sms)
+
+                acquired.append(key_lock)
+
+            return self._execute_many(sms, deadlines)
+        finally:
+            for key_lock in acquired:
+                key_lock.lock.release()
+
+            with self._cond:
+                for key, key_lock in zip(keys, key_locks):
+                    key_lock.users -= 1
+
+                    if key_lock.users == 0:
+                        del self._key_locks[key]
+
+    def _execute_many(self, sms: Sequence[StateMachine], deadlines: List[float]) -> List[Optional[Exception]]:
+        transactions = [_Transaction(sm) for sm in sms]
+        expiry = DeadlineQueue()
+
+        for i, deadline in enumerate(deadlines):
+            expiry.push(deadline, i)
+
+        observer = self.observer
+
+        # register before sending anything, so that no response can be missed
+        with self._cond:
+            self._transactions.extend(transactions)
+
+            if observer is not None:
+                for transaction in transactions:
+                    observer.transaction_started(transaction.sm, time.monotonic())
+
+        try:
+            while True:
+                with self._cond:
+                    # responses are dispatched by the receive thread as they arrive, so whatever has been received
+                    # is already accounted for when checking the deadlines
+                    for i in expiry.pop_expired(time.monotonic()):
+                        if transactions[i].error is None and not transactions[i].sm.is_finished():
+                            transactions[i].error = TimeoutError()
+
+                        if observer is not None:
+                            observer.transaction_finished(transactions[i].sm, transactions[i].error,
+                                                          time.monotonic())
+
+                    active = []
+
+                    for i, transaction in enumerate(transactions):
+                        if transaction.error is None and not transaction.sm.is_finished():
+                            active.append(transaction)
+                        elif i in expiry:
+                            expiry.cancel(i)
+
+                            if observer is not None:
+                                observer.transaction_finished(transaction.sm, transaction.error, time.monotonic())
+
+                    if not active:
+                        return [transaction.error for transaction in transactions]
+
+                    frames = []
+                    now = time.monotonic()
+                    next_wakeup = expiry.next_deadline()
+
+                    for transaction in active:
+                        while True:
+                            frame = transaction.sm.get_frame_to_send()
+
+                            if frame is None:
+                                break
+
+                            frames.append(frame)
+
+                            if observer is not None:
+                                observer.frame_sent(transaction.sm, frame, now)
+
+                        retry_time = transaction.sm.get_retry_time()
+
+                        if retry_time is not None:
+                            next_wakeup = min(next_wakeup, retry_time)
+
+                if frames:
+                    self.send_many(frames)
+
+                with self._cond:
+                    if any(transaction.error is None and not transaction.sm.is_finished() for transaction in active):
+                        # a single wait for all transactions, until the nearest of their deadlines & retry times
+                        self._cond.wait(max(next_wakeup - time.monotonic(), 0))
+        finally:
+            with self._cond:
+                finished = set(map(id, transactions))
+                self._transactions = [transaction for transaction in self._transactions
+                                      if id(transaction) not in finished]
+
+    def _receive_loop(self) -> None:
+        while not self._closed:
+            messages = []
+
+            try:
+                if self._adapter.wait(time.monotonic() + _RECEIVE_SLICE_SEC):
+                    # take everything that has arrived, to dispatch it in one go
+                    while True:
+                        msg = self._adapter.poll()
+
+                        if msg is None:
+                            break
+
+                        messages.append(msg)
+            except Exception as ex:
+                logger.exception(ex)
+
+            if not messages:
+                continue
+
+            with self._cond:
+                for msg in messages:
+                    claimed = False
+
+                    for transaction in self._transactions:
+                        if transaction.error is not None:
+                            continue
+
+                        try:
+                            if not transaction.sm.matches(msg):
+                                continue
+                        except Exception as ex:
+                            transaction.error = ex
+                            continue
+
+                        claimed = True
+
+                        if self.observer is not None:
+                            self.observer.frame_received(transaction.sm, msg, time.monotonic())
+
+                        try:
+                            transaction.sm.frame_received(msg)
+                        except Exception as ex:
+                            transaction.error = ex
+
+                    if not claimed:
+                        self._unsolicited.append(msg)
+
+                self._cond.notify_all()
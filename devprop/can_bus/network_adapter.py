@@ -0,0 +1,69 @@
+import select
+import socket
+from typing import Optional, Tuple
+
+from .byte_stream import ByteStreamAdapter
+
+
+READ_CHUNK_SIZE = 65536
+
+
+def parse_address(parameters: str) -> Tuple[str, int]:
+    host, port = parameters.rsplit(":", 1)
+
+    # allow IPv6 literals in brackets, e.g. tcp:[::1]:5000
+    return host.strip("[]"), int(port)
+
+
+class _SocketAdapter(ByteStreamAdapter):
+    _socket: socket.socket
+
+    def close(self) -> None:
+        self._socket.close()
+
+    def _read(self, timeout: Optional[float]) -> bytes:
+        ready, _, _ = select.select([self._socket], [], [], timeout)
+
+        if not ready:
+            return b""
+
+        data = self._socket.recv(READ_CHUNK_SIZE)
+
+        if not data and self._socket.type == socket.SOCK_STREAM:
+            raise ConnectionError("Connection closed by the gateway")
+
+        return data
+
+
+class TcpAdapter(_SocketAdapter):
+    """
+    Wrapped CAN frames over a TCP connection to a gateway (DSN `tcp:<host>:<port>`).
+    """
+
+    def __init__(self, address: Tuple[str, int]):
+        super().__init__()
+
+        self._socket = socket.create_connection(address)
+        # requests are small and latency-sensitive; bursts are already coalesced by send_many
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _write(self, data: bytes) -> None:
+        self._socket.sendall(data)
+
+
+class UdpAdapter(_SocketAdapter):
+    """
+    Wrapped CAN frames in UDP datagrams exchanged with a gateway (DSN `udp:<host>:<port>`).
+    Each datagram carries one or more complete frames.
+    """
+
+    def __init__(self, address: Tuple[str, int]):
+        super().__init__()
+
+        family, type, proto, _, sockaddr = socket.getaddrinfo(*address, type=socket.SOCK_DGRAM)[0]
+        self._socket = socket.socket(family, type, proto)
+        # only accept datagrams coming from the gateway
+        self._socket.connect(sockaddr)
+
+    def _write(self, data: bytes) -> None:
+        self._socket.send(data)
@@ -1,29 +1,40 @@
 import time
 import logging
-from typing import Optional
+from typing import List, Optional, Sequence
 
 import can
 
-from .adapter import BusAdapter, Message
-from ..protocol_can_ext_v1.messages import stringify
+from .adapter import BusAdapter, FrameFilter, Message
+from .trace import RX, TX
 
 logger = logging.getLogger(__name__)
 
 
+# How long to wait for room in the transmit queue before giving up on a frame
+TX_TIMEOUT_SEC = 1.0
+
+
 class PythonCanAdapter(BusAdapter):
     _bus: can.BusABC
 
-    def __init__(self):
-        self._bus = can.Bus()
+    def __init__(self, **bus_kwargs):
+        # without arguments, python-can takes the interface & channel from its configuration file/environment
+        self._bus = can.Bus(**bus_kwargs)
 
-    def receive(self, deadline: Optional[float] = None) -> Message:
-        if deadline is not None:
-            timeout = deadline - time.monotonic()
+    def set_filters(self, filters: Optional[List[FrameFilter]]) -> None:
+        super().set_filters(filters)
 
-            if timeout < 0:
-                raise TimeoutError()
+        # python-can installs these as kernel filters where the interface supports it (e.g. SocketCAN),
+        # and filters in software otherwise
+        if filters is None:
+            self._bus.set_filters(None)
         else:
-            timeout = None
+            self._bus.set_filters([dict(can_id=filter.id, can_mask=filter.mask, extended=True) for filter in filters])
+
+    def receive(self, deadline: Optional[float] = None) -> Message:
+        # python-can has no way to wait without receiving, so `poll` & `wait` are the defaults built on top of this;
+        # once the deadline has passed, a frame that is already queued is still returned
+        timeout = max(deadline - time.monotonic(), 0) if deadline is not None else None
 
         message = self._bus.recv(timeout=timeout)
 
@@ -34,11 +45,37 @@ class PythonCanAdapter(BusAdapter):
 
         msg = Message(id=message.arbitration_id, data=bytes(message.data))
 
-        logger.debug("Rx frame %08xh [%-23s] %s", msg.id, msg.data.hex(" "), stringify(msg))
+        if self.tracer is not None:
+            self.tracer.record(RX, msg)
 
         return msg
 
     def send(self, msg: Message):
-        logger.debug("Tx frame %08xh [%-23s] %s", msg.id, msg.data.hex(" "), stringify(msg))
-
-        self._bus.send(can.Message(arbitration_id=msg.id, data=msg.data, is_extended_id=True))
+        self.send_many([msg])
+
+    def send_many(self, messages: Sequence[Message]) -> None:
+        # python-can offers no batched send, but building all frames before the first syscall keeps the burst tight.
+        frames = [can.Message(arbitration_id=msg.id, data=msg.data, is_extended_id=True) for msg in messages]
+
+        if self.tracer is not None:
+            self.tracer.record_many(TX, messages)
+
+        for frame in frames:
+            self._send_with_backpressure(frame)
+
+    def _send_with_backpressure(self, frame: can.Message) -> None:
+        # With a timeout, SocketCAN waits for the socket to become writable; on top of that, retry when the
+        # interface queue overflows (ENOBUFS) instead of dropping the frame
+        deadline = time.monotonic() + TX_TIMEOUT_SEC
+        delay = 0.0005
+
+        while True:
+            try:
+                self._bus.send(frame, timeout=TX_TIMEOUT_SEC)
+                return
+            except can.CanOperationError:
+                if time.monotonic() + delay > deadline:
+                    raise
+
+                time.sleep(delay)
+                delay = min(delay * 2, 0.01)
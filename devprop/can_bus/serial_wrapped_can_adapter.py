@@ -1,98 +1,91 @@
-import time
-import logging
-import struct
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qsl
 
-from cobs import cobs
 import serial
 
-from .adapter import BusAdapter, Message
-from ..protocol_can_ext_v1.messages import stringify
+from .byte_stream import ByteStreamAdapter
 
 
-logger = logging.getLogger(__name__)
+DEFAULT_BAUDRATE = 115200
+DEFAULT_READ_CHUNK_SIZE = 4096
+FLOW_CONTROL_MODES = {"none", "rtscts", "dsrdtr", "xonxoff"}
 
 
-# found online and adapted
-def crc16_kermit(data):
-    crc = 0
+DSN_OPTIONS = {"baud", "chunk", "flow"}
 
-    for i in range(len(data)):
-        crc ^= data[i]
-        for j in range(0,8):
-            if (crc & 1) > 0:
-                crc = (crc >> 1) ^ 0x8408
-            else:
-                crc = crc >> 1
 
-    return crc
+def parse_dsn_parameters(parameters: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    :param parameters: `<port>[?baud=<baudrate>&chunk=<read chunk size>&flow=<none|rtscts|dsrdtr|xonxoff>]`,
+                       e.g. `/dev/ttyACM0?baud=2000000&flow=rtscts`. A pyserial URL may carry a query of its own;
+                       the options then follow after a second `?`, e.g. `socket://host:7000?logging=debug?baud=500000`.
+    :return: (port, keyword arguments of SerialWrappedCanAdapter)
+    """
+    # the options are always in the last query
+    port, _, query = parameters.rpartition("?")
 
+    if not port:
+        port, query = parameters, ""
 
-class SerialWrappedCanAdapter(BusAdapter):
-    def __init__(self, port: str):
-        self._port = serial.Serial(port, 115200)
-        self._buffer = bytearray()
+    try:
+        options = dict(parse_qsl(query, strict_parsing=bool(query)))
+    except ValueError:
+        options = None
 
-    def receive(self, deadline: Optional[float] = None) -> Message:
-        while True:
-            if deadline is not None:
-                timeout = deadline - time.monotonic()
+    if options is None or options.keys() - DSN_OPTIONS:
+        if "://" in port:
+            # the URL's own query, with no options after it
+            port, options = parameters, {}
+        elif options is None:
+            raise ValueError(f"Invalid serial port options: {query!r}")
+        else:
+            raise ValueError(f"Unknown serial port options: {', '.join(sorted(options.keys() - DSN_OPTIONS))}")
 
-                if timeout < 0:
-                    raise TimeoutError()
-            else:
-                timeout = None
+    kwargs: Dict[str, Any] = {}
 
-            self._port.timeout = timeout
-            # problem: if we allow reception of multiple bytes, we end up stalling here
-            #          and we run out of time to load the following segments of the manifest
-            input = self._port.read(1)
+    if "baud" in options:
+        kwargs["baudrate"] = int(options["baud"])
 
-            if input is None:
-                raise TimeoutError()
+    if "chunk" in options:
+        kwargs["read_chunk_size"] = int(options["chunk"])
 
-            self._buffer += input
+    if "flow" in options:
+        kwargs["flow_control"] = options["flow"]
 
-            # loop until valid frame decoded, or run out of terminators
-            while True:
-                # attempt to parse input
-                terminator_pos = self._buffer.find(b"\x00")
+    return port, kwargs
 
-                if terminator_pos < 0:
-                    break
 
-                encoded = self._buffer[0:terminator_pos]
-                self._buffer = self._buffer[terminator_pos + 1:]
+class SerialWrappedCanAdapter(ByteStreamAdapter):
+    def __init__(self, port: str, baudrate: int = DEFAULT_BAUDRATE, read_chunk_size: int = DEFAULT_READ_CHUNK_SIZE,
+                 flow_control: str = "none"):
+        super().__init__()
 
-                if len(encoded) == 0:
-                    # print("empty")
-                    continue
+        if flow_control not in FLOW_CONTROL_MODES:
+            raise ValueError(f"Invalid flow control {flow_control!r}, expected one of {sorted(FLOW_CONTROL_MODES)}")
 
-                try:
-                    frame = cobs.decode(encoded)
-                except cobs.DecodeError:
-                    # print("bad frame", encoded.hex())
-                    continue
+        # serial_for_url also accepts pyserial URLs such as loop:// or rfc2217://
+        self._port = serial.serial_for_url(port, baudrate,
+                                           rtscts=flow_control == "rtscts",
+                                           dsrdtr=flow_control == "dsrdtr",
+                                           xonxoff=flow_control == "xonxoff")
+        self._read_chunk_size = read_chunk_size
 
-                crc, = struct.unpack("<H", frame[-2:])
-                
-                if crc != crc16_kermit(frame[:-2]):
-                    # print("bad CRC", frame.hex())
-                    continue
+    @classmethod
+    def from_dsn_parameters(cls, parameters: str) -> "SerialWrappedCanAdapter":
+        port, options = parse_dsn_parameters(parameters)
+        return cls(port, **options)
 
-                id, = struct.unpack("<I", frame[:4])
-                msg = Message(id=id, data=frame[4:-2])
+    def _read(self, timeout: Optional[float]) -> bytes:
+        # wait for the first byte, then take everything that has arrived in the meantime; asking for a fixed number
+        # of bytes would stall until the timeout when less is available
+        self._port.timeout = timeout
+        data = self._port.read(1)
 
-                logger.debug("Rx frame %08xh [%-23s] %s", msg.id, msg.data.hex(" "), stringify(msg))
+        if data and self._port.in_waiting:
+            data += self._port.read(min(self._port.in_waiting, self._read_chunk_size - 1))
 
-                return msg
+        return data
 
-    def send(self, msg: Message):
-        logger.debug("Tx frame %08xh [%-23s] %s", msg.id, msg.data.hex(" "), stringify(msg))
-
-        header = struct.pack("<I", msg.id)
-        crc = crc16_kermit(header + msg.data)
-        frame = cobs.encode(header + msg.data + struct.pack("<H", crc))
-        # print((header + msg.data + struct.pack("<H", crc)).hex())
-        # print(frame.hex())
-        self._port.write(b"\x00" + frame + b"\x00")
+    def _write(self, data: bytes) -> None:
+        # blocks until the data has been queued, which throttles the caller to the speed of the link
+        self._port.write(data)
@@ -0,0 +1,146 @@
+import errno
+import logging
+import select
+import socket
+import struct
+import time
+from typing import List, Optional, Sequence
+
+from .adapter import BusAdapter, FrameFilter, Message
+from .trace import RX, TX
+
+logger = logging.getLogger(__name__)
+
+
+# struct can_frame from <linux/can.h>: can_id, can_dlc, 3 bytes padding, 8 bytes data
+CAN_FRAME = struct.Struct("=IB3x8s")
+# struct can_filter: can_id, can_mask
+CAN_FILTER = struct.Struct("=II")
+
+CAN_EFF_FLAG = 0x80000000
+CAN_RTR_FLAG = 0x40000000
+CAN_ERR_FLAG = 0x20000000
+CAN_EFF_MASK = 0x1FFFFFFF
+
+# How long to wait for room in the transmit queue before giving up on a frame
+TX_TIMEOUT_SEC = 1.0
+
+
+def pack_frame(msg: Message) -> bytes:
+    return CAN_FRAME.pack(msg.id | CAN_EFF_FLAG, len(msg.data), msg.data)
+
+
+def unpack_frame(frame: bytes) -> Optional[Message]:
+    """
+    :return: the received message, or None if it is not an extended data frame
+    """
+    can_id, dlc, data = CAN_FRAME.unpack(frame)
+
+    if (can_id & (CAN_EFF_FLAG | CAN_RTR_FLAG | CAN_ERR_FLAG)) != CAN_EFF_FLAG:
+        return None
+
+    return Message(id=can_id & CAN_EFF_MASK, data=data[:dlc])
+
+
+def pack_filters(filters: Optional[List[FrameFilter]]) -> bytes:
+    if filters is None:
+        # the kernel default: a single filter accepting everything
+        return CAN_FILTER.pack(0, 0)
+
+    # match on the EFF flag too, so that standard frames never pass
+    return b"".join(CAN_FILTER.pack(filter.id | CAN_EFF_FLAG, filter.mask | CAN_EFF_FLAG) for filter in filters)
+
+
+class SocketCanAdapter(BusAdapter):
+    """
+    Lean Linux SocketCAN transport using a raw AF_CAN socket directly (DSN `socketcan:<interface>`, e.g. `socketcan:vcan0`).
+
+    Unlike PythonCanAdapter, no intermediate `can.Message` objects are built, and filters always go to the kernel.
+    """
+
+    def __init__(self, interface: str):
+        if not hasattr(socket, "AF_CAN"):
+            raise OSError("SocketCAN is not supported on this platform")
+
+        self._interface = interface
+        self._socket = socket.socket(socket.AF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+
+        try:
+            self._socket.bind((interface,))
+        except OSError:
+            self._socket.close()
+            raise
+
+        self._socket.setblocking(False)
+
+    def close(self) -> None:
+        self._socket.close()
+
+    def set_filters(self, filters: Optional[List[FrameFilter]]) -> None:
+        super().set_filters(filters)
+
+        self._socket.setsockopt(socket.SOL_CAN_RAW, socket.CAN_RAW_FILTER, pack_filters(filters))
+
+    def receive(self, deadline: Optional[float] = None) -> Message:
+        return self._receive_by_polling(deadline)
+
+    def poll(self) -> Optional[Message]:
+        while True:
+            try:
+                frame = self._socket.recv(CAN_FRAME.size)
+            except BlockingIOError:
+                return None
+
+            msg = unpack_frame(frame)
+
+            if msg is None:
+                continue
+
+            if self.tracer is not None:
+                self.tracer.record(RX, msg)
+
+            return msg
+
+    def wait(self, until: Optional[float]) -> bool:
+        timeout = max(until - time.monotonic(), 0) if until is not None else None
+        ready, _, _ = select.select([self._socket], [], [], timeout)
+        return bool(ready)
+
+    def send(self, msg: Message) -> None:
+        self.send_many([msg])
+
+    def send_many(self, messages: Sequence[Message]) -> None:
+        # CAN_RAW accepts exactly one frame per send(), so a burst can only be sped up by preparing it in advance
+        frames = [pack_frame(msg) for msg in messages]
+
+        if self.tracer is not None:
+            self.tracer.record_many(TX, messages)
+
+        for frame in frames:
+            self._send_frame(frame)
+
+    def _send_frame(self, frame: bytes) -> None:
+        deadline = time.monotonic() + TX_TIMEOUT_SEC
+
+        while True:
+            try:
+                self._socket.send(frame)
+                return
+            except BlockingIOError:
+                self._wait_writable(deadline)
+            except OSError as ex:
+                if ex.errno != errno.ENOBUFS:
+                    raise
+
+                # interface queue full; the socket still reports itself writable, so back off briefly
+                if time.monotonic() > deadline:
+                    raise TimeoutError() from ex
+
+                time.sleep(0.001)
+
+    def _wait_writable(self, deadline: float) -> None:
+        _, ready, _ = select.select([], [self._socket], [], max(deadline - time.monotonic(), 0))
+
+        if not ready:
+            raise TimeoutError()
+
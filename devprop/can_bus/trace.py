@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+
+"""
+Frame tracing. Adapters record every frame they send or receive as a raw (timestamp, id, data, direction) tuple into
+the ring buffer of a `FrameTracer`; an adapter without a tracer pays for nothing but an attribute check.
+
+Nothing is formatted while recording: a background thread hands the new records to the tracer's sinks, which
+format or store them (`LoggingSink`, `TextSink`, `BinaryFileSink`). Independently of the sinks, the ring buffer
+always holds the last frames, which `LastFramesOnError` dumps whenever an error is logged.
+
+Adapters created by `get_adapter` use the tracer configured by the environment variable DEVPROP_TRACE,
+a comma-separated list of sinks:
+
+    text            pretty-print to stderr
+    file:<path>     binary trace file (print it with `python -m devprop.can_bus.trace <path>`)
+    errors[:<n>]    dump the last n (default 32) frames when an error is logged
+
+Without DEVPROP_TRACE, frames are logged as before when DEBUG logging is enabled for devprop.
+
+Run as a script to print a binary trace file.
+"""
+
+import atexit
+import itertools
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+from typing import BinaryIO, Iterator, List, Optional, TextIO, Tuple
+
+from .adapter import Message
+
+logger = logging.getLogger(__name__)
+
+
+TX = "Tx"
+RX = "Rx"
+
+# (time.monotonic(), frame ID, data, TX or RX)
+TraceRecord = Tuple[float, int, bytes, str]
+
+# Frames kept in the ring buffer; must be a power of 2
+DEFAULT_TRACE_CAPACITY = 4096
+
+# How often records are handed to the sinks
+DRAIN_INTERVAL_SEC = 0.1
+
+DEFAULT_ERROR_DUMP_FRAMES = 32
+
+BINARY_MAGIC = b"DPTRACE1"
+BINARY_RECORD = struct.Struct("<dIBB8s")        # timestamp, ID, direction (0 = Tx), data length, data
+
+
+def describe_frame(id: int, data: bytes) -> str:
+    """
+    Decode a frame as a protocol message where possible; traces also hold frames which are not (or not valid)
+    protocol frames, and these are shown as hex only.
+    """
+    # imported here, as the protocol layer is only needed once there is something to format
+    from ..protocol_can_ext_v1.messages import stringify
+
+    try:
+        return stringify(Message(id, data))
+    except (AssertionError, ValueError):
+        return "(not a devprop frame)"
+
+
+def format_record(record: TraceRecord) -> str:
+    timestamp, id, data, direction = record
+    return f"{timestamp:.6f} {direction} frame {id:08x}h [{data.hex(' '):23s}] {describe_frame(id, data)}"
+
+
+class TraceSink:
+    def write(self, records: List[TraceRecord]) -> None:
+        raise NotImplementedError()
+
+    def close(self) -> None:
+        pass
+
+
+class LoggingSink(TraceSink):
+    """
+    Logs each frame at DEBUG level, in the format of the former per-adapter debug messages.
+    """
+
+    def __init__(self, log: logging.Logger = logger):
+        self._log = log
+
+    def write(self, records: List[TraceRecord]) -> None:
+        for timestamp, id, data, direction in records:
+            self._log.debug("%s frame %08xh [%-23s] %s", direction, id, data.hex(" "), describe_frame(id, data))
+
+
+class TextSink(TraceSink):
+    def __init__(self, stream: TextIO):
+        self._stream = stream
+
+    def write(self, records: List[TraceRecord]) -> None:
+        self._stream.write("".join(format_record(record) + "\n" for record in records))
+        self._stream.flush()
+
+
+class BinaryFileSink(TraceSink):
+    """
+    Writes fixed-size records (see BINARY_RECORD) after an 8-byte header; read back with `read_binary_trace`.
+    """
+
+    def __init__(self, path: str):
+        self._file: BinaryIO = open(path, "wb")
+        self._file.write(BINARY_MAGIC)
+
+    def write(self, records: List[TraceRecord]) -> None:
+        self._file.write(b"".join(BINARY_RECORD.pack(timestamp, id, direction == RX, len(data), data)
+                                  for timestamp, id, data, direction in records))
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def read_binary_trace(path: str) -> Iterator[TraceRecord]:
+    with open(path, "rb") as f:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(f"{path} is not a devprop trace file")
+
+        while True:
+            chunk = f.read(BINARY_RECORD.size)
+
+            if len(chunk) < BINARY_RECORD.size:
+                return
+
+            timestamp, id, is_rx, length, data = BINARY_RECORD.unpack(chunk)
+            yield timestamp, id, data[:length], RX if is_rx else TX
+
+
+class FrameTracer:
+    """
+    Ring buffer of the last `capacity` frames, plus the sinks to which all frames are handed in the background.
+
+    `record` takes no lock: slots are claimed with an atomic counter, so any number of threads (e.g. a receive
+    thread & a transmitting one) may record concurrently. When the sinks fall behind by more than `capacity` frames,
+    the oldest ones are skipped and counted in `overruns`.
+    """
+
+    def __init__(self, sinks: Optional[List[TraceSink]] = None, capacity: int = DEFAULT_TRACE_CAPACITY):
+        assert capacity > 0 and capacity & (capacity - 1) == 0
+
+        self.sinks = sinks or []
+        self.overruns = 0
+
+        self._ring: List[Optional[Tuple[int, float, int, bytes, str]]] = [None] * capacity
+        self._mask = capacity - 1
+        self._counter = itertools.count()
+        self._cursor = 0        # sequence number of the next record to hand to the sinks
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        if self.sinks:
+            self._thread = threading.Thread(target=self._drain_loop, name="devprop trace", daemon=True)
+            self._thread.start()
+
+    def record(self, direction: str, msg: Message) -> None:
+        sequence = next(self._counter)
+        self._ring[sequence & self._mask] = (sequence, time.monotonic(), msg.id, msg.data, direction)
+
+    def record_many(self, direction: str, messages: List[Message]) -> None:
+        for msg in messages:
+            self.record(direction, msg)
+
+    def last(self, count: int) -> List[TraceRecord]:
+        """
+        :return: up to `count` of the most recent records, oldest first
+        """
+        entries = sorted(entry for entry in list(self._ring) if entry is not None)
+        return [entry[1:] for entry in entries[-count:]] if count > 0 else []
+
+    def drain(self) -> List[TraceRecord]:
+        """
+        Take the records that have not been handed to the sinks yet. Called from the background thread.
+        """
+        records = []
+
+        while True:
+            entry = self._ring[self._cursor & self._mask]
+
+            # not written yet (or still being written)
+            if entry is None or entry[0] < self._cursor:
+                break
+
+            if entry[0] > self._cursor:
+                # overwritten before it could be taken; the last `capacity` records up to this one are still there
+                oldest = entry[0] - self._mask
+                self.overruns += oldest - self._cursor
+                self._cursor = oldest
+                continue
+
+            records.append(entry[1:])
+            self._cursor += 1
+
+        return records
+
+    def flush(self) -> None:
+        records = self.drain()
+
+        if not records:
+            return
+
+        for sink in self.sinks:
+            try:
+                sink.write(records)
+            except Exception as ex:
+                logger.error("Trace sink %s failed", type(sink).__name__, exc_info=ex)
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+        self.flush()
+
+        for sink in self.sinks:
+            sink.close()
+
+        self.sinks = []
+
+    def _drain_loop(self) -> None:
+        while not self._stop.wait(DRAIN_INTERVAL_SEC):
+            self.flush()
+
+
+class LastFramesOnError(logging.Handler):
+    """
+    Logging handler which writes the last frames of a tracer to `stream` whenever an error is logged, so that
+    the traffic leading up to a failure is available without tracing everything.
+    """
+
+    def __init__(self, tracer: FrameTracer, count: int = DEFAULT_ERROR_DUMP_FRAMES, stream: Optional[TextIO] = None):
+        super().__init__(level=logging.ERROR)
+
+        self.tracer = tracer
+        self.count = count
+        self.stream = stream
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            stream = self.stream or sys.stderr
+            frames = self.tracer.last(self.count)
+
+            stream.write(f"Last {len(frames)} frames before error:\n" +
+                         "".join("  " + format_record(frame) + "\n" for frame in frames))
+            stream.flush()
+        except Exception:
+            # as any logging handler, never let a failure reach the code that logged
+            self.handleError(record)
+
+
+def make_tracer(spec: str) -> FrameTracer:
+    """
+    :param spec: sinks in the format of DEVPROP_TRACE (see the module documentation)
+    """
+    sinks: List[TraceSink] = []
+    error_dumps = []
+
+    for item in filter(None, (item.strip() for item in spec.split(","))):
+        kind, _, parameter = item.partition(":")
+
+        if kind == "text":
+            sinks.append(TextSink(sys.stderr))
+        elif kind == "file" and parameter:
+            sinks.append(BinaryFileSink(parameter))
+        elif kind == "errors":
+            error_dumps.append(int(parameter) if parameter else DEFAULT_ERROR_DUMP_FRAMES)
+        else:
+            raise ValueError(f"Invalid trace sink: {item!r}")
+
+    tracer = FrameTracer(sinks)
+
+    for count in error_dumps:
+        logging.getLogger("devprop").addHandler(LastFramesOnError(tracer, count))
+
+    return tracer
+
+
+_default_tracer: Optional[FrameTracer] = None
+_default_tracer_lock = threading.Lock()
+
+
+def get_default_tracer() -> Optional[FrameTracer]:
+    """
+    The tracer for adapters created by `get_adapter`, shared by all of them: configured by DEVPROP_TRACE, or logging
+    frames if DEBUG logging is enabled at the time of the first call. None if tracing is off.
+    """
+    global _default_tracer
+
+    with _default_tracer_lock:
+        if _default_tracer is None:
+            spec = os.getenv("DEVPROP_TRACE")
+
+            if spec:
+                _default_tracer = make_tracer(spec)
+            elif logger.isEnabledFor(logging.DEBUG):
+                _default_tracer = FrameTracer([LoggingSink()])
+            else:
+                return None
+
+            # the last frames would otherwise be lost with the background thread
+            atexit.register(_default_tracer.close)
+
+        return _default_tracer
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Print a binary devprop trace file")
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    for record in read_binary_trace(args.path):
+        print(format_record(record))
+
+
+if __name__ == "__main__":
+    main()
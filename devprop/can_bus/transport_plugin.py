@@ -2,6 +2,7 @@ import sys
 from typing import Optional
 
 from .adapter import BusAdapter
+from .trace import get_default_tracer
 
 
 class TransportPluginNotFoundError(Exception):
@@ -10,6 +11,12 @@ class TransportPluginNotFoundError(Exception):
 
 
 def get_adapter(bus_dsn: Optional[str] = None) -> BusAdapter:
+    adapter = _make_adapter(bus_dsn)
+    adapter.tracer = get_default_tracer()
+    return adapter
+
+
+def _make_adapter(bus_dsn: Optional[str]) -> BusAdapter:
     if not bus_dsn:
         from .python_can_adapter import PythonCanAdapter
 
@@ -23,7 +30,22 @@ def get_adapter(bus_dsn: Optional[str] = None) -> BusAdapter:
         if transport_name == "serial":
             from .serial_wrapped_can_adapter import SerialWrappedCanAdapter
 
-            return SerialWrappedCanAdapter(parameters)
+            return SerialWrappedCanAdapter.from_dsn_parameters(parameters)
+
+        if transport_name == "tcp":
+            from .network_adapter import TcpAdapter, parse_address
+
+            return TcpAdapter(parse_address(parameters))
+
+        if transport_name == "udp":
+            from .network_adapter import UdpAdapter, parse_address
+
+            return UdpAdapter(parse_address(parameters))
+
+        if transport_name == "socketcan":
+            from .socketcan_adapter import SocketCanAdapter
+
+            return SocketCanAdapter(parameters)
 
         if sys.version_info < (3, 10):
             from importlib_metadata import entry_points
@@ -1,15 +1,17 @@
 import logging
 import time
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-from devprop.can_bus.adapter import BusAdapter, execute_state_machine, Message
-from .manifest import parse_enveloped_manifest
+from devprop.can_bus.adapter import BusAdapter, execute_state_machine, Message, TransactionObserver
+from .cache import PropertyCache
+from .manifest import ManifestEnvelope, parse_enveloped_manifest
 from .model import Property, Manifest
 from .property import decode_value, encode_value
-from .protocol_can_ext_v1.messages import unpack_id, make_read_manifest_request
-from .protocol_can_ext_v1.model import Direction, MAX_NODE_ID, ProtocolError, Opcode, NodeId
-from .protocol_can_ext_v1.state_machines import ManifestDownload, PropertyQuery
+from .protocol_can_ext_v1.messages import make_filters
+from .protocol_can_ext_v1.model import Direction, ProtocolError, NodeId
+from .protocol_can_ext_v1.state_machines import BusScan, DEFAULT_MANIFEST_WINDOW, DEFAULT_PROPERTY_WINDOW, \
+    FlowControl, ManifestDownload, PropertyPipeline, PropertyQuery
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +20,7 @@ logger = logging.getLogger(__name__)
 class Node:
     node_id: NodeId
     manifest: Manifest
+    envelope: Optional[ManifestEnvelope] = None
 
     @property
     def address_str(self) -> str:
@@ -40,57 +43,103 @@ class Node:
 
 
 class Client:
-    def __init__(self, bus: BusAdapter):
+    def __init__(self, bus: BusAdapter, filter_frames: bool = True, cache: Optional[PropertyCache] = None,
+                 profiler: Optional[TransactionObserver] = None, property_window: int = DEFAULT_PROPERTY_WINDOW):
+        """
+        :param cache: if given, property reads are served from it while valid, and all values read or written
+                      are stored in it
+        :param profiler: if given, attached to the bus to observe all transactions (see profiler.Profiler);
+                         note that this applies to all clients sharing the bus
+        :param property_window: default number of property requests in flight per node (see `set_property_window`)
+        """
         self.bus = bus
+        self.cache = cache
+        self.property_window = property_window
 
-    def enumerate_nodes(self, timeout_sec: float) -> Dict[NodeId, Node]:
-        logger.info("Begin bus scan")
+        self._flow_control: Dict[NodeId, FlowControl] = {}
 
-        for node_id in range(MAX_NODE_ID):
-            self.bus.send(make_read_manifest_request(node_id=node_id, segment=0))
+        if profiler is not None:
+            self.bus.observer = profiler
 
-        # receive replies
+        if filter_frames:
+            # let the adapter drop all traffic that is not a devprop response as early as possible
+            self.bus.set_filters(make_filters(Direction.DEVICE_TO_CLIENT))
 
-        candidate_nodes: Dict[NodeId, Message] = {}
-        nodes: Dict[NodeId, Node] = {}
+    def enumerate_nodes(self, timeout_sec: float, manifest_window: int = DEFAULT_MANIFEST_WINDOW) -> Dict[NodeId, Node]:
+        """
+        :param manifest_window: number of manifest segment requests in flight per node
+        """
+        logger.info("Begin bus scan")
 
-        deadline = time.monotonic() + timeout_sec
+        scan = BusScan()
 
-        while True:
-            try:
-                msg = self.bus.receive(deadline=deadline)
-                node_id, property_index, opcode, direction = unpack_id(msg.id)
+        try:
+            execute_state_machine(self.bus, scan, deadline=time.monotonic() + timeout_sec)
+        except TimeoutError:
+            # expected unless all possible nodes have replied
+            pass
 
-                if opcode is Opcode.READ_MANIFEST and property_index == 0 and direction is Direction.DEVICE_TO_CLIENT:
-                    # Ping ok, queue to download manifest
-                    candidate_nodes[node_id] = msg
-            except ProtocolError as ex:
-                logger.error("Protocol error: %s", str(ex))
-            except TimeoutError:
-                break
+        candidate_nodes: Dict[NodeId, Message] = scan.replies
+        nodes: Dict[NodeId, Node] = {}
 
         logger.info("Found %d nodes, downloading manifests", len(candidate_nodes))
 
+        # all manifests are downloaded concurrently
+        mds: Dict[NodeId, ManifestDownload] = {}
+        errors: Dict[NodeId, Optional[Exception]] = {}
+
         for node_id, initial_reply in candidate_nodes.items():
-            md = ManifestDownload(node_id=node_id)
-            md.frame_received(initial_reply)
+            md = ManifestDownload(node_id=node_id, window=manifest_window)
+
+            try:
+                md.frame_received(initial_reply)
+                mds[node_id] = md
+            except Exception as ex:
+                errors[node_id] = ex
+
+        errors.update(zip(mds.keys(), self.bus.execute_many(list(mds.values()), time.monotonic() + timeout_sec)))
 
+        for node_id, error in sorted(errors.items()):
             try:
-                execute_state_machine(self.bus, md, deadline=time.monotonic() + timeout_sec)
-                mf_blob = md.get_manifest_envelope()
+                if error is not None:
+                    raise error
+
+                mf_blob = mds[node_id].get_manifest_envelope()
 
                 mf = parse_enveloped_manifest(mf_blob)
                 # print(mf)
 
-                nodes[node_id] = Node(node_id, mf)
+                nodes[node_id] = Node(node_id, mf, mf_blob)
             except ProtocolError as ex:
                 logger.error("Protocol error node_id %d: %s", node_id, str(ex))
             except Exception as ex:
                 logger.exception(ex)
 
+        if self.cache is not None:
+            # node IDs may have been taken over by different devices
+            self.cache.invalidate()
+
         logger.info("Finished bus scan")
         return nodes
 
+    def set_property_window(self, node_id: NodeId, window: int, pipeline_writes: bool = False) -> None:
+        """
+        Set the maximum number of property requests in flight to a node, to match the depth of its receive queue.
+        1 disables pipelining, and with it the repetition of requests whose responses seem to be lost.
+
+        :param pipeline_writes: pipeline & repeat writes like reads; only if the node's write handlers have no side
+                                effects, as a write may then be received twice
+        """
+        self._flow_control[node_id] = FlowControl(window, pipeline_writes=pipeline_writes)
+
+    def _get_flow_control(self, node_id: NodeId) -> FlowControl:
+        flow = self._flow_control.get(node_id)
+
+        if flow is None:
+            flow = self._flow_control[node_id] = FlowControl(self.property_window)
+
+        return flow
+
     def get_property(self, node: Node, property: Property, timeout_sec: float) -> float:
         result, = self.query_properties([(node, property)], timeout_sec=timeout_sec)
 
@@ -99,32 +148,122 @@ class Client:
     def set_property(self, node: Node, property: Property, value: float, timeout_sec: float) -> Any:
         encoded_value = encode_value(property, value)
 
-        pq = PropertyQuery(node.node_id, property.index, encoded_value)
+        (result, error), = self.execute_queries([(node, property, encoded_value)], timeout_sec=timeout_sec)
 
-        execute_state_machine(self.bus, pq, time.monotonic() + timeout_sec)
+        if error is not None:
+            raise error
 
-        logger.debug("%s --> %s", property.name, pq.get_value().hex())
-        return decode_value(property, pq.get_value())
+        return decode_value(property, result)
 
-    def query_properties(self, properties: List[Tuple[Node, Property]], timeout_sec: float) -> List[Optional[bytes]]:
-        resp = []
+    def execute_queries(self, queries: List[Tuple[Node, Property, Optional[bytes]]], timeout_sec: float,
+                        on_result: Optional[Callable[[int, Optional[bytes], Optional[Exception]], None]] = None,
+                        ) -> List[Tuple[Optional[bytes], Optional[Exception]]]:
+        """
+        Read (value None) or write a batch of properties, without giving up on the first failure.
 
-        for dev, prop in properties:
-            # print(dev, prop)
+        :param on_result: called with (index, value, error) as soon as each query completes; see `run_property_queries`
+                          for the thread it is called on
+        :return: (raw value returned by the device, None) or (None, exception) for each query
+        """
+        pqs = [PropertyQuery(node.node_id, prop.index, value) for node, prop, value in queries]
+        results: List[Tuple[Optional[bytes], Optional[Exception]]] = [(None, None)] * len(queries)
 
-            # Query property
-            pq = PropertyQuery(dev.node_id, prop.index)
+        def on_complete(i: int, error: Optional[Exception]):
+            node, prop, _ = queries[i]
 
-            try:
-                execute_state_machine(self.bus, pq, time.monotonic() + timeout_sec)
+            if error is None:
+                logger.debug("%s --> %s", prop.name, pqs[i].get_value().hex())
+                results[i] = (pqs[i].get_value(), None)
 
-                logger.debug("%s --> %s", prop.name, pq.get_value().hex())
-                resp.append(pq.get_value())
-            except ProtocolError as ex:
-                logger.error("Protocol error device %s: %s", dev.name, str(ex))
-                resp.append(None)
-            except Exception as ex:
-                logger.exception(ex)
-                resp.append(None)
+                if self.cache is not None:
+                    self.cache.update(node.node_id, prop, pqs[i].get_value())
+            else:
+                results[i] = (None, error)
+
+            if on_result is not None:
+                on_result(i, *results[i])
+
+        self.run_property_queries(pqs, timeout_sec=timeout_sec, on_complete=on_complete)
+
+        return results
+
+    def run_property_queries(self, pqs: List[PropertyQuery], timeout_sec: float,
+                             on_complete: Optional[Callable[[int, Optional[Exception]], None]] = None,
+                             ) -> List[Optional[Exception]]:
+        """
+        Run a batch of property queries, each with a timeout of `timeout_sec` from when it is sent. All nodes are
+        queried concurrently, each with a pipeline of requests bounded by its window (see `set_property_window`).
+
+        :param on_complete: called with (index, error) as soon as each query completes. This may happen on the thread
+                            dispatching the responses (for a BusHub, its receive thread), so it must return quickly
+                            and must not use the bus.
+        :return: None or the exception for each query
+        """
+        errors: List[Optional[Exception]] = [None] * len(pqs)
+        by_node: Dict[NodeId, List[int]] = {}
+
+        for i, pq in enumerate(pqs):
+            by_node.setdefault(pq.node_id, []).append(i)
+
+        def report(i: int, error: Optional[Exception]):
+            errors[i] = error
+
+            if on_complete is not None:
+                on_complete(i, error)
+
+        pipelines = [PropertyPipeline(node_id, [pqs[i] for i in indices], timeout_sec=timeout_sec,
+                                      flow=self._get_flow_control(node_id),
+                                      on_complete=lambda j, error, indices=indices: report(indices[j], error))
+                     for node_id, indices in by_node.items()]
+
+        # each query times out on its own; this only bounds a pipeline that stalls altogether
+        now = time.monotonic()
+        pipeline_errors = self.bus.execute_many(pipelines, [now + timeout_sec * (len(pipeline.queries) + 1)
+                                                            for pipeline in pipelines])
+
+        for pipeline, indices, pipeline_error in zip(pipelines, by_node.values(), pipeline_errors):
+            completed = set(pipeline.completed)
+
+            for j in range(len(indices)):
+                if j not in completed:
+                    report(indices[j], pipeline_error or TimeoutError())
+
+        return errors
+
+    def query_properties(self, properties: List[Tuple[Node, Property]], timeout_sec: float,
+                         on_result: Optional[Callable[[int, Optional[bytes]], None]] = None) -> List[Optional[bytes]]:
+        """
+        :param on_result: called with (index, value) as soon as each property has been read (value None on error)
+        """
+        resp: List[Optional[bytes]] = [None] * len(properties)
+        to_query = []
+
+        for i, (dev, prop) in enumerate(properties):
+            cached = self.cache.lookup(dev.node_id, prop) if self.cache is not None else None
+
+            if cached is not None:
+                resp[i] = cached
+
+                if on_result is not None:
+                    on_result(i, cached)
+            else:
+                to_query.append(i)
+
+        def on_query_result(j: int, value: Optional[bytes], error: Optional[Exception]):
+            i = to_query[j]
+            dev, prop = properties[i]
+
+            if isinstance(error, ProtocolError):
+                logger.error("Protocol error device %s: %s", dev.name, str(error))
+            elif error is not None:
+                logger.error("Error device %s property %s", dev.name, prop.name, exc_info=error)
+
+            resp[i] = value
+
+            if on_result is not None:
+                on_result(i, value)
+
+        self.execute_queries([(*properties[i], None) for i in to_query], timeout_sec=timeout_sec,
+                             on_result=on_query_result)
 
         return resp
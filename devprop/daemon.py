@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+
+"""
+devpropd: a long-running process that owns the bus adapter and keeps the node registry (including downloaded
+manifests) in memory, serving requests of the CLI tools over a Unix domain socket.
+
+Wire protocol: each request and response is a JSON object, prefixed by its length as a little-endian uint32.
+Raw property values and manifest envelopes are transferred as hex strings.
+
+    {"op": "nodes", "rescan": false, "timeout": 1.0}
+        -> {"nodes": {"<node_id>": "<envelope>", ...}}
+
+    {"op": "query", "items": [[node_id, property_index, "<value to write>" | null], ...], "timeout": 1.0}
+        -> {"values": ["<value>" | null, ...], "errors": [null | "timeout" | "<message>", ...]}
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+import socket
+import struct
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .client import Client, Node
+from .manifest import ManifestEnvelope, parse_enveloped_manifest
+from .model import Property
+from .property import decode_value, encode_value
+from .protocol_can_ext_v1.model import NodeId, ProtocolError
+from .protocol_can_ext_v1.state_machines import PropertyQuery
+
+logger = logging.getLogger(__name__)
+
+
+_LENGTH = struct.Struct("<I")
+MAX_MESSAGE_LENGTH = 16 * 1024 * 1024
+
+
+def get_private_dir() -> Path:
+    """
+    Per-user directory for the sockets where there is no XDG_RUNTIME_DIR, created accessible to its owner only.
+    Sockets directly in the shared temporary directory could be pre-created by any local user, who would then
+    intercept or spoof the bus traffic.
+
+    :raises PermissionError: if the directory exists, but is not a private directory of the current user
+    """
+    import stat
+    import tempfile
+
+    if not hasattr(os, "getuid"):
+        # no Unix domain sockets (nor user IDs) on this platform
+        return Path(tempfile.gettempdir())
+
+    path = Path(tempfile.gettempdir()) / f"devprop-{os.getuid()}"
+
+    try:
+        path.mkdir(mode=0o700)
+    except FileExistsError:
+        pass
+
+    info = os.lstat(path)
+
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f"{path} is not a private directory of the current user")
+
+    return path
+
+
+def get_socket_path(bus_dsn: Optional[str] = None) -> Path:
+    if os.getenv("DEVPROP_SOCKET"):
+        return Path(os.environ["DEVPROP_SOCKET"])
+
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR") or get_private_dir()
+
+    if not bus_dsn:
+        return Path(runtime_dir) / "devpropd.sock"
+    else:
+        safe_name = "".join(c if c.isalnum() else "_" for c in bus_dsn)
+        return Path(runtime_dir) / f"devpropd-{safe_name}.sock"
+
+
+def send_message(sock: socket.socket, message: Dict[str, Any]) -> None:
+    encoded = json.dumps(message, separators=(",", ":")).encode()
+    sock.sendall(_LENGTH.pack(len(encoded)) + encoded)
+
+
+def receive_message(sock: socket.socket) -> Optional[Dict[str, Any]]:
+    """
+    :return: decoded message, or None if the peer closed the connection
+    """
+    header = _receive_exactly(sock, _LENGTH.size)
+
+    if header is None:
+        return None
+
+    length, = _LENGTH.unpack(header)
+
+    if length > MAX_MESSAGE_LENGTH:
+        raise ProtocolError(f"Message too long ({length} bytes)")
+
+    body = _receive_exactly(sock, length)
+
+    if body is None:
+        raise ProtocolError("Connection closed mid-message")
+
+    return json.loads(body)
+
+
+def _receive_exactly(sock: socket.socket, length: int) -> Optional[bytes]:
+    buffer = bytearray()
+
+    while len(buffer) < length:
+        chunk = sock.recv(length - len(buffer))
+
+        if not chunk:
+            return None
+
+        buffer += chunk
+
+    return bytes(buffer)
+
+
+class DaemonClient:
+    """
+    Drop-in replacement for `Client` that forwards all requests to a running devpropd.
+    """
+
+    def __init__(self, sock: socket.socket, rescan: bool = False):
+        self._sock = sock
+        self._rescan = rescan
+        self._lock = threading.Lock()
+
+    def _request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            send_message(self._sock, request)
+            response = receive_message(self._sock)
+
+        if response is None:
+            raise ConnectionError("devpropd closed the connection")
+
+        if "error" in response:
+            raise ProtocolError(response["error"])
+
+        return response
+
+    def enumerate_nodes(self, timeout_sec: float) -> Dict[NodeId, Node]:
+        response = self._request(dict(op="nodes", rescan=self._rescan, timeout=timeout_sec))
+
+        nodes: Dict[NodeId, Node] = {}
+
+        for node_id_str, envelope_hex in response["nodes"].items():
+            node_id = NodeId(int(node_id_str))
+            envelope = ManifestEnvelope(bytes.fromhex(envelope_hex))
+            nodes[node_id] = Node(node_id, parse_enveloped_manifest(envelope), envelope)
+
+        return nodes
+
+    def get_property(self, node: Node, property: Property, timeout_sec: float) -> float:
+        (result, error), = self.execute_queries([(node, property, None)], timeout_sec=timeout_sec)
+
+        if error is not None:
+            raise error
+
+        return decode_value(property, result)
+
+    def set_property(self, node: Node, property: Property, value: float, timeout_sec: float) -> Any:
+        (result, error), = self.execute_queries([(node, property, encode_value(property, value))],
+                                                timeout_sec=timeout_sec)
+
+        if error is not None:
+            raise error
+
+        return decode_value(property, result)
+
+    def execute_queries(self, queries: List[Tuple[Node, Property, Optional[bytes]]], timeout_sec: float,
+                        on_result: Optional[Callable[[int, Optional[bytes], Optional[Exception]], None]] = None,
+                        ) -> List[Tuple[Optional[bytes], Optional[Exception]]]:
+        """
+        :param on_result: called with (index, value, error) for each query once the whole batch has completed
+        """
+        items = [[node.node_id, prop.index, value.hex() if value is not None else None] for node, prop, value in queries]
+        response = self._request(dict(op="query", items=items, timeout=timeout_sec))
+
+        results: List[Tuple[Optional[bytes], Optional[Exception]]] = []
+
+        for value, error in zip(response["values"], response["errors"]):
+            if error == "timeout":
+                results.append((None, TimeoutError()))
+            elif error is not None:
+                results.append((None, ProtocolError(error)))
+            else:
+                results.append((bytes.fromhex(value), None))
+
+        if on_result is not None:
+            for i, result in enumerate(results):
+                on_result(i, *result)
+
+        return results
+
+    def query_properties(self, properties: List[Tuple[Node, Property]], timeout_sec: float) -> List[Optional[bytes]]:
+        items = [[node.node_id, prop.index, None] for node, prop in properties]
+        response = self._request(dict(op="query", items=items, timeout=timeout_sec))
+
+        for (node, prop), error in zip(properties, response["errors"]):
+            if error is not None:
+                logger.error("Error device %s property %s: %s", node.name, prop.name, error)
+
+        return [bytes.fromhex(value) if value is not None else None for value in response["values"]]
+
+
+def connect(bus_dsn: Optional[str] = None, rescan: bool = False) -> Optional[DaemonClient]:
+    """
+    :return: a DaemonClient if a devpropd instance is serving the given bus, otherwise None
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+
+    try:
+        path = get_socket_path(bus_dsn)
+    except PermissionError as ex:
+        logger.warning("Not using devpropd: %s", ex)
+        return None
+
+    if not path.exists():
+        return None
+
+    if not os.getenv("DEVPROP_SOCKET") and path.lstat().st_uid != os.getuid():
+        # only trust a daemon run by the same user, unless the socket was given explicitly
+        logger.warning("Not using devpropd at %s: owned by another user", path)
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        sock.connect(str(path))
+    except OSError as ex:
+        logger.debug("Not using devpropd at %s: %s", path, ex)
+        sock.close()
+        return None
+
+    logger.debug("Using devpropd at %s", path)
+    return DaemonClient(sock, rescan=rescan)
+
+
+def open_client(bus_dsn: Optional[str] = None, use_daemon: bool = True, rescan: bool = False):
+    """
+    Return a DaemonClient if devpropd is running for the bus, otherwise a Client with its own bus adapter.
+    """
+    if use_daemon:
+        daemon_client = connect(bus_dsn, rescan=rescan)
+
+        if daemon_client is not None:
+            return daemon_client
+
+    from .can_bus.transport_plugin import get_adapter
+
+    return Client(get_adapter(bus_dsn))
+
+
+class Daemon:
+    def __init__(self, client: Client, scan_timeout_sec: float):
+        self._client = client
+        self._scan_timeout_sec = scan_timeout_sec
+        self._nodes: Optional[Dict[NodeId, Node]] = None
+
+        # Transactions of concurrent connections are arbitrated by the BusHub that the client is expected to use;
+        # only bus scans are serialized, so that concurrent requests do not trigger redundant scans
+        self._scan_lock = threading.Lock()
+
+    def get_nodes(self, rescan: bool, timeout_sec: float) -> Dict[NodeId, Node]:
+        with self._scan_lock:
+            if self._nodes is None or rescan:
+                self._nodes = self._client.enumerate_nodes(timeout_sec=timeout_sec)
+
+            return self._nodes
+
+    def query(self, items: List[Tuple[NodeId, int, Optional[bytes]]], timeout_sec: float):
+        pqs = [PropertyQuery(node_id, property_index, value) for node_id, property_index, value in items]
+        values = []
+        errors = []
+
+        for pq, error in zip(pqs, self._client.run_property_queries(pqs, timeout_sec=timeout_sec)):
+            if error is None:
+                values.append(pq.get_value())
+                errors.append(None)
+            elif isinstance(error, TimeoutError):
+                values.append(None)
+                errors.append("timeout")
+            else:
+                logger.error("Error node %d property %d: %s", pq.node_id, pq.property_index, error)
+                values.append(None)
+                errors.append(str(error) or type(error).__name__)
+
+        return values, errors
+
+    def handle_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        op = request.get("op")
+        timeout_sec = float(request.get("timeout", self._scan_timeout_sec))
+
+        if op == "nodes":
+            nodes = self.get_nodes(bool(request.get("rescan")), timeout_sec)
+            return dict(nodes={str(node_id): node.envelope.hex() for node_id, node in nodes.items()})
+        elif op == "query":
+            items = [(NodeId(node_id), property_index, bytes.fromhex(value) if value is not None else None)
+                     for node_id, property_index, value in request["items"]]
+            values, errors = self.query(items, timeout_sec)
+            return dict(values=[value.hex() if value is not None else None for value in values], errors=errors)
+        else:
+            return dict(error=f"Unknown operation {op!r}")
+
+    def serve_connection(self, conn: socket.socket) -> None:
+        with conn:
+            while True:
+                try:
+                    request = receive_message(conn)
+                except (OSError, ValueError, ProtocolError) as ex:
+                    logger.warning("Dropping connection: %s", ex)
+                    return
+
+                if request is None:
+                    return
+
+                try:
+                    response = self.handle_request(request)
+                except Exception as ex:
+                    logger.exception(ex)
+                    response = dict(error=str(ex) or type(ex).__name__)
+
+                try:
+                    send_message(conn, response)
+                except OSError:
+                    return
+
+    def serve_forever(self, path: Path) -> None:
+        if path.exists():
+            # refuse to steal the socket of a live daemon; remove a stale one
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+            try:
+                probe.connect(str(path))
+                raise RuntimeError(f"devpropd already running at {path}")
+            except ConnectionRefusedError:
+                path.unlink()
+            finally:
+                probe.close()
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(str(path))
+        server.listen()
+        logger.info("Listening on %s", path)
+
+        try:
+            while True:
+                conn, _ = server.accept()
+                threading.Thread(target=self.serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            server.close()
+            path.unlink()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", "--bus")
+    parser.add_argument("-D", "--debug", dest="debug", action="store_true")
+    parser.add_argument("-T", dest="timeout_sec", type=float, default=1)
+    parser.add_argument("--socket", type=Path)
+    args = parser.parse_args()
+
+    logging.basicConfig()
+    logging.getLogger("devprop").setLevel(logging.DEBUG if args.debug else logging.INFO)
+
+    from .can_bus.hub import BusHub
+    from .can_bus.transport_plugin import get_adapter
+
+    daemon = Daemon(Client(BusHub(get_adapter(args.bus))), scan_timeout_sec=args.timeout_sec)
+
+    # warm up the node registry
+    nodes = daemon.get_nodes(rescan=True, timeout_sec=args.timeout_sec)
+    logger.info("Found %d nodes", len(nodes))
+
+    try:
+        daemon.serve_forever(args.socket or get_socket_path(args.bus))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
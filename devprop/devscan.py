@@ -1,16 +1,16 @@
 import logging
 
-from devprop.can_bus.transport_plugin import get_adapter
-from devprop.client import Client
+from devprop.daemon import open_client
 
 
 def main():
     import argparse
 
     parser = argparse.ArgumentParser()
-    parser.add_argument("-b", "--bus")
+    parser.add_argument("-b", "--bus", action="append", help="may be repeated to scan several buses concurrently")
     parser.add_argument("-D", "--debug", dest="debug", action="store_true")
     parser.add_argument("-T", dest="timeout_sec", type=float, default=1)
+    parser.add_argument("--no-daemon", dest="use_daemon", action="store_false")
     args = parser.parse_args()
 
     logging.basicConfig()
@@ -18,14 +18,25 @@ def main():
     if args.debug:
         logging.getLogger("devprop").setLevel(logging.DEBUG)
 
-    cl = Client(get_adapter(args.bus))
+    multi_bus = args.bus is not None and len(args.bus) > 1
 
-    nodes = cl.enumerate_nodes(timeout_sec=args.timeout_sec)
+    # when going through devpropd, ask it to refresh its node registry
+    if multi_bus:
+        from devprop.multibus import MultiBusClient
+
+        with MultiBusClient.open(args.bus, use_daemon=args.use_daemon, rescan=True) as multi_client:
+            nodes = multi_client.enumerate_nodes(timeout_sec=args.timeout_sec)
+    else:
+        cl = open_client(args.bus[0] if args.bus else None, use_daemon=args.use_daemon, rescan=True)
+
+        nodes = cl.enumerate_nodes(timeout_sec=args.timeout_sec)
 
     print("Detected nodes:")
 
-    for node_id, node in nodes.items():
-        print(f"- node ID: {node_id}")
+    for node in nodes.values():
+        print(f"- node ID: {node.node_id}")
+        if multi_bus:
+            print(f"  bus: {node.bus}")
         print(f"  device: {node.device_name}")
         for prop in node.properties:
             print(f"  property: {prop}")
@@ -1,7 +1,6 @@
 import logging
 
-from devprop.can_bus.transport_plugin import get_adapter
-from devprop.client import Client
+from devprop.daemon import open_client
 
 
 def main():
@@ -11,6 +10,7 @@ def main():
     parser.add_argument("-b", "--bus")
     parser.add_argument("-D", "--debug", dest="debug", action="store_true")
     parser.add_argument("-T", dest="timeout_sec", type=float, default=1)
+    parser.add_argument("--no-daemon", dest="use_daemon", action="store_false")
     parser.add_argument("-d", dest="device", required=True)
     parser.add_argument("property")
     args = parser.parse_args()
@@ -20,7 +20,7 @@ def main():
     if args.debug:
         logging.getLogger("devprop").setLevel(logging.DEBUG)
 
-    cl = Client(get_adapter(args.bus))
+    cl = open_client(args.bus, use_daemon=args.use_daemon)
 
     nodes = cl.enumerate_nodes(timeout_sec=args.timeout_sec)
 
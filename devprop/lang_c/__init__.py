@@ -1,95 +1,150 @@
+import functools
+import hashlib
 from pathlib import Path
+from typing import List, Optional
 
 from devprop.model import Manifest, Property, PropertyType
 
 import jinja2
 
 
+TEMPLATE_DIR = Path(__file__).parent / "templates"
+
+
 def C_identifier(input: str):
     return input.replace(".", "_")
 
 
+def C_const(type: PropertyType):
+    return {
+        PropertyType.UINT8: "DP_UINT8",
+        PropertyType.UINT16: "DP_UINT16",
+        PropertyType.UINT32: "DP_UINT32",
+    }[type]
+
+
+def C_type(type: PropertyType):
+    return {
+        PropertyType.UINT8: "uint8_t",
+        PropertyType.UINT16: "uint16_t",
+        PropertyType.UINT32: "uint32_t",
+    }[type]
+
+
+def C_width(type: PropertyType):
+    return {
+        PropertyType.UINT8: 1,
+        PropertyType.UINT16: 2,
+        PropertyType.UINT32: 4,
+    }[type]
+
+
+def const_raw_value(prop: Property):
+    implementation = prop.additional_attributes.get("implementation", {})
+    # TODO: type + range check
+    return implementation["raw_value"]
+
+
+def getter_function_name(prop: Property):
+    return "get_" + C_identifier(prop.name)
+
+
+def is_const(prop: Property):
+    # TODO: all this validation ought to be done in a pre-pass
+    type = prop.additional_attributes.get("implementation", {}).get("type")
+    assert type in {"const", None}
+    if type == "const":
+        if prop.operations_str != "r":
+            raise Exception(f"Property {prop.name} with implementation.type = 'const' must be 'readonly'")
+    return type == "const"
+
+
+def to_array_literal(blob: bytes, bytes_per_row: int):
+    s = ""
+    for offset in range(0, len(blob), bytes_per_row):
+        s += "    " + ", ".join(f"0x{b:02X}" for b in blob[offset:offset + bytes_per_row]) + ",\n"
+    return s
+
+
+def setter_function(prop: Property):
+    return "set_" + C_identifier(prop.name)
+
+
+@functools.lru_cache(maxsize=None)
+def get_environment() -> jinja2.Environment:
+    # Created once per process and shared by all Codegen instances, so that templates are only loaded
+    # and compiled once when generating code for many nodes
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(TEMPLATE_DIR),
+        trim_blocks=True,
+        lstrip_blocks=True,
+        undefined=jinja2.StrictUndefined,
+    )
+
+    env.filters["C_const"] = C_const
+    env.filters["C_identifier"] = C_identifier
+    env.filters["C_type"] = C_type
+    env.filters["C_width"] = C_width
+    env.filters["const_raw_value"] = const_raw_value
+    env.filters["getter_function"] = getter_function_name
+    env.filters["is_const"] = is_const
+    env.filters["to_array_literal"] = to_array_literal
+    env.filters["setter_function"] = setter_function
+
+    return env
+
+
+@functools.lru_cache(maxsize=None)
+def get_templates_digest() -> str:
+    # Used by the batch compiler to invalidate cached outputs when the code generator changes
+    hash = hashlib.sha1()
+
+    for path in sorted(TEMPLATE_DIR.iterdir()):
+        hash.update(path.name.encode())
+        hash.update(path.read_bytes())
+
+    return hash.hexdigest()
+
+
 class Codegen:
-    def __init__(self, manifest: Manifest, envelope: bytes, module_name: str, node_id: int):
+    def __init__(self, manifest: Manifest, envelope: bytes, module_name: str, node_id: int,
+                 manifest_section: Optional[str] = None):
         self._manifest = manifest
         self._module_name = module_name
         self._envelope = envelope
 
-        self._env = jinja2.Environment(
-            loader=jinja2.FileSystemLoader(Path(__file__).parent / "templates"),
-            trim_blocks=True,
-            lstrip_blocks=True,
-            undefined=jinja2.StrictUndefined,
+        self._env = get_environment()
+
+        self._context = dict(
+            device_name=C_identifier(manifest.device_name),
+            envelope=self._envelope,
+            manifest=manifest,
+            manifest_section=manifest_section,
+            module_name=self._module_name,
+            node_id=node_id,
         )
 
-        def C_const(type: PropertyType):
-            return {
-                PropertyType.UINT8: "DP_UINT8",
-                PropertyType.UINT16: "DP_UINT16",
-                PropertyType.UINT32: "DP_UINT32",
-            }[type]
-
-        def C_type(type: PropertyType):
-            return {
-                PropertyType.UINT8: "uint8_t",
-                PropertyType.UINT16: "uint16_t",
-                PropertyType.UINT32: "uint32_t",
-            }[type]
-
-        def const_raw_value(prop: Property):
-            implementation = prop.additional_attributes.get("implementation", {})
-            # TODO: type + range check
-            return implementation["raw_value"]
-
-        def getter_function_name(prop: Property):
-            return "get_" + C_identifier(prop.name)
-
-        def is_const(prop: Property):
-            # TODO: all this validation ought to be done in a pre-pass
-            type = prop.additional_attributes.get("implementation", {}).get("type")
-            assert type in {"const", None}
-            if type == "const":
-                if prop.operations_str != "r":
-                    raise Exception(f"Property {prop.name} with implementation.type = 'const' must be 'readonly'")
-            return type == "const"
-
-        def to_array_literal(blob: bytes, bytes_per_row: int):
-            s = ""
-            for offset in range(0, len(blob), bytes_per_row):
-                s += "    " + ", ".join(f"0x{b:02X}" for b in blob[offset:offset + bytes_per_row]) + ",\n"
-            return s
-
-        def setter_function(prop: Property):
-            return "set_" + C_identifier(prop.name)
-
-        self._env.filters["C_const"] = C_const
-        self._env.filters["C_identifier"] = C_identifier
-        self._env.filters["C_type"] = C_type
-        self._env.filters["const_raw_value"] = const_raw_value
-        self._env.filters["getter_function"] = getter_function_name
-        self._env.filters["is_const"] = is_const
-        self._env.filters["to_array_literal"] = to_array_literal
-        self._env.filters["setter_function"] = setter_function
-
-        self._env.globals["device_name"] = C_identifier(manifest.device_name)
-        self._env.globals["envelope"] = self._envelope
-        self._env.globals["manifest"] = manifest
-        self._env.globals["module_name"] = self._module_name
-        self._env.globals["node_id"] = node_id
-
-    def generate(self, dir: Path):
-        paths = [
+    def get_output_paths(self):
+        return [
             ("devprop_user.c", f"devprop_{self._module_name}.c"),
             ("devprop_user.h", f"devprop_{self._module_name}.h"),
             ("devprop_user_stubs.c", f"devprop_{self._module_name}_stubs.c"),
         ]
 
-        for template_name, out in paths:
+    def generate(self, dir: Path) -> List[Path]:
+        written = []
+
+        for template_name, out in self.get_output_paths():
             with open(dir / out, "wt") as f:
                 template = self._env.get_template(template_name)
-                f.write(template.render())
+                f.write(template.render(**self._context))
+
+            written.append(dir / out)
+
+        return written
 
 
-def generate(manifest: Manifest, envelope: bytes, module_name: str, node_id: int, output_dir: Path):
-    codegen = Codegen(manifest, envelope, module_name, node_id)
-    codegen.generate(output_dir)
+def generate(manifest: Manifest, envelope: bytes, module_name: str, node_id: int, output_dir: Path,
+             manifest_section: Optional[str] = None) -> List[Path]:
+    codegen = Codegen(manifest, envelope, module_name, node_id, manifest_section=manifest_section)
+    return codegen.generate(output_dir)
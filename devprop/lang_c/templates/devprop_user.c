@@ -3,8 +3,8 @@
 {% for property in manifest.properties %}
 {% set T = property.type | C_type -%}
 
-{% if property.readable %}
-{% if property | is_const %}static {% endif %}{{T}} {{property | getter_function}}(int* error_out);
+{% if property.readable and not property | is_const %}
+{{T}} {{property | getter_function}}(int* error_out);
 {% endif -%}
 
 {% if property.writable %}
@@ -15,21 +15,31 @@
 
 static const dp_Property property_table[] = {
 {% for property in manifest.properties %}
-    {{"{"}}{{"%-11s" | format(property.type | C_const + ", ")}}
-    {%- if property.readable -%}
+    {{"{"}}{{"%-11s" | format(property.type | C_const + ", ")}}{{property.type | C_width}}, 
+    {%- if property | is_const -%}
+    {{" %-20s" | format("DP_PROPERTY_CONST, ")}}
+    {%- else -%}
+    {{" %-20s" | format("0, ")}}
+    {%- endif -%}
+    {%- if property.readable and not property | is_const -%}
     {{"%-45s" | format("(dp_GenericCallback) &" + property | getter_function + ", ")}}
     {%- else -%}
     {{"%-45s" | format("NULL, ")}}
     {%- endif -%}
     {%- if property.writable -%}
-    {{"(dp_GenericCallback) &" + property | setter_function}}
+    {{"%-45s" | format("(dp_GenericCallback) &" + property | setter_function + ", ")}}
+    {%- else -%}
+    {{"%-45s" | format("NULL, ")}}
+    {%- endif -%}
+    {%- if property | is_const -%}
+    {{property | const_raw_value}}u
     {%- else -%}
-    {{"NULL"}}
+    {{"0"}}
     {%- endif -%}{{"}"}},
 {% endfor %}
 };
 
-static const uint8_t manifest_bytes[] = {
+static const uint8_t manifest_bytes[]{% if manifest_section %} __attribute__((section("{{manifest_section}}"), used)){% endif %} = {
 {{ envelope | to_array_literal(16) -}}
 };
 
@@ -38,12 +48,3 @@ void dp_node_init_{{device_name}}(dp_Node* inst) {
                  manifest_bytes, sizeof(manifest_bytes), property_table,
                  sizeof(property_table) / sizeof(property_table[0]));
 }
-
-{% for property in manifest.properties %}
-{% set T = property.type | C_type %}
-{% if property | is_const %}
-static {{T}} {{property | getter_function}}(int* error_out) {
-    return {{ property | const_raw_value }};
-}
-{% endif %}
-{% endfor %}
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+"""
+Link throughput self-test: keeps a window of requests to one node in flight for a while and counts the responses,
+giving the number of frames per second that can be pushed through the adapter, the bridge and the device.
+"""
+
+from dataclasses import dataclass
+import logging
+import time
+
+from .can_bus.adapter import BusAdapter
+from .protocol_can_ext_v1.messages import is_protocol_frame, make_filters, make_read_manifest_request, unpack_id
+from .protocol_can_ext_v1.model import Direction, NodeId, Opcode
+
+logger = logging.getLogger(__name__)
+
+
+# After this long without any response, the requests in flight are considered lost
+RESPONSE_TIMEOUT_SEC = 0.1
+
+
+@dataclass
+class ThroughputResult:
+    sent: int
+    received: int
+    elapsed_sec: float
+
+    @property
+    def frames_per_sec(self) -> float:
+        # every response answers one request, so each of them stands for two frames through the link
+        return 2 * self.received / self.elapsed_sec
+
+    @property
+    def lost(self) -> int:
+        return self.sent - self.received
+
+
+def measure_throughput(bus: BusAdapter, node_id: NodeId, duration_sec: float, window: int) -> ThroughputResult:
+    """
+    :param window: maximum number of requests in flight
+    """
+    bus.set_filters(make_filters(Direction.DEVICE_TO_CLIENT, [node_id]))
+
+    # reading the first manifest segment is side effect-free and yields a full 8-byte response
+    request = make_read_manifest_request(node_id=node_id, segment=0)
+
+    sent = 0
+    received = 0
+    in_flight = 0
+
+    start = time.monotonic()
+    end = start + duration_sec
+
+    while True:
+        now = time.monotonic()
+
+        if now < end and in_flight < window:
+            bus.send_many([request] * (window - in_flight))
+            sent += window - in_flight
+            in_flight = window
+        elif in_flight == 0:
+            break
+
+        try:
+            msg = bus.receive(deadline=time.monotonic() + RESPONSE_TIMEOUT_SEC)
+        except TimeoutError:
+            logger.debug("%d requests lost", in_flight)
+            in_flight = 0
+            continue
+
+        # the filters are best-effort: other traffic may still come through
+        if not is_protocol_frame(msg.id):
+            continue
+
+        msg_node_id, _, opcode, direction = unpack_id(msg.id)
+
+        if msg_node_id == node_id and opcode is Opcode.READ_MANIFEST and direction is Direction.DEVICE_TO_CLIENT:
+            received += 1
+            in_flight -= 1
+
+    return ThroughputResult(sent=sent, received=received, elapsed_sec=time.monotonic() - start)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-b", "--bus")
+    parser.add_argument("-D", "--debug", dest="debug", action="store_true")
+    parser.add_argument("-n", dest="node_id", type=int, required=True)
+    parser.add_argument("-t", dest="duration_sec", type=float, default=5)
+    parser.add_argument("-w", dest="window", type=int, default=8)
+    args = parser.parse_args()
+
+    logging.basicConfig()
+
+    if args.debug:
+        logging.getLogger("devprop").setLevel(logging.DEBUG)
+
+    from .can_bus.transport_plugin import get_adapter
+
+    bus = get_adapter(args.bus)
+
+    result = measure_throughput(bus, NodeId(args.node_id), duration_sec=args.duration_sec, window=args.window)
+
+    print(f"{result.received} of {result.sent} requests answered in {result.elapsed_sec:.2f} s ({result.lost} lost)")
+    print(f"{result.frames_per_sec:.0f} frames/s through the link (requests + responses)")
+
+
+if __name__ == "__main__":
+    main()
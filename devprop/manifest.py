@@ -1,11 +1,9 @@
 from dataclasses import dataclass
-import hashlib
 import logging
 import struct
 from typing import List, NewType, Optional, Sequence
-import zlib
 
-import yaml
+# hashlib, zlib and yaml are imported in the functions that need them, to keep CLI start-up fast
 
 from .model import Manifest, Property, PropertyType
 
@@ -39,9 +37,19 @@ def check_envelope_header(envelope: bytes) -> int:
     return HEADER_LENGTH + length
 
 
+def get_envelope_hash(envelope: ManifestEnvelope) -> bytes:
+    """
+    :return: the truncated hash of the manifest, as stored in the envelope header
+    """
+    return envelope[0:4]
+
+
 def add_envelope(manifest_payload: bytes, version: int) -> ManifestEnvelope:
     assert version == DRAFT_CSV_ZLIB
 
+    import hashlib
+    import zlib
+
     # compress
     compressed = zlib.compress(manifest_payload, level=9)
 
@@ -61,6 +69,9 @@ def parse_enveloped_manifest(envelope: ManifestEnvelope) -> Manifest:
     assert len(compressed_data) == length
 
     if version == DRAFT_CSV_ZLIB:
+        import hashlib
+        import zlib
+
         hash_computed = hashlib.sha1(compressed_data)
         assert hash_computed.digest()[0:4] == hash
         manifest_bytes = zlib.decompress(compressed_data)
@@ -88,6 +99,8 @@ def parse_manifest_draft_csv(encoded: bytes) -> Manifest:
 
 
 def parse_manifest_yaml(input) -> Manifest:
+    import yaml
+
     device_model = yaml.safe_load(input)
 
     device_name = device_model["device_name"]
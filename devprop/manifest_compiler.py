@@ -1,39 +1,325 @@
 #!/usr/bin/env python3
 
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import hashlib
+import json
 import logging
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
+from . import VERSION
 from .manifest import add_envelope, HEADER_LENGTH, parse_manifest_draft_csv, parse_manifest_yaml, serialize_manifest_draft_csv, validate_manifest, DRAFT_CSV_ZLIB
-from .protocol_can_ext_v1.model import SEGMENT_SIZE
+from .model import Manifest
+from .protocol_can_ext_v1.model import MAX_NODE_ID, SEGMENT_SIZE
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("path", type=Path)
-    parser.add_argument("-o", dest="output", type=Path)
-    parser.add_argument("-O", dest="output_dir", type=Path, default=Path("."))
-    parser.add_argument("--generate-lang", choices=["C"])
-    parser.add_argument("--node-id", type=int)
-    args = parser.parse_args()
+CACHE_FILE_NAME = ".devprop-mkmanifest.json"
+MANIFEST_SUFFIXES = {".csv", ".yml", ".yaml"}
 
-    logging.basicConfig()
 
-    if args.path.suffix.lower() in {".yml", ".yaml"}:
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CompileJob:
+    path: Path
+    node_id: Optional[int]
+    digest: str
+
+
+@dataclass
+class CompileResult:
+    job: CompileJob
+    device_name: str
+    outputs: List[str]
+    errors: List[str]
+
+
+def load_manifest(path: Path) -> Tuple[Manifest, bytes]:
+    """
+    :return: (manifest, manifest_payload)
+    """
+    if path.suffix.lower() in {".yml", ".yaml"}:
         # YAML manifest
-        with open(args.path, "rt") as f:
+        with open(path, "rt") as f:
             manifest = parse_manifest_yaml(f)
 
         manifest_payload = serialize_manifest_draft_csv(manifest)
     else:
         # CSV manifest
-        with open(args.path, "rb") as f:
+        with open(path, "rb") as f:
             manifest_payload = f.read()
 
         # validate & generate HTML doc
         # TODO
         manifest = parse_manifest_draft_csv(manifest_payload)
 
+    return manifest, manifest_payload
+
+
+def is_project_file(path: Path) -> bool:
+    if path.suffix.lower() not in {".yml", ".yaml"}:
+        return False
+
+    import yaml
+
+    with open(path, "rt") as f:
+        document = yaml.safe_load(f)
+
+    return isinstance(document, dict) and "manifests" in document
+
+
+def find_manifests(path: Path) -> Dict[Path, Optional[int]]:
+    """
+    Build the list of manifests to compile from either a project file or a directory.
+
+    A project file maps manifest paths (relative to the project file) to node IDs::
+
+        manifests:
+          FSE10.AMS.yml: 7
+          FSE10.FSB.yml: 3
+
+    When a directory is given, all manifests in it are compiled, and the node ID is taken
+    from an optional top-level ``node_id`` key of each YAML manifest.
+
+    :return: mapping of manifest path to node ID (None if not specified)
+    """
+    import yaml
+
+    if path.is_dir():
+        manifests = {}
+
+        for manifest_path in sorted(path.iterdir()):
+            if manifest_path.suffix.lower() not in MANIFEST_SUFFIXES:
+                continue
+
+            node_id = None
+
+            if manifest_path.suffix.lower() != ".csv":
+                with open(manifest_path, "rt") as f:
+                    document = yaml.safe_load(f)
+
+                # skip project files and anything else that is not a manifest
+                if not isinstance(document, dict) or "device_name" not in document:
+                    continue
+
+                node_id = document.get("node_id")
+
+            manifests[manifest_path] = node_id
+
+        return manifests
+    else:
+        with open(path, "rt") as f:
+            document = yaml.safe_load(f)
+
+        return {path.parent / manifest_path: node_id for manifest_path, node_id in document["manifests"].items()}
+
+
+def check_node_ids(manifests: Dict[Path, Optional[int]]) -> List[str]:
+    errors = []
+    owner_by_node_id: Dict[int, Path] = {}
+
+    for path, node_id in manifests.items():
+        if node_id is None:
+            continue
+
+        if not isinstance(node_id, int) or node_id < 0 or node_id >= MAX_NODE_ID:
+            errors.append(f"{path}: invalid node ID {node_id!r}")
+        elif node_id in owner_by_node_id:
+            errors.append(f"{path}: node ID {node_id} already assigned to {owner_by_node_id[node_id]}")
+        else:
+            owner_by_node_id[node_id] = path
+
+    return errors
+
+
+def check_device_names(device_names: Dict[Path, str]) -> Dict[Path, str]:
+    """
+    Outputs are named after the device (see `compile_one`), so no two manifests may map to the same name.
+
+    :param device_names: device name of each manifest
+    :return: error for each manifest which must not be compiled
+    """
+    from . import lang_c
+
+    errors = {}
+    owner_by_module_name: Dict[str, Path] = {}
+
+    for path, device_name in device_names.items():
+        module_name = lang_c.C_identifier(device_name)
+
+        if module_name in owner_by_module_name:
+            errors[path] = (f"{path}: outputs of device {device_name} would overwrite those of "
+                            f"{owner_by_module_name[module_name]}")
+        else:
+            owner_by_module_name[module_name] = path
+
+    return errors
+
+
+def compute_job_digest(path: Path, node_id: Optional[int], generate_lang: Optional[str],
+                       manifest_section: Optional[str]) -> str:
+    hash = hashlib.sha1()
+    hash.update(VERSION.encode())
+    hash.update(repr((node_id, generate_lang, manifest_section)).encode())
+
+    if generate_lang == "C":
+        from . import lang_c
+
+        hash.update(lang_c.get_templates_digest().encode())
+
+    hash.update(path.read_bytes())
+    return hash.hexdigest()
+
+
+def compile_one(job: CompileJob, generate_lang: Optional[str], output_dir: Path,
+                manifest_section: Optional[str]) -> CompileResult:
+    # Executed in a worker process
+    manifest, manifest_payload = load_manifest(job.path)
+
+    errors = [f"manifest validation error: {error}" for error in validate_manifest(manifest)]
+
+    envelope = add_envelope(manifest_payload, DRAFT_CSV_ZLIB)
+
+    from . import lang_c
+
+    module_name = lang_c.C_identifier(manifest.device_name)
+
+    envelope_path = output_dir / f"{module_name}.bin"
+    envelope_path.write_bytes(envelope)
+    outputs = [envelope_path]
+
+    if generate_lang == "C":
+        if job.node_id is None:
+            errors.append("node ID required for code generation")
+        else:
+            outputs += lang_c.generate(manifest=manifest, envelope=envelope, module_name=module_name,
+                                       node_id=job.node_id, output_dir=output_dir, manifest_section=manifest_section)
+
+    return CompileResult(job, manifest.device_name, [str(path) for path in outputs], errors)
+
+
+def compile_batch(path: Path, output_dir: Path, generate_lang: Optional[str], jobs: Optional[int], force: bool,
+                  manifest_section: Optional[str] = None) -> bool:
+    manifests = find_manifests(path)
+
+    errors = check_node_ids(manifests)
+
+    for error in errors:
+        logger.error("%s", error)
+
+    if errors:
+        return False
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    cache_path = output_dir / CACHE_FILE_NAME
+
+    try:
+        cache = json.loads(cache_path.read_text())
+    except (FileNotFoundError, ValueError):
+        cache = {}
+
+    ok = True
+
+    # skip inputs which have not changed since the last run, as long as their outputs are still around
+    pending = []
+    device_names: Dict[Path, str] = {}
+
+    for manifest_path, node_id in manifests.items():
+        job = CompileJob(manifest_path, node_id, compute_job_digest(manifest_path, node_id, generate_lang, manifest_section))
+        cached = cache.get(str(manifest_path))
+
+        if (not force and cached is not None and cached["digest"] == job.digest and
+                all(Path(output).exists() for output in cached["outputs"])):
+            print(f"{manifest_path}: up to date")
+            device_names[manifest_path] = cached["device_name"]
+            continue
+
+        try:
+            device_names[manifest_path] = load_manifest(manifest_path)[0].device_name
+        except Exception as ex:
+            logger.error("%s: %s", manifest_path, ex)
+            cache.pop(str(manifest_path), None)
+            ok = False
+            continue
+
+        pending.append(job)
+
+    # resolved before any worker writes its outputs, so that which of two colliding manifests wins does not depend on
+    # timing; the losers are left out of the cache, so that the collision is reported again on the next run
+    collisions = check_device_names(device_names)
+
+    for manifest_path, error in collisions.items():
+        logger.error("%s", error)
+        cache.pop(str(manifest_path), None)
+        ok = False
+
+    pending = [job for job in pending if job.path not in collisions]
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(compile_one, job, generate_lang, output_dir, manifest_section) for job in pending]
+
+        for job, future in zip(pending, futures):
+            try:
+                result = future.result()
+            except Exception as ex:
+                logger.error("%s: %s", job.path, ex)
+                cache.pop(str(job.path), None)
+                ok = False
+                continue
+
+            for error in result.errors:
+                logger.error("%s: %s", result.job.path, error)
+
+            if result.errors:
+                # force recompilation next time, so that the errors are not silently forgotten
+                cache.pop(str(result.job.path), None)
+                ok = False
+            else:
+                cache[str(result.job.path)] = dict(digest=result.job.digest, device_name=result.device_name,
+                                                   outputs=result.outputs)
+
+            print(f"{result.job.path}: {result.device_name}", "->", ", ".join(Path(output).name for output in result.outputs))
+
+    cache_path.write_text(json.dumps(cache, indent=2))
+
+    print(f"compiled {len(pending)} of {len(manifests)} manifests")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", type=Path)
+    parser.add_argument("-o", dest="output", type=Path)
+    parser.add_argument("-O", dest="output_dir", type=Path, default=Path("."))
+    parser.add_argument("--generate-lang", choices=["C"])
+    parser.add_argument("--node-id", type=int)
+    parser.add_argument("--manifest-section")
+    parser.add_argument("-j", dest="jobs", type=int)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig()
+
+    if args.path.is_dir() or is_project_file(args.path):
+        # batch mode: directory or project file
+        if args.output is not None or args.node_id is not None:
+            parser.error("-o and --node-id cannot be used with a directory or project file")
+
+        if not compile_batch(args.path, args.output_dir, args.generate_lang, args.jobs, args.force,
+                             manifest_section=args.manifest_section):
+            raise SystemExit(1)
+
+        return
+
+    if args.generate_lang == "C" and args.node_id is None:
+        parser.error("--node-id is required to generate code")
+
+    manifest, manifest_payload = load_manifest(args.path)
+
     errors = validate_manifest(manifest)
 
     for error in errors:
@@ -51,14 +337,14 @@ def main():
     print("manifest wire length:", len(envelope), "bytes =", (len(envelope) + SEGMENT_SIZE - 1) // SEGMENT_SIZE, "segments")
 
     if args.generate_lang == "C":
-        assert args.node_id is not None
 
         from . import lang_c
 
         module_name = lang_c.C_identifier(manifest.device_name)
 
         args.output_dir.mkdir(exist_ok=True)
-        lang_c.generate(manifest=manifest, envelope=envelope, module_name=module_name, node_id=args.node_id, output_dir=args.output_dir)
+        lang_c.generate(manifest=manifest, envelope=envelope, module_name=module_name, node_id=args.node_id, output_dir=args.output_dir,
+                        manifest_section=args.manifest_section)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 from enum import Enum
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 
 class PropertyType(Enum):
@@ -45,6 +45,11 @@ class Property:
     def writable(self):
         return "w" in self.operations_str
 
+    @property
+    def implementation_type(self) -> Optional[str]:
+        # only known for manifests loaded from YAML
+        return (self.additional_attributes or {}).get("implementation", {}).get("type")
+
 @dataclass
 class Manifest:
     device_name: str
@@ -0,0 +1,162 @@
+"""
+Client for several CAN buses at once. Every bus gets its own client and worker thread, so that scans and queries
+on different buses run concurrently: a scan of all buses takes as long as the slowest one, not the sum.
+
+Nodes are identified by bus-qualified names, "<bus>:<device>@<node_id>", as node IDs are only unique per bus.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from .client import Node
+from .model import Property
+from .property import decode_value, encode_value
+from .protocol_can_ext_v1.model import NodeId
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BusNode:
+    bus: str
+    node: Node
+
+    @property
+    def name(self) -> str:
+        return f"{self.bus}:{self.node.name}"
+
+    @property
+    def node_id(self) -> NodeId:
+        return self.node.node_id
+
+    @property
+    def device_name(self) -> str:
+        return self.node.device_name
+
+    @property
+    def properties(self) -> List[Property]:
+        return self.node.properties
+
+    def get_property_path(self, property: Property):
+        return f"{self.bus}:{self.node.get_property_path(property)}"
+
+
+class MultiBusClient:
+    def __init__(self, clients: Dict[str, Any]):
+        """
+        :param clients: Client or DaemonClient by bus name
+        """
+        self.clients = clients
+
+        # one thread per bus: transactions on a bus stay sequential, buses proceed in parallel
+        self._executors = {bus: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"devprop {bus}")
+                           for bus in clients}
+
+    @classmethod
+    def open(cls, bus_dsns: List[str], use_daemon: bool = True, rescan: bool = False) -> "MultiBusClient":
+        """
+        :param bus_dsns: one DSN per bus, as accepted by `get_adapter`; they also serve as the bus names
+        """
+        from .daemon import open_client
+
+        if len(set(bus_dsns)) != len(bus_dsns):
+            raise ValueError("Duplicate bus DSN")
+
+        return cls({dsn: open_client(dsn, use_daemon=use_daemon, rescan=rescan) for dsn in bus_dsns})
+
+    def close(self) -> None:
+        for executor in self._executors.values():
+            executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def enumerate_nodes(self, timeout_sec: float) -> Dict[str, BusNode]:
+        """
+        Scan all buses concurrently. A bus that fails to scan is logged and left out.
+
+        :return: nodes by bus-qualified name
+        """
+        futures = {bus: self._executors[bus].submit(client.enumerate_nodes, timeout_sec=timeout_sec)
+                   for bus, client in self.clients.items()}
+        nodes: Dict[str, BusNode] = {}
+
+        for bus, future in futures.items():
+            try:
+                bus_nodes = future.result()
+            except Exception as ex:
+                logger.error("Scan of bus %s failed", bus, exc_info=ex)
+                continue
+
+            for node in bus_nodes.values():
+                bus_node = BusNode(bus, node)
+                nodes[bus_node.name] = bus_node
+
+        return nodes
+
+    def get_property(self, node: BusNode, property: Property, timeout_sec: float) -> float:
+        (result, error), = self.execute_queries([(node, property, None)], timeout_sec=timeout_sec)
+
+        if error is not None:
+            raise error
+
+        return decode_value(property, result)
+
+    def set_property(self, node: BusNode, property: Property, value: float, timeout_sec: float) -> Any:
+        (result, error), = self.execute_queries([(node, property, encode_value(property, value))],
+                                                timeout_sec=timeout_sec)
+
+        if error is not None:
+            raise error
+
+        return decode_value(property, result)
+
+    def execute_queries(self, queries: List[Tuple[BusNode, Property, Optional[bytes]]],
+                        timeout_sec: float) -> List[Tuple[Optional[bytes], Optional[Exception]]]:
+        """
+        Read (value None) or write a batch of properties; the part of the batch for each bus runs on that bus's
+        worker, concurrently with the other buses.
+
+        :return: (raw value returned by the device, None) or (None, exception) for each query
+        """
+        by_bus: Dict[str, List[int]] = {}
+
+        for i, (node, _, _) in enumerate(queries):
+            by_bus.setdefault(node.bus, []).append(i)
+
+        futures: Dict[str, Future] = {}
+
+        for bus, indices in by_bus.items():
+            bus_queries = [(queries[i][0].node, queries[i][1], queries[i][2]) for i in indices]
+            futures[bus] = self._executors[bus].submit(self.clients[bus].execute_queries, bus_queries,
+                                                       timeout_sec=timeout_sec)
+
+        results: List[Tuple[Optional[bytes], Optional[Exception]]] = [(None, None)] * len(queries)
+
+        for bus, future in futures.items():
+            try:
+                bus_results = future.result()
+            except Exception as ex:
+                # e.g. the daemon connection of this bus went away
+                bus_results = [(None, ex)] * len(by_bus[bus])
+
+            for i, result in zip(by_bus[bus], bus_results):
+                results[i] = result
+
+        return results
+
+    def query_properties(self, properties: List[Tuple[BusNode, Property]],
+                         timeout_sec: float) -> List[Optional[bytes]]:
+        results = self.execute_queries([(node, prop, None) for node, prop in properties], timeout_sec=timeout_sec)
+
+        for (node, prop), (_, error) in zip(properties, results):
+            if error is not None:
+                logger.error("Error device %s property %s: %s", node.name, prop.name,
+                             str(error) or type(error).__name__)
+
+        return [value for value, _ in results]
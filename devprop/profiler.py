@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+
+"""
+devprop-profile: scan the bus and read all properties of all nodes a number of times, with every transaction
+timed, then report response times per node & property and manifest download durations.
+
+The `Profiler` can also be passed to any `Client` to profile an application.
+"""
+
+from dataclasses import asdict, dataclass, field
+import json
+import logging
+import math
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .can_bus.adapter import Message, StateMachine, TransactionObserver
+from .protocol_can_ext_v1.model import NodeId
+from .protocol_can_ext_v1.state_machines import BusScan, ManifestDownload, PropertyPipeline, PropertyQuery
+
+logger = logging.getLogger(__name__)
+
+
+# Upper bounds of the latency buckets of the heatmap, in milliseconds
+HEATMAP_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, math.inf]
+HEATMAP_SHADES = " .:-=+*#%@"
+
+
+@dataclass
+class TransactionRecord:
+    kind: str                           # "scan", "manifest", "read", "write", or the state machine class name
+    node_id: Optional[NodeId]
+    property_index: Optional[int]
+    started_at: float
+    finished_at: Optional[float] = None
+    outcome: str = "pending"            # "ok", "timeout", "error"
+    error: Optional[str] = None
+    frames_sent: int = 0
+    frames_received: int = 0
+    round_trips_sec: List[float] = field(default_factory=list)
+
+    @property
+    def duration_sec(self) -> Optional[float]:
+        return self.finished_at - self.started_at if self.finished_at is not None else None
+
+
+def _describe(sm: StateMachine) -> Tuple[str, Optional[NodeId], Optional[int]]:
+    if isinstance(sm, PropertyQuery):
+        return ("read" if sm.is_read else "write"), sm.node_id, sm.property_index
+    elif isinstance(sm, ManifestDownload):
+        return "manifest", sm.node_id, None
+    elif isinstance(sm, BusScan):
+        return "scan", None, None
+    else:
+        return type(sm).__name__, None, None
+
+
+def _exchange_key(msg: Message) -> Tuple[int, int]:
+    # a response carries the node ID & property index (or manifest segment) of its request, but not the same opcode
+    return (msg.id >> 11) & 31, msg.id & 0xFF
+
+
+def _finish_record(record: TransactionRecord, error: Optional[Exception], timestamp: float) -> None:
+    record.finished_at = timestamp
+
+    if error is None:
+        record.outcome = "ok"
+    elif isinstance(error, TimeoutError):
+        record.outcome = "timeout"
+    else:
+        record.outcome = "error"
+        record.error = str(error) or type(error).__name__
+
+
+class Profiler(TransactionObserver):
+    """
+    Records a `TransactionRecord` for every transaction executed on the bus it is attached to, including
+    the round trip time of each request/response exchange within a transaction (e.g. each manifest segment).
+
+    A `PropertyPipeline` is recorded as one "read" or "write" transaction per query, each from its first request
+    until its completion, as if the queries had been executed separately.
+    """
+
+    def __init__(self):
+        self.records: List[TransactionRecord] = []
+
+        self._lock = threading.Lock()
+        self._in_flight: Dict[int, TransactionRecord] = {}
+        # send times of outstanding requests, by transaction & exchange key
+        self._sent_at: Dict[int, Dict[Tuple[int, int], float]] = {}
+        # records of the queries of pipelines, by pipeline & query index
+        self._pipeline_queries: Dict[int, Dict[int, TransactionRecord]] = {}
+
+    def transaction_started(self, sm: StateMachine, timestamp: float) -> None:
+        with self._lock:
+            self._sent_at[id(sm)] = {}
+
+            if isinstance(sm, PropertyPipeline):
+                self._pipeline_queries[id(sm)] = {}
+                return
+
+            record = TransactionRecord(*_describe(sm), started_at=timestamp)
+            self._in_flight[id(sm)] = record
+            self.records.append(record)
+
+    def _get_record(self, sm: StateMachine, msg: Message, timestamp: Optional[float] = None,
+                    ) -> Optional[TransactionRecord]:
+        """
+        :param timestamp: for a pipeline, start a record for the query at this time if there is none yet
+        """
+        if not isinstance(sm, PropertyPipeline):
+            return self._in_flight.get(id(sm))
+
+        queries = self._pipeline_queries.get(id(sm))
+        query = sm.get_query_in_flight(_exchange_key(msg)[1])
+
+        if queries is None or query is None:
+            return None
+
+        record = queries.get(query)
+
+        if record is None and timestamp is not None:
+            record = queries[query] = TransactionRecord(*_describe(sm.queries[query]), started_at=timestamp)
+            self.records.append(record)
+
+        return record
+
+    def frame_sent(self, sm: StateMachine, msg: Message, timestamp: float) -> None:
+        with self._lock:
+            record = self._get_record(sm, msg, timestamp)
+
+            if record is not None:
+                record.frames_sent += 1
+                self._sent_at[id(sm)][_exchange_key(msg)] = timestamp
+
+    def frame_received(self, sm: StateMachine, msg: Message, timestamp: float) -> None:
+        with self._lock:
+            record = self._get_record(sm, msg)
+
+            if record is None:
+                return
+
+            record.frames_received += 1
+            sent_at = self._sent_at[id(sm)].pop(_exchange_key(msg), None)
+
+            if sent_at is not None:
+                record.round_trips_sec.append(timestamp - sent_at)
+
+    def transaction_finished(self, sm: StateMachine, error: Optional[Exception], timestamp: float) -> None:
+        with self._lock:
+            record = self._in_flight.pop(id(sm), None)
+            queries = self._pipeline_queries.pop(id(sm), None)
+            self._sent_at.pop(id(sm), None)
+
+            if queries is not None:
+                for query, query_record in queries.items():
+                    if sm.completed_at[query] is not None:
+                        _finish_record(query_record, sm.errors[query], sm.completed_at[query])
+                    else:
+                        _finish_record(query_record, error or TimeoutError(), timestamp)
+
+        if record is not None:
+            _finish_record(record, error, timestamp)
+
+    def report(self, node_names: Optional[Dict[NodeId, str]] = None,
+               property_names: Optional[Dict[Tuple[NodeId, int], str]] = None) -> "ProfileReport":
+        """
+        :param node_names: optional display names by node ID
+        :param property_names: optional display names by (node ID, property index)
+        """
+        with self._lock:
+            records = [record for record in self.records if record.outcome != "pending"]
+
+        return ProfileReport(records, node_names or {}, property_names or {})
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted, non-empty list.
+    """
+    return sorted_values[max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)]
+
+
+def _latency_stats(values_sec: List[float]) -> Dict[str, Any]:
+    values = sorted(value * 1000 for value in values_sec)
+
+    if not values:
+        return dict(count=0)
+
+    return dict(count=len(values),
+                p50_ms=round(percentile(values, 50), 3),
+                p90_ms=round(percentile(values, 90), 3),
+                p99_ms=round(percentile(values, 99), 3),
+                max_ms=round(values[-1], 3))
+
+
+class ProfileReport:
+    def __init__(self, records: List[TransactionRecord], node_names: Dict[NodeId, str],
+                 property_names: Dict[Tuple[NodeId, int], str]):
+        self.records = records
+        self._node_names = node_names
+        self._property_names = property_names
+
+    def _node_name(self, node_id: NodeId) -> str:
+        return self._node_names.get(node_id, f"node {node_id}")
+
+    def _property_name(self, node_id: NodeId, index: int) -> str:
+        name = self._property_names.get((node_id, index), f"#{index}")
+        return f"{self._node_name(node_id)}/{name}"
+
+    def _property_records(self) -> List[TransactionRecord]:
+        return [record for record in self.records if record.kind in {"read", "write"}]
+
+    def by_node(self) -> Dict[NodeId, Dict[str, Any]]:
+        """
+        Response time percentiles of property accesses, per node. Timeouts count separately, not as latencies.
+        """
+        grouped: Dict[NodeId, List[TransactionRecord]] = {}
+
+        for record in self._property_records():
+            grouped.setdefault(record.node_id, []).append(record)
+
+        return {node_id: dict(name=self._node_name(node_id),
+                              **_latency_stats([rt for record in records for rt in record.round_trips_sec]),
+                              timeouts=sum(record.outcome == "timeout" for record in records),
+                              errors=sum(record.outcome == "error" for record in records))
+                for node_id, records in sorted(grouped.items())}
+
+    def by_property(self) -> List[Dict[str, Any]]:
+        grouped: Dict[Tuple[NodeId, int], List[TransactionRecord]] = {}
+
+        for record in self._property_records():
+            grouped.setdefault((record.node_id, record.property_index), []).append(record)
+
+        return [dict(name=self._property_name(*key), node_id=key[0], property_index=key[1],
+                     **_latency_stats([rt for record in records for rt in record.round_trips_sec]),
+                     timeouts=sum(record.outcome == "timeout" for record in records),
+                     errors=sum(record.outcome == "error" for record in records))
+                for key, records in sorted(grouped.items())]
+
+    def manifest_downloads(self) -> List[Dict[str, Any]]:
+        return [dict(name=self._node_name(record.node_id), node_id=record.node_id, outcome=record.outcome,
+                     duration_ms=round(record.duration_sec * 1000, 3), segments=record.frames_received,
+                     segment_round_trip=_latency_stats(record.round_trips_sec))
+                for record in self.records if record.kind == "manifest"]
+
+    def heatmap(self) -> Dict[NodeId, List[int]]:
+        """
+        :return: per node, the number of property round trips in each of `HEATMAP_BUCKETS_MS`, plus timeouts
+        """
+        rows: Dict[NodeId, List[int]] = {}
+
+        for record in self._property_records():
+            row = rows.setdefault(record.node_id, [0] * (len(HEATMAP_BUCKETS_MS) + 1))
+
+            for round_trip in record.round_trips_sec:
+                row[next(i for i, bound in enumerate(HEATMAP_BUCKETS_MS) if round_trip * 1000 < bound)] += 1
+
+            if record.outcome == "timeout":
+                row[-1] += 1
+
+        return dict(sorted(rows.items()))
+
+    def to_json(self) -> Dict[str, Any]:
+        return dict(nodes=[dict(node_id=node_id, **stats) for node_id, stats in self.by_node().items()],
+                    properties=self.by_property(),
+                    manifest_downloads=self.manifest_downloads(),
+                    heatmap=dict(buckets_ms=[bound if math.isfinite(bound) else None for bound in HEATMAP_BUCKETS_MS],
+                                 nodes={str(node_id): row for node_id, row in self.heatmap().items()}),
+                    transactions=[asdict(record) for record in self.records])
+
+    def format_text(self) -> str:
+        lines = []
+
+        def latency_columns(stats: Dict[str, Any]) -> str:
+            if not stats["count"]:
+                return f"{'-':>8} {'-':>8} {'-':>8} {'-':>8}"
+
+            return " ".join(f"{stats[key]:8.2f}" for key in ["p50_ms", "p90_ms", "p99_ms", "max_ms"])
+
+        header = f"{'count':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'t/o':>5} {'err':>5}"
+
+        lines.append("Response times per node:")
+        nodes = self.by_node()
+        width = max([len(stats["name"]) for stats in nodes.values()] + [4])
+        lines.append(f"  {'node':<{width}} {header}")
+
+        for stats in nodes.values():
+            lines.append(f"  {stats['name']:<{width}} {stats['count']:6d} {latency_columns(stats)} "
+                         f"{stats['timeouts']:5d} {stats['errors']:5d}")
+
+        lines.append("")
+        lines.append("Response times per property (slowest first):")
+        properties = sorted(self.by_property(), key=lambda stats: (-stats["timeouts"], -stats.get("p99_ms", 0)))
+        width = max([len(stats["name"]) for stats in properties] + [8])
+        lines.append(f"  {'property':<{width}} {header}")
+
+        for stats in properties:
+            lines.append(f"  {stats['name']:<{width}} {stats['count']:6d} {latency_columns(stats)} "
+                         f"{stats['timeouts']:5d} {stats['errors']:5d}")
+
+        downloads = self.manifest_downloads()
+
+        if downloads:
+            lines.append("")
+            lines.append("Manifest downloads:")
+
+            for download in downloads:
+                segment_stats = download["segment_round_trip"]
+                lines.append(f"  {download['name']}: {download['outcome']}, {download['duration_ms']:.1f} ms, "
+                             f"{download['segments']} segments"
+                             + (f", segment round trip p50 {segment_stats['p50_ms']:.2f} ms "
+                                f"max {segment_stats['max_ms']:.2f} ms" if segment_stats["count"] else ""))
+
+        heatmap = self.heatmap()
+
+        if heatmap:
+            lines.append("")
+            lines.append("Round trip heatmap (columns: < " +
+                         ", ".join(f"{bound:g}" for bound in HEATMAP_BUCKETS_MS[:-1]) + " ms, more, timeouts):")
+            width = max(len(self._node_name(node_id)) for node_id in heatmap)
+            peak = max(max(row) for row in heatmap.values()) or 1
+
+            for node_id, row in heatmap.items():
+                # shade relative to the busiest cell; any non-zero count is visible
+                shades = "".join(HEATMAP_SHADES[math.ceil(count / peak * (len(HEATMAP_SHADES) - 1))] for count in row)
+                lines.append(f"  {self._node_name(node_id):<{width}} |{shades}|")
+
+        return "\n".join(lines)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-b", "--bus")
+    parser.add_argument("-D", "--debug", dest="debug", action="store_true")
+    parser.add_argument("-T", dest="timeout_sec", type=float, default=1)
+    parser.add_argument("-n", dest="rounds", type=int, default=10, help="how many times to read all properties")
+    parser.add_argument("--json", dest="json_file", help="write the full report as JSON to this file ('-' = stdout)")
+    args = parser.parse_args()
+
+    logging.basicConfig()
+
+    if args.debug:
+        logging.getLogger("devprop").setLevel(logging.DEBUG)
+
+    from .can_bus.transport_plugin import get_adapter
+    from .client import Client
+
+    # the transactions must run in this process to be timed, so devpropd is never used here
+    profiler = Profiler()
+    cl = Client(get_adapter(args.bus), profiler=profiler)
+
+    nodes = cl.enumerate_nodes(timeout_sec=args.timeout_sec)
+    properties = [(node, prop) for node in nodes.values() for prop in node.properties if prop.readable]
+
+    for i in range(args.rounds):
+        cl.execute_queries([(node, prop, None) for node, prop in properties], timeout_sec=args.timeout_sec)
+
+    report = profiler.report(node_names={node_id: node.name for node_id, node in nodes.items()},
+                             property_names={(node.node_id, prop.index): prop.name for node, prop in properties})
+
+    if args.json_file == "-":
+        print(json.dumps(report.to_json(), indent=2))
+    else:
+        print(report.format_text())
+
+        if args.json_file:
+            with open(args.json_file, "wt") as f:
+                json.dump(report.to_json(), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
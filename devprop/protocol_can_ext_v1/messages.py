@@ -1,6 +1,6 @@
-from typing import Tuple
+from typing import Iterable, List, Optional, Tuple
 
-from devprop.can_bus.adapter import Message
+from devprop.can_bus.adapter import FrameFilter, Message
 from .model import (
     Direction,
     ErrorCode,
@@ -13,6 +13,27 @@ from .model import (
 )
 
 
+_OPCODE_VALUES = frozenset(opcode.value for opcode in Opcode)
+
+
+def is_protocol_frame(id: int) -> bool:
+    # frames with a reserved opcode cannot be decoded by `unpack_id`, so they do not count as protocol frames
+    return (id & ID_FIXED_MASK) == ID_FIXED_PART and (id >> 8) & 7 in _OPCODE_VALUES
+
+
+def make_filters(direction: Direction, node_ids: Optional[Iterable[int]] = None) -> List[FrameFilter]:
+    """
+    Build acceptance filters matching protocol frames going in `direction`, optionally only those of specific nodes.
+    """
+    id = ID_FIXED_PART | (direction.value << 16)
+    mask = ID_FIXED_MASK | (1 << 16)
+
+    if node_ids is None:
+        return [FrameFilter(id=id, mask=mask)]
+    else:
+        return [FrameFilter(id=id | (node_id << 11), mask=mask | (31 << 11)) for node_id in node_ids]
+
+
 def make_error_response(node_id: int, property_index: int, opcode: Opcode, error_code: ErrorCode) -> Message:
     return Message(
         id=make_frame_id(node_id, property_index, Opcode.ERROR, Direction.DEVICE_TO_CLIENT),
@@ -1,66 +1,204 @@
+from dataclasses import dataclass
 import logging
-from typing import Optional
+import math
+import time
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
 
 from .messages import unpack_id, make_read_property_request, make_read_manifest_request, stringify, \
-    make_write_property_request
-from .model import ProtocolError, Opcode, SEGMENT_SIZE, NodeId, Direction
+    make_write_property_request, is_protocol_frame
+from .model import ProtocolError, Opcode, SEGMENT_SIZE, NodeId, Direction, MAX_NODE_ID
 from ..can_bus.adapter import StateMachine, Message
 from ..manifest import ManifestEnvelope, check_envelope_header
 
 logger = logging.getLogger(__name__)
 
 
+# Manifest segment requests kept in flight at once
+DEFAULT_MANIFEST_WINDOW = 8
+
+# A manifest segment is requested again if its response has not arrived within this time
+SEGMENT_RETRY_SEC = 0.1
+
+# Property requests kept in flight per node; should not exceed the depth of the node's receive queue
+DEFAULT_PROPERTY_WINDOW = 4
+
+# Lower bound of the time after which an unanswered property request is repeated, for nodes with a window above 1
+PROPERTY_RETRY_SEC = 0.1
+
+
+def is_error_response_to(msg: Message, opcode: Opcode) -> bool:
+    return len(msg.data) == 2 and msg.data[0] == opcode.value
+
+
+class BusScan(StateMachine):
+    """
+    Pings all node IDs and collects the replies (segment 0 of the manifest) until all nodes have replied
+    or the deadline expires.
+    """
+
+    replies: Dict[NodeId, Message]
+
+    def __init__(self):
+        self._next_node_id = 0
+        self.replies = {}
+
+    def is_finished(self) -> bool:
+        return len(self.replies) == MAX_NODE_ID
+
+    def get_frame_to_send(self) -> Optional[Message]:
+        if self._next_node_id < MAX_NODE_ID:
+            self._next_node_id += 1
+            return make_read_manifest_request(node_id=self._next_node_id - 1, segment=0)
+
+        return None
+
+    def matches(self, msg: Message) -> bool:
+        if not is_protocol_frame(msg.id):
+            return False
+
+        node_id, property_index, opcode, direction = unpack_id(msg.id)
+        return direction is Direction.DEVICE_TO_CLIENT and opcode is Opcode.READ_MANIFEST and property_index == 0
+
+    def frame_received(self, msg: Message) -> None:
+        node_id, property_index, opcode, direction = unpack_id(msg.id)
+        # Ping ok, queue to download manifest
+        self.replies[node_id] = msg
+
+
 class ManifestDownload(StateMachine):
+    """
+    Downloads the manifest envelope of a node, segment by segment.
+
+    Once segment 0 (with the envelope header, hence the total length) is known, up to `window` segment requests are
+    kept in flight. Responses may arrive in any order; a segment whose response has not arrived within
+    `SEGMENT_RETRY_SEC`, or which was overtaken by the response to a later request, is requested again.
+    """
+
     _expected_length: Optional[int]
-    _manifest_envelope: bytes
+    _segments: Dict[int, bytes]
     _node_id: NodeId
-    _request_sent_at: Optional[int] = None
 
-    def __init__(self, node_id: NodeId):
+    def __init__(self, node_id: NodeId, window: int = DEFAULT_MANIFEST_WINDOW):
+        assert window >= 1
+
         self._expected_length = None
-        self._manifest_envelope = b""
+        self._segments = {}
         self._node_id = node_id
+        self._window = window
+
+        # segment -> time of the (latest) request, for the segments requested but not received yet
+        self._in_flight: Dict[int, float] = {}
+
+    @property
+    def node_id(self) -> NodeId:
+        return self._node_id
+
+    @property
+    def _segment_count(self) -> Optional[int]:
+        if self._expected_length is None:
+            return None
+
+        return (self._expected_length + SEGMENT_SIZE - 1) // SEGMENT_SIZE
 
     def is_finished(self) -> bool:
-        return len(self._manifest_envelope) == self._expected_length
+        return self._segment_count is not None and len(self._segments) == self._segment_count
 
     def get_manifest_envelope(self) -> ManifestEnvelope:
         assert self.is_finished()
 
-        return ManifestEnvelope(self._manifest_envelope)
+        return ManifestEnvelope(b"".join(self._segments[segment] for segment in range(self._segment_count)))
 
     def get_frame_to_send(self) -> Optional[Message]:
-        if self._request_sent_at != len(self._manifest_envelope):
-            self._request_sent_at = len(self._manifest_envelope)
-            return make_read_manifest_request(self._node_id, len(self._manifest_envelope) // SEGMENT_SIZE)
+        now = time.monotonic()
+
+        # re-request segments whose response seems to have been lost
+        lost = next((segment for segment, requested_at in self._in_flight.items()
+                     if now - requested_at >= SEGMENT_RETRY_SEC), None)
+
+        if lost is not None:
+            return self._request(lost, now)
+
+        # until the header has arrived, the length is unknown
+        segment_count = self._segment_count if self._segment_count is not None else 1
+        window = self._window if self._segment_count is not None else 1
+
+        if len(self._in_flight) >= window:
+            return None
+
+        for segment in range(segment_count):
+            if segment not in self._segments and segment not in self._in_flight:
+                return self._request(segment, now)
 
         return None
 
-    def frame_received(self, msg: Message) -> None:
-        node_id, property_index, opcode, direction = unpack_id(msg.id)
+    def _request(self, segment: int, now: float) -> Message:
+        # re-inserted at the end, so that the dict stays ordered by request time
+        self._in_flight.pop(segment, None)
+        self._in_flight[segment] = now
+        return make_read_manifest_request(self._node_id, segment)
 
-        if (direction is Direction.DEVICE_TO_CLIENT and
+    def get_retry_time(self) -> Optional[float]:
+        return min(self._in_flight.values()) + SEGMENT_RETRY_SEC if self._in_flight else None
+
+    def matches(self, msg: Message) -> bool:
+        if not is_protocol_frame(msg.id):
+            return False
+
+        node_id, property_index, opcode, direction = unpack_id(msg.id)
+        return (direction is Direction.DEVICE_TO_CLIENT and
                 node_id == self._node_id and
-                opcode == Opcode.READ_MANIFEST and
-                property_index == len(self._manifest_envelope) // SEGMENT_SIZE):
-            if len(msg.data) > 0:
-                if self._expected_length is None or self._manifest_envelope is None:
-                    if len(msg.data) != SEGMENT_SIZE:
-                        raise ProtocolError(f"Expected {SEGMENT_SIZE}-byte reply")
-
-                    # decode payload header
-                    self._expected_length = check_envelope_header(msg.data)
-                    self._manifest_envelope = msg.data
-                else:
-                    self._manifest_envelope += msg.data
+                opcode in {Opcode.READ_MANIFEST, Opcode.ERROR})
 
-                    if len(self._manifest_envelope) < self._expected_length:
-                        # expect full segment utilization unless last segment
-                        assert len(msg.data) == SEGMENT_SIZE
-                    elif len(self._manifest_envelope) > self._expected_length:
-                        raise ProtocolError(f"Manifest body too long")
-            else:
-                raise ProtocolError(f"Expected reply READ_MANIFEST with data, got {stringify(msg)}")
+    def get_key(self) -> Optional[Hashable]:
+        return self._node_id, Opcode.READ_MANIFEST
+
+    def frame_received(self, msg: Message) -> None:
+        node_id, segment, opcode, direction = unpack_id(msg.id)
+
+        if direction is not Direction.DEVICE_TO_CLIENT or node_id != self._node_id:
+            return
+
+        if opcode is Opcode.ERROR:
+            if is_error_response_to(msg, Opcode.READ_MANIFEST):
+                raise ProtocolError(f"Manifest download failed: {stringify(msg)}")
+
+            return
+
+        if opcode is not Opcode.READ_MANIFEST or segment in self._segments:
+            # duplicate response to a re-requested segment
+            return
+
+        if len(msg.data) == 0:
+            raise ProtocolError(f"Expected reply READ_MANIFEST with data, got {stringify(msg)}")
+
+        if segment == 0:
+            if len(msg.data) != SEGMENT_SIZE:
+                raise ProtocolError(f"Expected {SEGMENT_SIZE}-byte reply")
+
+            # decode payload header
+            self._expected_length = check_envelope_header(msg.data)
+        elif self._segment_count is None:
+            # cannot be validated before the header; will be requested again
+            self._in_flight.pop(segment, None)
+            return
+        elif segment >= self._segment_count:
+            raise ProtocolError(f"Manifest body too long")
+        else:
+            # expect full segment utilization unless last segment
+            expected_size = min(SEGMENT_SIZE, self._expected_length - segment * SEGMENT_SIZE)
+
+            if len(msg.data) != expected_size:
+                raise ProtocolError(f"Expected {expected_size}-byte manifest segment {segment}, got {len(msg.data)}")
+
+        self._segments[segment] = msg.data
+
+        # responses normally arrive in request order; the requests which this one overtook were probably lost
+        requested_at = self._in_flight.pop(segment, None)
+
+        if requested_at is not None:
+            for earlier, earlier_requested_at in self._in_flight.items():
+                if earlier_requested_at < requested_at:
+                    self._in_flight[earlier] = -math.inf
 
 
 class PropertyQuery(StateMachine):
@@ -79,6 +217,10 @@ class PropertyQuery(StateMachine):
 
         self._opcode = Opcode.READ_PROPERTY if value is None else Opcode.WRITE_PROPERTY
 
+    @property
+    def is_read(self) -> bool:
+        return self._opcode is Opcode.READ_PROPERTY
+
     def is_finished(self) -> bool:
         return self._get_value is not None
 
@@ -88,25 +230,280 @@ class PropertyQuery(StateMachine):
         return self._get_value
 
     def get_frame_to_send(self) -> Optional[Message]:
-        if not self._request_sent:
+        if not self._request_sent and self._get_value is None:
             self._request_sent = True
-
-            if self._opcode is Opcode.WRITE_PROPERTY:
-                return make_write_property_request(self.node_id, self.property_index, self._set_value)
-            elif self._get_value is None:
-                return make_read_property_request(self.node_id, self.property_index)
+            return self.make_request()
 
         return None
 
+    def make_request(self) -> Message:
+        if self._opcode is Opcode.WRITE_PROPERTY:
+            return make_write_property_request(self.node_id, self.property_index, self._set_value)
+        else:
+            return make_read_property_request(self.node_id, self.property_index)
+
+    def matches(self, msg: Message) -> bool:
+        if not is_protocol_frame(msg.id):
+            return False
+
+        node_id, property_index, opcode, direction = unpack_id(msg.id)
+        return (direction is Direction.DEVICE_TO_CLIENT and
+                node_id == self.node_id and
+                property_index == self.property_index and
+                opcode in {self._opcode, Opcode.ERROR})
+
+    def get_key(self) -> Optional[Hashable]:
+        return self.node_id, self.property_index
+
     def frame_received(self, msg: Message) -> None:
         node_id, property_index, opcode, direction = unpack_id(msg.id)
 
         if (direction is Direction.DEVICE_TO_CLIENT and
                 node_id == self.node_id and
-                opcode == self._opcode):
-            if len(msg.data) > 0:
-                self._get_value = msg.data
+                property_index == self.property_index):
+            if opcode == self._opcode:
+                if len(msg.data) > 0:
+                    self._get_value = msg.data
+                else:
+                    raise ProtocolError(f"Expected reply {self._opcode.name} with data, got {stringify(msg)}")
+            elif opcode is Opcode.ERROR and is_error_response_to(msg, self._opcode):
+                raise ProtocolError(f"{self._opcode.name} failed: {stringify(msg)}")
+
+
+class FlowControl:
+    """
+    Adaptive limit of the property requests in flight to one node, kept across batches.
+
+    The window grows by one for every window's worth of responses, up to `max_window`, and is halved (at most once
+    per round trip) when the node appears to drop requests -- typically because its receive queue overflowed.
+    """
+
+    def __init__(self, max_window: int = DEFAULT_PROPERTY_WINDOW, pipeline_writes: bool = False):
+        """
+        :param pipeline_writes: also pipeline (and repeat) writes; only safe if writing the same value twice has
+                                no side effects in the node
+        """
+        assert max_window >= 1
+
+        self.max_window = max_window
+        self.pipeline_writes = pipeline_writes
+        self.window = max_window
+        self.round_trip_sec: Optional[float] = None
+
+        self._responses = 0
+        self._backed_off_at = -math.inf
+
+    @property
+    def retry_sec(self) -> float:
+        if self.round_trip_sec is None:
+            return PROPERTY_RETRY_SEC
+
+        return max(PROPERTY_RETRY_SEC, 4 * self.round_trip_sec)
+
+    def on_response(self, round_trip_sec: Optional[float]) -> None:
+        """
+        :param round_trip_sec: None if the request had been repeated, making the measurement ambiguous
+        """
+        if round_trip_sec is not None:
+            if self.round_trip_sec is None:
+                self.round_trip_sec = round_trip_sec
             else:
-                raise ProtocolError(f"Expected reply {self._opcode.name} with data, got {stringify(msg)}")
+                self.round_trip_sec += (round_trip_sec - self.round_trip_sec) / 8
+
+        self._responses += 1
+
+        if self._responses >= self.window:
+            self._responses = 0
+            self.window = min(self.window + 1, self.max_window)
+
+    def on_loss(self, requested_at: float, now: float) -> None:
+        # all requests sent before the last back-off were subject to the old window
+        if requested_at > self._backed_off_at:
+            self._backed_off_at = now
+            self._responses = 0
+            self.window = max(self.window // 2, 1)
+            logger.debug("Requests lost, window reduced to %d", self.window)
+
+
+@dataclass
+class _PendingRequest:
+    query: int
+    first_requested_at: float
+    requested_at: float
+    repeated: bool = False
+    overtaken: bool = False
+
+
+class PropertyPipeline(StateMachine):
+    """
+    Runs a batch of property queries to a single node, keeping up to `flow.window` requests in flight at once.
+
+    Responses are matched to requests by the property index, so two queries of the same property are never in flight
+    together. Each query fails on its own -- with a TimeoutError `timeout_sec` after it was first sent, or with
+    the error reported by the node -- without affecting the others; see `errors`.
+
+    When pipelining (`flow.max_window` > 1), a read request is repeated if its response is overtaken by the response
+    to a later request, or has not arrived within `flow.retry_sec`. Unless `flow.pipeline_writes` is set, writes are
+    neither pipelined nor repeated -- a write handler may have side effects -- so each one goes out alone.
+    """
+
+    def __init__(self, node_id: NodeId, queries: List[PropertyQuery], timeout_sec: float, flow: FlowControl,
+                 on_complete: Optional[Callable[[int, Optional[Exception]], None]] = None):
+        """
+        :param on_complete: called with (index into `queries`, error) as soon as each query completes; this happens
+                            on the thread dispatching the responses (for a BusHub, its receive thread), so it must
+                            return quickly and must not use the bus
+        """
+        assert all(pq.node_id == node_id for pq in queries)
+
+        self.node_id = node_id
+        self.queries = queries
+        self.flow = flow
+        self.on_complete = on_complete
+
+        self.errors: List[Optional[Exception]] = [None] * len(queries)
+        # indices into `queries`, in the order in which they completed
+        self.completed: List[int] = []
+        self.completed_at: List[Optional[float]] = [None] * len(queries)
+
+        self._timeout_sec = timeout_sec
+        self._next = 0
+        self._waiting: List[int] = []       # skipped while another query of the same property was in flight
+        self._in_flight: Dict[int, _PendingRequest] = {}        # by property index, ordered by request time
+
+    def is_finished(self) -> bool:
+        return len(self.completed) == len(self.queries)
+
+    def _complete(self, property_index: int, error: Optional[Exception]) -> None:
+        request = self._in_flight.pop(property_index)
+        self.errors[request.query] = error
+        self.completed.append(request.query)
+        self.completed_at[request.query] = time.monotonic()
+
+        if self.on_complete is not None:
+            try:
+                self.on_complete(request.query, error)
+            except Exception as ex:
+                # must not disturb the other queries
+                logger.exception(ex)
+
+    def get_query_in_flight(self, property_index: int) -> Optional[int]:
+        """
+        :return: index into `queries` of the query of this property which is currently in flight, if any
+        """
+        request = self._in_flight.get(property_index)
+        return request.query if request is not None else None
+
+    def get_frame_to_send(self) -> Optional[Message]:
+        now = time.monotonic()
+
+        for property_index, request in list(self._in_flight.items()):
+            if now - request.first_requested_at >= self._timeout_sec:
+                self.flow.on_loss(request.requested_at, now)
+                self._complete(property_index, TimeoutError())
+
+        if self.flow.max_window > 1:
+            lost = next((property_index for property_index, request in self._in_flight.items()
+                         if not self._is_serialized(request.query) and
+                         (request.overtaken or now - request.requested_at >= self.flow.retry_sec)), None)
+
+            if lost is not None:
+                request = self._in_flight.pop(lost)
+                self.flow.on_loss(request.requested_at, now)
+                request.requested_at = now
+                request.repeated = True
+                request.overtaken = False
+                self._in_flight[lost] = request
+                return self.queries[request.query].make_request()
+
+        if len(self._in_flight) >= self.flow.window or any(self._is_serialized(request.query)
+                                                            for request in self._in_flight.values()):
+            return None
+
+        query = self._take_next_query()
+
+        if query is None:
+            return None
+
+        pq = self.queries[query]
+        self._in_flight[pq.property_index] = _PendingRequest(query, now, now)
+        return pq.make_request()
+
+    def _is_serialized(self, query: int) -> bool:
+        return not self.queries[query].is_read and not self.flow.pipeline_writes
+
+    def _take_next_query(self) -> Optional[int]:
+        for i, query in enumerate(self._waiting):
+            if self.queries[query].property_index not in self._in_flight:
+                # a serialized write waits for the requests in flight, and the queries after it wait for the write
+                if self._in_flight and self._is_serialized(query):
+                    return None
+
+                return self._waiting.pop(i)
+
+        while self._next < len(self.queries):
+            query = self._next
+
+            if self.queries[query].property_index in self._in_flight:
+                self._next += 1
+                self._waiting.append(query)
+                continue
+
+            if self._in_flight and self._is_serialized(query):
+                return None
+
+            self._next += 1
+            return query
+
+        return None
+
+    def get_retry_time(self) -> Optional[float]:
+        if not self._in_flight:
+            return None
+
+        now = time.monotonic()
+        times = [request.first_requested_at + self._timeout_sec for request in self._in_flight.values()]
+
+        if self.flow.max_window > 1:
+            times += [now if request.overtaken else request.requested_at + self.flow.retry_sec
+                      for request in self._in_flight.values() if not self._is_serialized(request.query)]
+
+        return min(times)
+
+    def matches(self, msg: Message) -> bool:
+        if not is_protocol_frame(msg.id):
+            return False
+
+        node_id, property_index, opcode, direction = unpack_id(msg.id)
+        return (direction is Direction.DEVICE_TO_CLIENT and
+                node_id == self.node_id and
+                property_index in self._in_flight and
+                opcode in {Opcode.READ_PROPERTY, Opcode.WRITE_PROPERTY, Opcode.ERROR})
+
+    def get_keys(self) -> Iterable[Hashable]:
+        return {pq.get_key() for pq in self.queries}
+
+    def frame_received(self, msg: Message) -> None:
+        node_id, property_index, opcode, direction = unpack_id(msg.id)
+        request = self._in_flight.get(property_index)
+
+        if request is None or not self.queries[request.query].matches(msg):
+            return
+
+        try:
+            self.queries[request.query].frame_received(msg)
+        except ProtocolError as ex:
+            self._complete(property_index, ex)
+        else:
+            if not self.queries[request.query].is_finished():
+                return
+
+            self._complete(property_index, None)
+
+        now = time.monotonic()
+        self.flow.on_response(None if request.repeated else now - request.requested_at)
 
-        # TODO: handle error response
+        # the node handles requests in order; those which this one overtook were probably lost
+        for earlier in self._in_flight.values():
+            if earlier.requested_at < request.requested_at:
+                earlier.overtaken = True
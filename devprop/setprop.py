@@ -1,7 +1,8 @@
 import logging
+from pathlib import Path
 
-from devprop.can_bus.transport_plugin import get_adapter
-from devprop.client import Client
+from devprop.apply import ApplyStatus, apply_properties
+from devprop.daemon import open_client
 
 
 def main():
@@ -11,23 +12,60 @@ def main():
     parser.add_argument("-b", "--bus")
     parser.add_argument("-D", "--debug", dest="debug", action="store_true")
     parser.add_argument("-T", dest="timeout_sec", type=float, default=1)
+    parser.add_argument("--no-daemon", dest="use_daemon", action="store_false")
     parser.add_argument("-d", dest="device", required=True)
-    parser.add_argument("property")
-    parser.add_argument("value", type=float)
+    parser.add_argument("-f", dest="profile", type=Path,
+                        help="YAML file mapping property names to values; only differing values are written")
+    parser.add_argument("--no-verify", dest="verify", action="store_false")
+    parser.add_argument("property", nargs="?")
+    parser.add_argument("value", type=float, nargs="?")
     args = parser.parse_args()
 
+    if (args.profile is None) == (args.property is None or args.value is None):
+        parser.error("either property & value, or -f must be given")
+
     logging.basicConfig()
 
     if args.debug:
         logging.getLogger("devprop").setLevel(logging.DEBUG)
 
-    cl = Client(get_adapter(args.bus))
+    cl = open_client(args.bus, use_daemon=args.use_daemon)
 
     nodes = cl.enumerate_nodes(timeout_sec=args.timeout_sec)
 
     # find device
     node, = [node for node in nodes.values() if node.device_name == args.device]
 
+    if args.profile is not None:
+        import yaml
+
+        with open(args.profile, "rt") as f:
+            profile = yaml.safe_load(f)
+
+        properties_by_name = {prop.name: prop for prop in node.properties}
+        unknown = [name for name in profile if name not in properties_by_name]
+
+        if unknown:
+            parser.error(f"{args.profile}: no such properties in {args.device}: {', '.join(map(str, unknown))}")
+
+        items = [(node, properties_by_name[name], float(value)) for name, value in profile.items()]
+
+        results = apply_properties(cl, items, timeout_sec=args.timeout_sec, verify=args.verify)
+
+        for result in results:
+            print(f"{node.get_property_path(result.property)}: {result.status.value}",
+                  f"({result.previous_value} -> {result.final_value} {result.property.unit})",
+                  result.error or "")
+
+        print(f"{sum(result.status is ApplyStatus.WRITTEN for result in results)} written,",
+              f"{sum(result.status is ApplyStatus.UNCHANGED for result in results)} unchanged,",
+              f"{sum(not result.ok for result in results)} failed")
+
+        if not all(result.ok for result in results):
+            raise SystemExit(1)
+
+        return
+
     # find property
     property, = [prop for prop in node.properties if prop.name == args.property]
 
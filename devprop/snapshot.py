@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+"""
+devprop-snapshot: save the values of all writable properties of all nodes, and restore them later.
+
+Snapshot file format (all integers little-endian):
+
+    "DPSNAP" version:u8 node_count:u8
+    node_count * (node_id:u8 manifest_hash:4s name_length:u8 device_name property_count:u16
+                  property_count * (property_index:u8 length:u8 raw_value))
+
+Values are stored as raw bytes, so a restore writes back exactly what was read. The manifest hash is taken from
+the envelope header; a restore only touches nodes whose manifest hash matches.
+"""
+
+from dataclasses import dataclass
+import logging
+from pathlib import Path
+import struct
+from typing import Dict, List, Tuple
+
+from .client import Node
+from .daemon import open_client
+from .manifest import get_envelope_hash
+from .protocol_can_ext_v1.model import NodeId
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC = b"DPSNAP"
+VERSION = 1
+
+_HEADER = struct.Struct("<6sBB")
+_NODE_HEADER = struct.Struct("<B4sB")
+_PROPERTY_COUNT = struct.Struct("<H")
+_PROPERTY_HEADER = struct.Struct("<BB")
+
+
+@dataclass
+class NodeSnapshot:
+    node_id: NodeId
+    manifest_hash: bytes
+    device_name: str
+    values: Dict[int, bytes]
+
+
+def serialize_snapshot(snapshots: List[NodeSnapshot]) -> bytes:
+    out = bytearray(_HEADER.pack(MAGIC, VERSION, len(snapshots)))
+
+    for snapshot in snapshots:
+        name = snapshot.device_name.encode()
+        out += _NODE_HEADER.pack(snapshot.node_id, snapshot.manifest_hash, len(name))
+        out += name
+        out += _PROPERTY_COUNT.pack(len(snapshot.values))
+
+        for index, value in sorted(snapshot.values.items()):
+            out += _PROPERTY_HEADER.pack(index, len(value))
+            out += value
+
+    return bytes(out)
+
+
+def parse_snapshot(data: bytes) -> List[NodeSnapshot]:
+    magic, version, node_count = _HEADER.unpack_from(data)
+
+    if magic != MAGIC:
+        raise ValueError("Not a devprop snapshot")
+
+    if version != VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}")
+
+    offset = _HEADER.size
+    snapshots = []
+
+    for i in range(node_count):
+        node_id, manifest_hash, name_length = _NODE_HEADER.unpack_from(data, offset)
+        offset += _NODE_HEADER.size
+        device_name = data[offset:offset + name_length].decode()
+        offset += name_length
+        property_count, = _PROPERTY_COUNT.unpack_from(data, offset)
+        offset += _PROPERTY_COUNT.size
+
+        values = {}
+
+        for j in range(property_count):
+            index, length = _PROPERTY_HEADER.unpack_from(data, offset)
+            offset += _PROPERTY_HEADER.size
+            values[index] = data[offset:offset + length]
+            offset += length
+
+        snapshots.append(NodeSnapshot(NodeId(node_id), manifest_hash, device_name, values))
+
+    return snapshots
+
+
+def take_snapshot(client, nodes: Dict[NodeId, Node], timeout_sec: float) -> Tuple[List[NodeSnapshot], List[str]]:
+    """
+    Read all properties that can be both read and written, in a single batch across all nodes.
+
+    :return: (snapshots, errors)
+    """
+    queries = [(node, prop, None) for node in nodes.values() for prop in node.properties
+               if prop.readable and prop.writable]
+    results = client.execute_queries(queries, timeout_sec=timeout_sec)
+
+    snapshots = {node_id: NodeSnapshot(node_id, get_envelope_hash(node.envelope), node.device_name, {})
+                 for node_id, node in nodes.items()}
+    errors = []
+
+    for (node, prop, _), (value, error) in zip(queries, results):
+        if error is not None:
+            errors.append(f"{node.get_property_path(prop)}: {str(error) or type(error).__name__}")
+        else:
+            snapshots[node.node_id].values[prop.index] = value
+
+    return list(snapshots.values()), errors
+
+
+def restore_snapshot(client, nodes: Dict[NodeId, Node], snapshots: List[NodeSnapshot],
+                     timeout_sec: float) -> Tuple[int, List[str]]:
+    """
+    Write back all values of a snapshot, in a single batch across all nodes.
+
+    :return: (number of properties written, errors)
+    """
+    queries = []
+    errors = []
+
+    for snapshot in snapshots:
+        node = nodes.get(snapshot.node_id)
+
+        if node is None:
+            errors.append(f"{snapshot.device_name}@{snapshot.node_id}: node not present")
+            continue
+
+        if get_envelope_hash(node.envelope) != snapshot.manifest_hash:
+            errors.append(f"{node.name}: manifest hash {get_envelope_hash(node.envelope).hex()} does not match "
+                          f"snapshot ({snapshot.manifest_hash.hex()}), skipping node")
+            continue
+
+        properties = {prop.index: prop for prop in node.properties}
+        queries += [(node, properties[index], value) for index, value in snapshot.values.items()]
+
+    results = client.execute_queries(queries, timeout_sec=timeout_sec)
+    written = 0
+
+    for (node, prop, value), (response, error) in zip(queries, results):
+        if error is not None:
+            errors.append(f"{node.get_property_path(prop)}: {str(error) or type(error).__name__}")
+        elif response != value:
+            errors.append(f"{node.get_property_path(prop)}: wrote {value.hex()}, device responded {response.hex()}")
+        else:
+            written += 1
+
+    return written, errors
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", "--bus")
+    parser.add_argument("-D", "--debug", dest="debug", action="store_true")
+    parser.add_argument("-T", dest="timeout_sec", type=float, default=1)
+    parser.add_argument("--no-daemon", dest="use_daemon", action="store_false")
+    parser.add_argument("action", choices=["save", "restore"])
+    parser.add_argument("file", type=Path)
+    args = parser.parse_args()
+
+    logging.basicConfig()
+
+    if args.debug:
+        logging.getLogger("devprop").setLevel(logging.DEBUG)
+
+    cl = open_client(args.bus, use_daemon=args.use_daemon)
+
+    nodes = cl.enumerate_nodes(timeout_sec=args.timeout_sec)
+
+    if args.action == "save":
+        snapshots, errors = take_snapshot(cl, nodes, timeout_sec=args.timeout_sec)
+        args.file.write_bytes(serialize_snapshot(snapshots))
+
+        print(f"saved {sum(len(snapshot.values) for snapshot in snapshots)} properties of {len(snapshots)} nodes")
+    else:
+        written, errors = restore_snapshot(cl, nodes, parse_snapshot(args.file.read_bytes()),
+                                           timeout_sec=args.timeout_sec)
+
+        print(f"restored {written} properties")
+
+    for error in errors:
+        logger.error("%s", error)
+
+    if errors:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from devprop.client import Client, Node
+from devprop.manifest import parse_manifest_yaml
+from devprop.model import Manifest
+from devprop.protocol_can_ext_v1.model import NodeId
+from devprop.test_server import SimulatedBus, TestDevice, load_manifest_envelope
+
+
+EXAMPLE_MANIFEST = Path(__file__).parent.parent.parent / "examples" / "FSE10.HELLO.yml"
+
+
+@pytest.fixture(scope="session")
+def manifest() -> Manifest:
+    with open(EXAMPLE_MANIFEST) as f:
+        return parse_manifest_yaml(f)
+
+
+@pytest.fixture(scope="session")
+def envelope() -> bytes:
+    return load_manifest_envelope(EXAMPLE_MANIFEST)
+
+
+@pytest.fixture
+def device(envelope) -> TestDevice:
+    """
+    The example device as node 1.
+    """
+    return TestDevice(1, envelope)
+
+
+@pytest.fixture
+def devices(device, envelope) -> List[TestDevice]:
+    """
+    The example device as nodes 1 & 2; override `bus` with `SimulatedBus(devices)` to put both on the bus.
+    """
+    return [device, TestDevice(2, envelope)]
+
+
+@pytest.fixture
+def bus(device) -> SimulatedBus:
+    return SimulatedBus([device])
+
+
+@pytest.fixture
+def client(bus) -> Client:
+    return Client(bus)
+
+
+@pytest.fixture
+def nodes(client) -> Dict[NodeId, Node]:
+    return client.enumerate_nodes(timeout_sec=0.1)
+
+
+@pytest.fixture
+def node(nodes) -> Node:
+    node, = nodes.values()
+    return node
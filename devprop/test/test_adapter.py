@@ -0,0 +1,60 @@
+import time
+
+from devprop.can_bus.adapter import DeadlineQueue, run_state_machines
+from devprop.can_bus.hub import BusHub
+from devprop.protocol_can_ext_v1.messages import make_read_property_request
+from devprop.protocol_can_ext_v1.state_machines import PropertyQuery
+
+
+def test_deadline_queue():
+    queue = DeadlineQueue()
+    queue.push(3.0, "c")
+    queue.push(1.0, "a")
+    queue.push(2.0, "b")
+    queue.cancel("a")
+
+    assert len(queue) == 2
+    assert queue.next_deadline() == 2.0
+    assert queue.pop_expired(2.5) == ["b"]
+
+    # pushing again replaces the previous deadline
+    queue.push(0.5, "c")
+    assert queue.pop_expired(1.0) == ["c"]
+    assert queue.next_deadline() is None
+
+
+def test_run_state_machines_deadlines(bus):
+    now = time.monotonic()
+
+    # node 2 does not exist; each query must time out at its own deadline, without holding up the others
+    sms = [PropertyQuery(1, 1), PropertyQuery(2, 1), PropertyQuery(2, 2), PropertyQuery(1, 2)]
+    errors = run_state_machines(bus, sms, [now + 1, now + 0.05, now + 0.1, now + 1])
+
+    assert time.monotonic() - now < 0.5
+    assert errors[0] is None and errors[3] is None
+    assert isinstance(errors[1], TimeoutError) and isinstance(errors[2], TimeoutError)
+
+
+def test_buffered_response_after_deadline(bus):
+    # the simulated device responds immediately, so the response is waiting by the time the deadline is checked
+    error, = run_state_machines(bus, [PropertyQuery(1, 1)], time.monotonic() - 1)
+
+    assert error is None
+
+
+def test_wait(bus):
+    def check(adapter):
+        assert adapter.wait(time.monotonic() + 0.01) is False
+        adapter.send(make_read_property_request(1, 1))
+        assert adapter.wait(time.monotonic() + 1) is True
+        assert adapter.poll() is not None
+
+    check(bus)
+
+    # through a hub, responses nobody waits for are unsolicited frames
+    hub = BusHub(bus)
+
+    try:
+        check(hub)
+    finally:
+        hub.close()
@@ -0,0 +1,44 @@
+from devprop.apply import ApplyStatus, apply_properties
+from devprop.model import PropertyType
+
+
+def test_apply_properties(device, client, node):
+    props = {prop.name: prop for prop in node.properties}
+
+    device.property_values[props["Test.Uint16.RW"].index] = 100
+    device.property_values[props["Test.Uint8.RW"].index] = 7
+
+    writes = []
+    handle_message = device.handle_message
+    device.handle_message = lambda msg: writes.append(msg) or handle_message(msg)
+
+    results = apply_properties(client, [
+        (node, props["Test.Uint16.RW"], 100),
+        (node, props["Test.Uint8.RW"], 8),
+        (node, props["Test.Uint16.WO"], 5),
+        (node, props["Test.Uint16.RO"], 5),
+        (node, props["Test.Uint32.RW"], 3e9),
+    ], timeout_sec=0.1)
+
+    assert [result.status for result in results] == [ApplyStatus.UNCHANGED, ApplyStatus.WRITTEN, ApplyStatus.WRITTEN,
+                                                      ApplyStatus.NOT_WRITABLE, ApplyStatus.OUT_OF_RANGE]
+    assert results[1].previous_value == 7 and results[1].final_value == 8
+    assert device.property_values[props["Test.Uint8.RW"].index] == 8
+
+    # 2 reads, 2 writes, 1 read-back (the write-only property cannot be read back)
+    assert len(writes) == 5
+
+
+def test_apply_invalid_response(device, client, node):
+    props = {prop.name: prop for prop in node.properties}
+
+    # the device responds to reads of a 16-bit property with a single byte
+    device.property_types[props["Test.Uint16.RW"].index] = PropertyType.UINT8
+
+    results = apply_properties(client, [
+        (node, props["Test.Uint16.RW"], 100),
+        (node, props["Test.Uint8.RW"], 8),
+    ], timeout_sec=0.1)
+
+    assert [result.status for result in results] == [ApplyStatus.ERROR, ApplyStatus.WRITTEN]
+    assert results[0].error.startswith("read: invalid value")
@@ -0,0 +1,119 @@
+import socket
+import threading
+import time
+
+from devprop.can_bus.adapter import Message
+from devprop.can_bus.byte_stream import FrameDecoder, crc16_kermit, encode_frames
+from devprop.can_bus.network_adapter import TcpAdapter, UdpAdapter
+from devprop.client import Client
+from devprop.test_server import TestDevice
+
+
+def test_crc16_kermit():
+    # standard check value of CRC-16/KERMIT
+    assert crc16_kermit(b"123456789") == 0x2189
+
+
+def test_codec():
+    messages = [Message(id=0x1EF00001, data=b"\x00\x01\x02"), Message(id=0x1EF10002, data=b"")]
+    encoded = encode_frames(messages)
+
+    # garbage & a corrupted frame first, then the real thing byte by byte
+    corrupted = bytearray(encode_frames(messages[:1]))
+    corrupted[3] ^= 0x40
+    decoder = FrameDecoder()
+    decoded = decoder.feed(b"\x12\x34" + corrupted)
+
+    for i in range(len(encoded)):
+        decoded += decoder.feed(encoded[i:i + 1])
+
+    assert decoded == messages
+
+
+def serve_gateway(device: TestDevice, conn: socket.socket) -> None:
+    # a minimal gateway with a single device attached to its "bus"
+    decoder = FrameDecoder()
+
+    with conn:
+        while True:
+            data = conn.recv(4096)
+
+            if not data:
+                return
+
+            responses = [device.handle_message(msg) for msg in decoder.feed(data)]
+            conn.sendall(encode_frames([resp for resp in responses if resp is not None]))
+
+
+def test_tcp_adapter(device):
+
+    with socket.create_server(("127.0.0.1", 0)) as server:
+        def accept():
+            conn, _ = server.accept()
+            serve_gateway(device, conn)
+
+        thread = threading.Thread(target=accept, daemon=True)
+        thread.start()
+
+        adapter = TcpAdapter(server.getsockname())
+
+        try:
+            nodes = Client(adapter).enumerate_nodes(timeout_sec=0.2)
+            assert list(nodes.keys()) == [1]
+        finally:
+            adapter.close()
+
+        thread.join()
+
+
+def test_udp_adapter(device):
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as gateway:
+        gateway.bind(("127.0.0.1", 0))
+        gateway.settimeout(0.5)
+
+        def serve():
+            decoder = FrameDecoder()
+
+            # keep serving until the client goes quiet
+            while True:
+                try:
+                    data, address = gateway.recvfrom(4096)
+                except socket.timeout:
+                    return
+
+                responses = [device.handle_message(msg) for msg in decoder.feed(data)]
+                gateway.sendto(encode_frames([resp for resp in responses if resp is not None]), address)
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+
+        adapter = UdpAdapter(gateway.getsockname())
+
+        try:
+            nodes = Client(adapter).enumerate_nodes(timeout_sec=0.2)
+            assert list(nodes.keys()) == [1]
+        finally:
+            adapter.close()
+
+        thread.join()
+
+
+def test_receive_buffered_frame_after_deadline():
+    messages = [Message(id=0x1EF00100 + i, data=bytes([i])) for i in range(3)]
+
+    with socket.create_server(("127.0.0.1", 0)) as server:
+        adapter = TcpAdapter(server.getsockname())
+
+        try:
+            conn, _ = server.accept()
+            conn.sendall(encode_frames(messages))
+            time.sleep(0.05)
+
+            # frames which have already arrived are received even with a deadline in the past
+            assert [adapter.receive(deadline=time.monotonic() - 1) for _ in messages] == messages
+            assert adapter.poll() is None
+            assert not adapter.wait(time.monotonic() + 0.01)
+            conn.close()
+        finally:
+            adapter.close()
@@ -0,0 +1,55 @@
+import math
+
+import pytest
+
+from devprop.cache import PropertyCache
+from devprop.client import Client
+
+
+@pytest.fixture
+def cache():
+    return PropertyCache(default_ttl_sec=math.inf)
+
+
+@pytest.fixture
+def client(bus, cache):
+    return Client(bus, cache=cache)
+
+
+def get_property(node, name):
+    prop, = [prop for prop in node.properties if prop.name == name]
+    return prop
+
+
+def test_cache_ttl_and_write_through(cache, device, client, node):
+    prop = get_property(node, "Test.Uint16.RW")
+
+    changes = []
+    cache.subscribe(lambda node_id, prop, value: changes.append((node_id, prop.name, value)), node_id=1)
+
+    assert client.set_property(node, prop, 1234, timeout_sec=1) == 1234
+    assert changes == [(1, "Test.Uint16.RW", (1234).to_bytes(2, "little"))]
+
+    # changed behind our back, but the cached value is still valid
+    device.property_values[prop.index] = 555
+    assert client.get_property(node, prop, timeout_sec=1) == 1234
+
+    cache.set_ttl(1, prop.index, 0)
+    assert client.get_property(node, prop, timeout_sec=1) == 555
+    assert len(changes) == 2
+
+    # no notification if the value did not change
+    assert client.get_property(node, prop, timeout_sec=1) == 555
+    assert len(changes) == 2
+
+
+def test_const_properties_never_expire(manifest):
+    cache = PropertyCache(default_ttl_sec=0)
+    const_prop = get_property(manifest, "Test.Uint8.Const")
+    rw_prop = get_property(manifest, "Test.Uint16.RW")
+
+    cache.update(1, const_prop, b"\x4d")
+    cache.update(1, rw_prop, b"\x01\x00")
+
+    assert cache.lookup(1, const_prop) == b"\x4d"
+    assert cache.lookup(1, rw_prop) is None
@@ -0,0 +1,38 @@
+import subprocess
+import sys
+
+
+# Modules that are slow to import and must only be loaded on the code paths that actually need them
+HEAVY_MODULES = {"can", "cobs", "importlib_metadata", "jinja2", "serial", "yaml"}
+
+CLI_MODULES = ["devprop.devscan", "devprop.getprop", "devprop.linktest", "devprop.profiler", "devprop.setprop",
+               "devprop.snapshot", "devprop.watch"]
+
+
+def import_times(module: str):
+    """
+    :return: {module_name: cumulative import time in microseconds} as reported by `python -X importtime`
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+
+    times = {}
+
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+
+    return times
+
+
+def test_cli_startup_is_lazy():
+    for cli_module in CLI_MODULES:
+        times = import_times(cli_module)
+
+        heavy = {name for name in times if name.split(".")[0] in HEAVY_MODULES or name == "importlib.metadata"}
+        assert not heavy, f"{cli_module} imports {sorted(heavy)} on start-up"
+
+        print(f"{cli_module}: {times[cli_module] / 1000:.1f} ms")
@@ -0,0 +1,56 @@
+import tempfile
+import threading
+import time
+
+import pytest
+
+from devprop.can_bus.hub import BusHub
+from devprop.client import Client
+from devprop.daemon import Daemon, connect, get_socket_path
+
+
+def test_daemon_round_trip(tmp_path, monkeypatch, bus):
+    socket_path = tmp_path / "devpropd.sock"
+    monkeypatch.setenv("DEVPROP_SOCKET", str(socket_path))
+
+    daemon = Daemon(Client(BusHub(bus)), scan_timeout_sec=0.1)
+    threading.Thread(target=daemon.serve_forever, args=(socket_path,), daemon=True).start()
+
+    while not socket_path.exists():
+        time.sleep(0.01)
+
+    cl = connect()
+    assert cl is not None
+
+    nodes = cl.enumerate_nodes(timeout_sec=0.1)
+    node = nodes[1]
+    assert node.device_name == "FSE10.HELLO"
+
+    prop, = [prop for prop in node.properties if prop.name == "Test.Uint16.RW"]
+    assert cl.set_property(node, prop, 1234, timeout_sec=0.1) == 1234
+    assert cl.get_property(node, prop, timeout_sec=0.1) == 1234
+
+    # node 2 does not exist
+    missing = type(node)(2, node.manifest)
+    assert cl.query_properties([(node, prop), (missing, prop)], timeout_sec=0.05) == [bytes([0xD2, 0x04]), None]
+
+    with pytest.raises(TimeoutError):
+        cl.get_property(missing, prop, timeout_sec=0.05)
+
+
+def test_socket_path_without_runtime_dir(tmp_path, monkeypatch):
+    monkeypatch.delenv("DEVPROP_SOCKET", raising=False)
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+
+    # not directly in the shared temporary directory, but in a private one
+    path = get_socket_path("socketcan:vcan0")
+    assert path.parent.parent == tmp_path
+    assert path.parent.stat().st_mode & 0o777 == 0o700
+
+    path.parent.chmod(0o755)
+
+    with pytest.raises(PermissionError):
+        get_socket_path()
+
+    assert connect() is None
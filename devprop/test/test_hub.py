@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+
+from devprop.can_bus.adapter import Message
+from devprop.can_bus.hub import BusHub
+from devprop.client import Client
+from devprop.protocol_can_ext_v1.messages import is_protocol_frame
+from devprop.test_server import SimulatedBus
+
+
+def test_concurrent_clients(devices):
+    hub = BusHub(SimulatedBus(devices))
+
+    try:
+        nodes = Client(hub).enumerate_nodes(timeout_sec=0.1)
+        assert sorted(nodes.keys()) == [1, 2]
+
+        errors = []
+
+        def worker(node, value):
+            # each thread has its own client; all of them share the hub
+            cl = Client(hub)
+            prop, = [prop for prop in node.properties if prop.name == "Test.Uint16.RW"]
+
+            try:
+                for i in range(50):
+                    assert cl.set_property(node, prop, value + i, timeout_sec=1) == value + i
+                    assert cl.get_property(node, prop, timeout_sec=1) == value + i
+            except BaseException as ex:
+                errors.append(ex)
+
+        threads = [threading.Thread(target=worker, args=(nodes[1], 100)),
+                   threading.Thread(target=worker, args=(nodes[2], 200)),
+                   threading.Thread(target=lambda: Client(hub).query_properties(
+                       [(nodes[1], prop) for prop in nodes[1].properties if prop.readable] * 10, timeout_sec=1))]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+    finally:
+        hub.close()
+
+
+# a device-to-client frame in the protocol's ID range, with the reserved opcode 3
+RESERVED_OPCODE_ID = 0x1EF00300 | (1 << 11) | 1
+
+
+class ReservedOpcodeDevice:
+    """
+    Answers every request with a frame which has a reserved opcode.
+    """
+
+    def handle_message(self, msg: Message) -> Message:
+        return Message(RESERVED_OPCODE_ID, b"")
+
+
+@pytest.fixture
+def bus(device):
+    return SimulatedBus([ReservedOpcodeDevice(), device])
+
+
+def test_reserved_opcode_frames_are_ignored(bus, node):
+    assert not is_protocol_frame(RESERVED_OPCODE_ID)
+
+    prop, = [prop for prop in node.properties if prop.name == "Test.Uint16.RW"]
+
+    # directly on the bus, and through a hub, whose receive thread must survive the frames
+    hub = BusHub(bus)
+
+    try:
+        for client in [Client(bus), Client(hub)]:
+            for value in [1, 2]:
+                assert client.set_property(node, prop, value, timeout_sec=1) == value
+    finally:
+        hub.close()
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from devprop.can_bus.adapter import Message
+from devprop.can_bus.serial_wrapped_can_adapter import SerialWrappedCanAdapter, parse_dsn_parameters
+from devprop.linktest import measure_throughput
+from devprop.protocol_can_ext_v1.messages import make_read_manifest_response
+from devprop.test_server import SimulatedBus
+
+
+def test_measure_throughput(bus):
+    result = measure_throughput(bus, 1, duration_sec=0.1, window=4)
+
+    assert result.sent > 0
+    assert result.lost == 0
+    assert result.frames_per_sec > 0
+
+
+class UnfilteredBus(SimulatedBus):
+    """
+    Ignores the acceptance filters, like an adapter without native filtering.
+    """
+
+    def set_filters(self, filters) -> None:
+        pass
+
+
+class ResponderDevice:
+    """
+    Answers every request with the same frame.
+    """
+
+    def __init__(self, response: Message):
+        self.response = response
+
+    def handle_message(self, msg: Message) -> Message:
+        return self.response
+
+
+def test_measure_throughput_other_traffic(device):
+    # not a protocol frame, a reserved opcode, and a manifest response from another node
+    bus = UnfilteredBus([device, ResponderDevice(Message(0x123, b"")),
+                         ResponderDevice(Message(0x1EF00300 | (1 << 11) | 1, b"")),
+                         ResponderDevice(make_read_manifest_response(2, 0, bytes(8)))])
+
+    result = measure_throughput(bus, 1, duration_sec=0.1, window=4)
+
+    assert result.sent > 0
+    assert result.received == result.sent
+
+
+def test_serial_dsn_parameters():
+    assert parse_dsn_parameters("/dev/ttyACM0") == ("/dev/ttyACM0", {})
+    assert parse_dsn_parameters("/dev/ttyACM0?baud=2000000&chunk=16&flow=rtscts") == \
+        ("/dev/ttyACM0", dict(baudrate=2000000, read_chunk_size=16, flow_control="rtscts"))
+
+    # pyserial URLs may have a query of their own, which is kept as part of the port
+    assert parse_dsn_parameters("socket://host:7000?logging=debug") == ("socket://host:7000?logging=debug", {})
+    assert parse_dsn_parameters("rfc2217://host:7000?ign_set_control?baud=500000") == \
+        ("rfc2217://host:7000?ign_set_control", dict(baudrate=500000))
+
+    with pytest.raises(ValueError):
+        parse_dsn_parameters("/dev/ttyACM0?bad=1")
+
+
+def test_serial_loopback():
+    adapter = SerialWrappedCanAdapter.from_dsn_parameters("loop://?logging=debug?baud=2000000&chunk=16&flow=rtscts")
+
+    # loop:// echoes everything back
+    messages = [Message(id=0x1EF00100 + i, data=bytes(range(8))) for i in range(10)]
+    adapter.send_many(messages)
+    assert [adapter.receive(time.monotonic() + 1) for _ in messages] == messages
+
+    with pytest.raises(ValueError):
+        SerialWrappedCanAdapter.from_dsn_parameters("loop://?baud=fast")
@@ -0,0 +1,53 @@
+import json
+
+from devprop.manifest_compiler import CACHE_FILE_NAME, check_node_ids, compile_batch, find_manifests
+
+
+MANIFEST_YAML = """
+device_name: {name}
+properties:
+  - name: Test.Uint16.RW
+    type: uint16
+"""
+
+
+def test_compile_batch(tmp_path):
+    (tmp_path / "a.yml").write_text(MANIFEST_YAML.format(name="Test.A"))
+    (tmp_path / "b.yml").write_text(MANIFEST_YAML.format(name="Test.B"))
+    (tmp_path / "vehicle.yml").write_text("manifests:\n  a.yml: 1\n  b.yml: 2\n")
+
+    manifests = find_manifests(tmp_path / "vehicle.yml")
+    assert manifests == {tmp_path / "a.yml": 1, tmp_path / "b.yml": 2}
+    assert check_node_ids(manifests) == []
+
+    out = tmp_path / "out"
+    assert compile_batch(tmp_path / "vehicle.yml", out, generate_lang="C", jobs=2, force=False)
+    assert (out / "devprop_Test_A.c").exists()
+    assert (out / "devprop_Test_B.h").exists()
+    assert (out / CACHE_FILE_NAME).exists()
+
+    # second run must not touch unchanged inputs
+    mtime = (out / "devprop_Test_A.c").stat().st_mtime_ns
+    assert compile_batch(tmp_path / "vehicle.yml", out, generate_lang="C", jobs=2, force=False)
+    assert (out / "devprop_Test_A.c").stat().st_mtime_ns == mtime
+
+
+def test_node_id_collision(tmp_path):
+    errors = check_node_ids({tmp_path / "a.yml": 1, tmp_path / "b.yml": 1, tmp_path / "c.yml": 40})
+
+    assert any("node ID 1 already assigned" in error for error in errors)
+    assert any("invalid node ID 40" in error for error in errors)
+
+
+def test_device_name_collision(tmp_path):
+    (tmp_path / "a.yml").write_text(MANIFEST_YAML.format(name="Test.A"))
+    (tmp_path / "b.yml").write_text(MANIFEST_YAML.format(name="Test_A"))
+    (tmp_path / "c.yml").write_text(MANIFEST_YAML.format(name="Test.C"))
+
+    out = tmp_path / "out"
+    assert not compile_batch(tmp_path, out, generate_lang=None, jobs=2, force=False)
+
+    # the colliding manifest is not compiled, and not remembered as up to date either
+    assert sorted(path.name for path in out.glob("*.bin")) == ["Test_A.bin", "Test_C.bin"]
+    assert sorted(json.loads((out / CACHE_FILE_NAME).read_text())) == [str(tmp_path / "a.yml"), str(tmp_path / "c.yml")]
+    assert not compile_batch(tmp_path, out, generate_lang=None, jobs=2, force=False)
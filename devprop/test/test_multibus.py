@@ -0,0 +1,29 @@
+import time
+
+from devprop.client import Client
+from devprop.multibus import MultiBusClient
+from devprop.test_server import SimulatedBus, TestDevice
+
+
+def test_multibus_client(envelope):
+    devices = {"can0": TestDevice(1, envelope), "can1": TestDevice(1, envelope)}
+
+    with MultiBusClient({bus: Client(SimulatedBus([device])) for bus, device in devices.items()}) as client:
+        # a scan lasts until its timeout, as not all node IDs reply; both buses must be scanned in parallel
+        start = time.monotonic()
+        nodes = client.enumerate_nodes(timeout_sec=0.3)
+        assert time.monotonic() - start < 0.5
+
+        # the same node ID on both buses
+        assert sorted(nodes.keys()) == ["can0:FSE10.HELLO@1", "can1:FSE10.HELLO@1"]
+
+        node0, node1 = nodes["can0:FSE10.HELLO@1"], nodes["can1:FSE10.HELLO@1"]
+        prop, = [prop for prop in node0.properties if prop.name == "Test.Uint16.RW"]
+        assert node1.get_property_path(prop) == "can1:FSE10.HELLO@1/Test.Uint16.RW"
+
+        assert client.set_property(node1, prop, 1234, timeout_sec=0.1) == 1234
+        assert devices["can1"].property_values[prop.index] == 1234
+        assert devices["can0"].property_values.get(prop.index) != 1234
+
+        values = client.query_properties([(node0, prop), (node1, prop)], timeout_sec=0.1)
+        assert values[1] == (1234).to_bytes(2, "little")
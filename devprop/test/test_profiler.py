@@ -0,0 +1,50 @@
+import json
+
+from devprop.can_bus.hub import BusHub
+from devprop.client import Client, Node
+from devprop.profiler import Profiler
+
+
+def profile(bus):
+    profiler = Profiler()
+    client = Client(bus, profiler=profiler)
+    nodes = client.enumerate_nodes(timeout_sec=0.1)
+    node = nodes[1]
+    readable = [prop for prop in node.properties if prop.readable]
+
+    # node 9 does not exist, so its query times out
+    absent = Node(9, node.manifest)
+    queries = [(node, prop, None) for prop in readable] * 2 + [(absent, readable[0], None)]
+    client.execute_queries(queries, timeout_sec=0.05)
+
+    return profiler.report(node_names={1: node.name}), readable
+
+
+def check_report(report, readable):
+    nodes = report.by_node()
+    assert nodes[1]["count"] == 2 * len(readable)
+    assert nodes[1]["timeouts"] == 0 and nodes[1]["p50_ms"] <= nodes[1]["max_ms"]
+    assert nodes[9]["count"] == 0 and nodes[9]["timeouts"] == 1
+
+    assert len(report.by_property()) == len(readable) + 1
+
+    download, = report.manifest_downloads()
+    assert download["outcome"] == "ok" and download["segments"] > 1
+    assert download["segment_round_trip"]["count"] == download["segments"]
+
+    assert sum(report.heatmap()[1]) == 2 * len(readable)
+    assert "FSE10.HELLO@1" in report.format_text()
+    json.dumps(report.to_json())
+
+
+def test_profiler(bus):
+    check_report(*profile(bus))
+
+
+def test_profiler_hub(bus):
+    hub = BusHub(bus)
+
+    try:
+        check_report(*profile(hub))
+    finally:
+        hub.close()
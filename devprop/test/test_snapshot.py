@@ -0,0 +1,33 @@
+import pytest
+
+from devprop.snapshot import parse_snapshot, restore_snapshot, serialize_snapshot, take_snapshot
+from devprop.test_server import SimulatedBus
+
+
+@pytest.fixture
+def bus(devices):
+    return SimulatedBus(devices)
+
+
+def test_snapshot_roundtrip(devices, client, nodes):
+    snapshots, errors = take_snapshot(client, nodes, timeout_sec=0.1)
+    assert not errors
+
+    saved_values = [dict(device.property_values) for device in devices]
+    snapshots = parse_snapshot(serialize_snapshot(snapshots))
+
+    # read-write properties only
+    assert [sorted(snapshot.values.keys()) for snapshot in snapshots] == [[2, 4, 5], [2, 4, 5]]
+
+    for device in devices:
+        device.property_values.clear()
+
+    written, errors = restore_snapshot(client, nodes, snapshots, timeout_sec=0.1)
+    assert not errors
+    assert written == 6
+    assert [device.property_values for device in devices] == saved_values
+
+    # a node with a different manifest must not be touched
+    snapshots[0].manifest_hash = b"\x00" * 4
+    written, errors = restore_snapshot(client, nodes, snapshots, timeout_sec=0.1)
+    assert written == 3 and len(errors) == 1
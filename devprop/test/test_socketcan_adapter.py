@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+from devprop.can_bus.adapter import Message
+from devprop.can_bus.socketcan_adapter import CAN_EFF_FLAG, CAN_FRAME, SocketCanAdapter, pack_frame, unpack_frame
+from devprop.protocol_can_ext_v1.messages import make_filters, make_read_property_request, make_read_property_response
+from devprop.protocol_can_ext_v1.model import Direction
+
+
+VCAN_INTERFACE = "vcan0"
+
+
+def test_frame_packing():
+    msg = make_read_property_response(3, 5, b"\x01\x02")
+    frame = pack_frame(msg)
+
+    assert len(frame) == CAN_FRAME.size
+    assert unpack_frame(frame) == msg
+
+    # standard and RTR frames are not ours
+    assert unpack_frame(CAN_FRAME.pack(0x123, 0, b"")) is None
+    assert unpack_frame(CAN_FRAME.pack(0x123 | CAN_EFF_FLAG | 0x40000000, 0, b"")) is None
+
+
+def open_adapter():
+    try:
+        return SocketCanAdapter(VCAN_INTERFACE)
+    except OSError as ex:
+        pytest.skip(f"{VCAN_INTERFACE} not available: {ex}")
+
+
+def test_vcan_loopback():
+    device = open_adapter()
+    client = open_adapter()
+
+    try:
+        client.set_filters(make_filters(Direction.DEVICE_TO_CLIENT))
+
+        client.send(make_read_property_request(3, 5))
+        assert device.receive(time.monotonic() + 1) == make_read_property_request(3, 5)
+
+        # the kernel must drop the request (wrong direction) and only let the response through
+        device.send_many([make_read_property_request(4, 5), make_read_property_response(3, 5, b"\x01\x02")])
+        assert client.receive(time.monotonic() + 1) == make_read_property_response(3, 5, b"\x01\x02")
+
+        with pytest.raises(TimeoutError):
+            client.receive(time.monotonic() + 0.05)
+    finally:
+        device.close()
+        client.close()
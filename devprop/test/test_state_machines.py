@@ -0,0 +1,173 @@
+import time
+
+import pytest
+
+from devprop.can_bus.adapter import Message, run_state_machine
+from devprop.client import Client
+from devprop.protocol_can_ext_v1.messages import make_error_response, make_read_manifest_response, \
+    make_read_property_response, make_write_property_response, unpack_id
+from devprop.protocol_can_ext_v1.model import ErrorCode, Opcode, ProtocolError
+from devprop.protocol_can_ext_v1.state_machines import FlowControl, ManifestDownload, PropertyPipeline, PropertyQuery
+from devprop.test_server import SimulatedBus, TestDevice
+
+
+def segment_response(envelope: bytes, segment: int) -> Message:
+    return make_read_manifest_response(3, segment, envelope[segment * 8:(segment + 1) * 8])
+
+
+def test_manifest_download_out_of_order(envelope):
+    segment_count = (len(envelope) + 7) // 8
+    md = ManifestDownload(3, window=4)
+
+    # nothing but the header can be requested before its length is known
+    assert unpack_id(md.get_frame_to_send().id)[1] == 0
+    assert md.get_frame_to_send() is None
+
+    md.frame_received(segment_response(envelope, 0))
+    requested = [unpack_id(md.get_frame_to_send().id)[1] for _ in range(4)]
+    assert requested == [1, 2, 3, 4]
+    assert md.get_frame_to_send() is None
+
+    for segment in reversed(range(1, segment_count)):
+        md.frame_received(segment_response(envelope, segment))
+
+    assert md.is_finished()
+    assert md.get_manifest_envelope() == envelope
+
+
+class LossyBus(SimulatedBus):
+    """
+    Drops the first request for each of the given manifest segments.
+    """
+
+    def __init__(self, devices, segments_to_drop):
+        super().__init__(devices)
+        self.requests = 0
+        self.segments_to_drop = set(segments_to_drop)
+
+    def send(self, msg: Message) -> None:
+        node_id, segment, opcode, direction = unpack_id(msg.id)
+
+        if opcode is Opcode.READ_MANIFEST:
+            self.requests += 1
+
+            if segment in self.segments_to_drop:
+                self.segments_to_drop.remove(segment)
+                return
+
+        super().send(msg)
+
+
+def test_manifest_download_lost_segments(envelope):
+    segment_count = (len(envelope) + 7) // 8
+    # losses in the middle are noticed when later responses overtake them; a lost last segment only by its timeout
+    for dropped in [set(range(1, segment_count, 3)), {segment_count - 1}]:
+        bus = LossyBus([TestDevice(3, envelope)], dropped)
+
+        md = ManifestDownload(3, window=8)
+        run_state_machine(bus, md, time.monotonic() + 2)
+
+        assert md.get_manifest_envelope() == envelope
+        assert bus.requests == segment_count + len(dropped)
+
+
+def test_property_pipeline_window():
+    pqs = [PropertyQuery(3, index) for index in [1, 2, 1, 3]]
+    completions = []
+    pipeline = PropertyPipeline(3, pqs, timeout_sec=1, flow=FlowControl(max_window=2),
+                                on_complete=lambda query, error: completions.append(query))
+
+    def requested():
+        indices = []
+
+        while True:
+            frame = pipeline.get_frame_to_send()
+
+            if frame is None:
+                return indices
+
+            indices.append(unpack_id(frame.id)[1])
+
+    assert requested() == [1, 2]
+
+    # matched by property index; the response to 2 overtook the request for 1, which is therefore repeated,
+    # and the window shrinks
+    pipeline.frame_received(make_read_property_response(3, 2, b"\x02"))
+    assert completions == [1]
+    assert requested() == [1]
+    assert pipeline.flow.window == 1
+
+    # the second query of property 1 had to wait for the first one
+    pipeline.frame_received(make_read_property_response(3, 1, b"\x01"))
+    assert requested() == [1, 3]
+
+    pipeline.frame_received(make_error_response(3, 3, Opcode.READ_PROPERTY, ErrorCode.NOT_IMPLEMENTED))
+    pipeline.frame_received(make_read_property_response(3, 1, b"\x11"))
+
+    assert pipeline.is_finished()
+    assert pipeline.completed == [1, 0, 3, 2]
+    assert completions == pipeline.completed
+    assert [pq.get_value() for pq in pqs if pq.is_finished()] == [b"\x01", b"\x02", b"\x11"]
+    assert isinstance(pipeline.errors[3], ProtocolError)
+
+
+def test_property_pipeline_serializes_writes():
+    pqs = [PropertyQuery(3, 1), PropertyQuery(3, 2, b"\x05"), PropertyQuery(3, 3)]
+    pipeline = PropertyPipeline(3, pqs, timeout_sec=1, flow=FlowControl(max_window=4))
+
+    # the write waits for the read before it, and goes out alone
+    assert unpack_id(pipeline.get_frame_to_send().id)[1:3] == (1, Opcode.READ_PROPERTY)
+    assert pipeline.get_frame_to_send() is None
+
+    pipeline.frame_received(make_read_property_response(3, 1, b"\x01"))
+    assert unpack_id(pipeline.get_frame_to_send().id)[1:3] == (2, Opcode.WRITE_PROPERTY)
+    assert pipeline.get_frame_to_send() is None
+
+    # ... and is never repeated: the only time to act on is its timeout
+    assert pipeline.get_retry_time() > time.monotonic() + 0.5
+
+    pipeline.frame_received(make_write_property_response(3, 2, b"\x05"))
+    assert unpack_id(pipeline.get_frame_to_send().id)[1:3] == (3, Opcode.READ_PROPERTY)
+
+
+class ShallowQueueBus(SimulatedBus):
+    """
+    Simulates devices with a receive queue of `depth` frames: requests beyond that in a single burst are dropped.
+    """
+
+    def __init__(self, devices):
+        super().__init__(devices)
+        self.depth = None
+        self.dropped = 0
+
+    def send_many(self, messages) -> None:
+        for msg in messages[:self.depth]:
+            self.send(msg)
+
+        self.dropped += len(messages[self.depth:])
+
+
+@pytest.fixture
+def bus(device):
+    return ShallowQueueBus([device])
+
+
+@pytest.fixture
+def client(bus):
+    return Client(bus, property_window=8)
+
+
+def test_pipelined_queries_back_off(bus, client, node):
+    readable = [prop for prop in node.properties if prop.readable] * 5
+
+    bus.depth = 2
+    results = client.execute_queries([(node, prop, None) for prop in readable], timeout_sec=1)
+    assert all(error is None for _, error in results)
+    assert bus.dropped > 0
+
+    # the window has adapted to the queue depth, so there are (almost) no more losses
+    assert client._get_flow_control(node.node_id).window <= 4
+    dropped = bus.dropped
+    results = client.execute_queries([(node, prop, None) for prop in readable], timeout_sec=1)
+    assert all(error is None for _, error in results)
+    assert bus.dropped - dropped < dropped
@@ -0,0 +1,90 @@
+import io
+import logging
+
+from devprop.can_bus.adapter import Message
+from devprop.can_bus.trace import BinaryFileSink, FrameTracer, LastFramesOnError, RX, TX, format_record, \
+    read_binary_trace
+from devprop.protocol_can_ext_v1.messages import make_read_property_request, make_read_property_response
+
+
+class ListSink:
+    def __init__(self):
+        self.records = []
+
+    def write(self, records):
+        self.records.extend(records)
+
+    def close(self):
+        pass
+
+
+def test_tracer_sinks(tmp_path, bus, client):
+    sink = ListSink()
+    tracer = FrameTracer([sink, BinaryFileSink(str(tmp_path / "trace.bin"))])
+
+    bus.tracer = tracer
+    client.enumerate_nodes(timeout_sec=1)
+    tracer.close()
+
+    assert [direction for _, _, _, direction in sink.records[:2]] == [TX, TX]
+    assert any(direction == RX for _, _, _, direction in sink.records)
+    assert all(a[0] <= b[0] for a, b in zip(sink.records, sink.records[1:]))
+    assert list(read_binary_trace(str(tmp_path / "trace.bin"))) == sink.records
+
+
+def test_ring_buffer_overrun():
+    tracer = FrameTracer(capacity=8)
+
+    for index in range(1, 21):
+        tracer.record(TX, make_read_property_request(1, index))
+
+    # only the last frames are kept
+    assert [id & 0xFF for _, id, _, _ in tracer.last(100)] == list(range(13, 21))
+    assert [id & 0xFF for _, id, _, _ in tracer.drain()] == list(range(13, 21))
+    assert tracer.overruns == 12
+    assert tracer.drain() == []
+
+
+def test_last_frames_on_error():
+    tracer = FrameTracer(capacity=16)
+    tracer.record(TX, make_read_property_request(1, 5))
+    tracer.record(RX, make_read_property_response(1, 5, b"\x2a\x00"))
+
+    stream = io.StringIO()
+    log = logging.getLogger("devprop.test.trace")
+    handler = LastFramesOnError(tracer, count=1, stream=stream)
+    log.addHandler(handler)
+
+    try:
+        log.warning("not an error")
+        assert stream.getvalue() == ""
+
+        log.error("something failed")
+    finally:
+        log.removeHandler(handler)
+
+    lines = stream.getvalue().splitlines()
+    assert lines[0] == "Last 1 frames before error:"
+    assert " Rx frame " in lines[1] and "[2a 00" in lines[1]
+
+
+def test_undecodable_frames():
+    tracer = FrameTracer(capacity=16)
+    # a reserved opcode, and an ID outside of the protocol's range
+    tracer.record(RX, Message(0x1EF00300 | (1 << 11) | 1, b""))
+    tracer.record(RX, Message(0x123, b"\x01\x02"))
+
+    lines = [format_record(record) for record in tracer.last(2)]
+    assert "1ef00b01h" in lines[0] and "00000123h [01 02" in lines[1]
+
+    stream = io.StringIO()
+    log = logging.getLogger("devprop.test.trace")
+    handler = LastFramesOnError(tracer, count=2, stream=stream)
+    log.addHandler(handler)
+
+    try:
+        log.error("something failed")
+    finally:
+        log.removeHandler(handler)
+
+    assert len(stream.getvalue().splitlines()) == 3
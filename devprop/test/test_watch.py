@@ -0,0 +1,58 @@
+import csv
+import io
+import json
+
+import pytest
+
+from devprop.model import PropertyType
+from devprop.test_server import SimulatedBus
+from devprop.watch import format_csv, format_json_lines, select_properties, watch
+
+
+@pytest.fixture
+def bus(devices):
+    return SimulatedBus(devices)
+
+
+def test_select_properties(nodes):
+    def paths(patterns):
+        return [node.get_property_path(prop) for node, prop in select_properties(nodes, patterns)]
+
+    assert paths(["FSE10.HELLO@2/Test.Uint8.*"]) == ["FSE10.HELLO@2/Test.Uint8.RW", "FSE10.HELLO@2/Test.Uint8.Const"]
+    assert paths(["*/Test.Uint16.RO"]) == ["FSE10.HELLO@1/Test.Uint16.RO", "FSE10.HELLO@2/Test.Uint16.RO"]
+
+    # whole device, without the write-only property
+    assert len(paths(["FSE10.HELLO@1"])) == 5
+    assert paths(["nonexistent"]) == []
+
+
+def test_watch(client, nodes):
+    properties = select_properties(nodes, ["*/Test.Uint16.*"])
+    cycles = []
+
+    stats = watch(client, properties, rate_hz=100, timeout_sec=0.1, on_cycle=cycles.append, count=3)
+
+    assert len(cycles) == 3
+    assert all(len(samples) == 4 for samples in cycles)
+    assert all(property_stats.samples == 3 and property_stats.errors == 0 for property_stats in stats.values())
+
+    rows = list(csv.DictReader(io.StringIO(format_csv(cycles[0], header=True))))
+    assert [row["property"] for row in rows] == [node.get_property_path(prop) for node, prop in properties]
+    assert all(row["value"] and not row["error"] for row in rows)
+
+    records = [json.loads(line) for line in format_json_lines(cycles[0]).splitlines()]
+    assert [record["value"] for record in records] == [sample.value for sample in cycles[0]]
+
+
+def test_watch_invalid_value(devices, client, nodes):
+    properties = select_properties(nodes, ["*/Test.Uint16.RO"])
+    cycles = []
+
+    # node 1 responds with a single byte
+    devices[0].property_types[properties[0][1].index] = PropertyType.UINT8
+
+    stats = watch(client, properties, rate_hz=100, timeout_sec=0.1, on_cycle=cycles.append, count=2)
+
+    assert cycles[1][0].error.startswith("invalid value [") and cycles[1][0].value is None
+    assert cycles[1][1].error is None and cycles[1][1].value is not None
+    assert [property_stats.errors for property_stats in stats.values()] == [2, 0]
@@ -1,71 +1,45 @@
 #!/usr/bin/env python3
 
 import argparse
+import collections
 import logging
 import struct
+import threading
+import time
 import traceback
 from pathlib import Path
 import random
+from typing import Deque, List, Optional
 
-from devprop.can_bus.adapter import Message
-from devprop.manifest import DRAFT_CSV_ZLIB, add_envelope, parse_manifest_yaml, serialize_manifest_draft_csv
+from devprop.can_bus.adapter import BusAdapter, Message
+from devprop.can_bus.trace import RX, TX
+from devprop.manifest import DRAFT_CSV_ZLIB, ManifestEnvelope, add_envelope, parse_enveloped_manifest, parse_manifest_yaml, \
+    serialize_manifest_draft_csv
+from devprop.model import PropertyType
 from devprop.protocol_can_ext_v1.messages import unpack_id, Direction, ErrorCode, make_error_response, \
     make_read_manifest_response, \
-    make_read_property_response, Opcode, make_write_property_response
-
-from devprop.can_bus.python_can_adapter import PythonCanAdapter
+    make_read_property_response, Opcode, make_write_property_response, make_filters
 
 logger = logging.getLogger(__name__)
 
 
-def main():
-    logging.basicConfig()
-    logging.getLogger("devprop").setLevel(logging.DEBUG)
-
-    parser = argparse.ArgumentParser()
-    parser.add_argument("manifest", type=Path)
-    parser.add_argument("node_id", type=int)
-    args = parser.parse_args()
-
-    # MAX_FRAME_LEN = 100
-
-    # if args.port.startswith("can:"):
-    # import can_socket
-
-    # sock = can_socket.CanSocket()
-    # can_id = int(args.port[4:], base=0)
-    bus = PythonCanAdapter()
-    # bus.set_filters([dict(can_id=can_id, can_mask=0x7ff, extended=False)])
-    logger.info("Listening on CAN bus")
-    # else:
-    #     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    #     server_address = "127.0.0.1"
-    #     server = (server_address, int(args.port, base=0))
-    #     sock.bind(server)
-    #
-    #     logger.info("Listening on " + server_address + ":" + str(args.port))
-
-    if args.manifest.suffix.lower() in {".yml", ".yaml"}:
-        # YAML manifest
-        with open(args.manifest, "rt") as f:
-            manifest = parse_manifest_yaml(f)
+class TestDevice:
+    __test__ = False
 
-        manifest_payload = add_envelope(serialize_manifest_draft_csv(manifest), DRAFT_CSV_ZLIB)
-    else:
-        # assume binary
-        manifest_payload = args.manifest.read_bytes()
+    def __init__(self, node_id: int, manifest_payload: bytes):
+        self.node_id = node_id
+        self.manifest_payload = manifest_payload
+        self.property_values = {}
 
-    property_values = {}
+        # respond with the width of each property's type; 16 bits where unknown
+        manifest = parse_enveloped_manifest(ManifestEnvelope(manifest_payload))
+        self.property_types = {prop.index: prop.type for prop in manifest.properties}
 
-    while True:
-        # (client_address, client_port)
-        msg = bus.receive()
+    def handle_message(self, msg: Message) -> Optional[Message]:
         node_id, property_index, opcode, direction = unpack_id(msg.id)
 
-        if node_id != args.node_id:
-            continue
-
-        assert direction is Direction.CLIENT_TO_DEVICE
+        if node_id != self.node_id or direction is not Direction.CLIENT_TO_DEVICE:
+            return None
 
         resp: Message
 
@@ -74,32 +48,111 @@ def main():
                 segment = property_index
                 # byte_offset = p.unpack_get_manifest_request(payload)
                 # reply = p.make_get_manifest_response(tx_id, file_contents[byte_offset:byte_offset + 7])
-                resp = make_read_manifest_response(node_id, segment, manifest_payload[segment * 8:(segment + 1) * 8])
+                resp = make_read_manifest_response(node_id, segment, self.manifest_payload[segment * 8:(segment + 1) * 8])
             elif opcode == Opcode.READ_PROPERTY:
+                type = self.property_types.get(property_index, PropertyType.UINT16)
+                value_format = "<" + type.value
+
                 try:
-                    value = property_values[property_index]
+                    value = self.property_values[property_index]
                 except KeyError:
-                    value = random.randint(0, 2**16 - 1)
-                    property_values[property_index] = value
+                    value = random.randint(*type.range_inclusive)
+                    self.property_values[property_index] = value
                 # reply = p.pack_frame(p.Opcode.GET_PROPERTY, tx_id, bytes([value & 0xff, value >> 8]))
-                resp = make_read_property_response(node_id, property_index, bytes([value & 0xff, value >> 8]))
+                resp = make_read_property_response(node_id, property_index, struct.pack(value_format, value))
             elif opcode == Opcode.WRITE_PROPERTY:
                 # resp = make_error_response(node_id, property_index, opcode, ErrorCode.NOT_IMPLEMENTED)
                 # if property_index <
                 # TODO validation
-                value, = struct.unpack("<H", msg.data)
-                property_values[property_index] = value
-                resp = make_write_property_response(node_id, property_index, bytes([value & 0xff, value >> 8]))
+                value_format = "<" + self.property_types.get(property_index, PropertyType.UINT16).value
+                value, = struct.unpack(value_format, msg.data)
+                self.property_values[property_index] = value
+                resp = make_write_property_response(node_id, property_index, struct.pack(value_format, value))
             else:
                 resp = make_error_response(node_id, property_index, opcode, ErrorCode.PROTOCOL_ERROR)
         except:
             traceback.print_exc()
             resp = make_error_response(node_id, property_index, opcode, ErrorCode.INTERNAL_ERROR)
 
-        bus.send(resp)
+        return resp
+
+
+class SimulatedBus(BusAdapter):
+    """
+    In-process bus with TestDevice instances attached to it; intended for tests and benchmarks.
+    """
+
+    def __init__(self, devices: List[TestDevice]):
+        self.devices = devices
+        self._rx_queue: Deque[Message] = collections.deque()
+        self._cond = threading.Condition()
+
+    def receive(self, deadline: Optional[float] = None) -> Message:
+        return self._receive_by_polling(deadline)
+
+    def poll(self) -> Optional[Message]:
+        with self._cond:
+            msg = self._rx_queue.popleft() if self._rx_queue else None
+
+        if msg is not None and self.tracer is not None:
+            self.tracer.record(RX, msg)
+
+        return msg
+
+    def wait(self, until: Optional[float]) -> bool:
+        with self._cond:
+            timeout = max(until - time.monotonic(), 0) if until is not None else None
+            return bool(self._cond.wait_for(lambda: self._rx_queue, timeout))
+
+    def send(self, msg: Message) -> None:
+        if self.tracer is not None:
+            self.tracer.record(TX, msg)
+
+        with self._cond:
+            for device in self.devices:
+                resp = device.handle_message(msg)
+
+                if resp is not None and self._accepts(resp.id):
+                    self._rx_queue.append(resp)
+
+            self._cond.notify_all()
+
+
+def load_manifest_envelope(path: Path) -> bytes:
+    if path.suffix.lower() in {".yml", ".yaml"}:
+        # YAML manifest
+        with open(path, "rt") as f:
+            manifest = parse_manifest_yaml(f)
+
+        return add_envelope(serialize_manifest_draft_csv(manifest), DRAFT_CSV_ZLIB)
+    else:
+        # assume binary
+        return path.read_bytes()
+
+
+def main():
+    logging.basicConfig()
+    logging.getLogger("devprop").setLevel(logging.DEBUG)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("manifest", type=Path)
+    parser.add_argument("node_id", type=int)
+    args = parser.parse_args()
+
+    from devprop.can_bus.python_can_adapter import PythonCanAdapter
+
+    bus = PythonCanAdapter()
+    bus.set_filters(make_filters(Direction.CLIENT_TO_DEVICE, [args.node_id]))
+    logger.info("Listening on CAN bus")
+
+    device = TestDevice(args.node_id, load_manifest_envelope(args.manifest))
+
+    while True:
+        msg = bus.receive()
+        resp = device.handle_message(msg)
 
-        # print("Echoing data back to " + str(client_address) + ": " + str(payload))
-        # sent = sock.sendto(payload, client_address)
+        if resp is not None:
+            bus.send(resp)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+
+"""
+devprop-watch: scan the bus once, then keep polling selected properties at a fixed rate, streaming the values as
+CSV, JSON Lines or a refreshing terminal table.
+
+Properties are selected by glob patterns matched against "device/property" and "device@node_id/property";
+a pattern without a slash selects all readable properties of the matching devices.
+"""
+
+import csv
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+import io
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, TextIO, Tuple
+
+from .client import Node
+from .model import Property
+from .property import decode_value
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Sample:
+    node: Node
+    property: Property
+    timestamp: float            # wall-clock time of the start of the poll cycle
+    value: Optional[float]
+    error: Optional[str]
+    latency_sec: float          # from the start of the poll cycle until the response arrived
+
+
+@dataclass
+class PropertyStats:
+    samples: int = 0
+    errors: int = 0
+    total_latency_sec: float = 0.0
+    max_latency_sec: float = 0.0
+
+    def record(self, sample: Sample) -> None:
+        if sample.error is not None:
+            self.errors += 1
+            return
+
+        self.samples += 1
+        self.total_latency_sec += sample.latency_sec
+        self.max_latency_sec = max(self.max_latency_sec, sample.latency_sec)
+
+    @property
+    def mean_latency_sec(self) -> float:
+        return self.total_latency_sec / self.samples if self.samples else 0.0
+
+
+def select_properties(nodes: Dict[int, Node], patterns: List[str]) -> List[Tuple[Node, Property]]:
+    selected = []
+
+    for node in sorted(nodes.values(), key=lambda node: node.node_id):
+        for prop in node.properties:
+            if not prop.readable:
+                continue
+
+            paths = [f"{node.device_name}/{prop.name}", node.get_property_path(prop)]
+
+            for pattern in patterns:
+                if "/" not in pattern:
+                    pattern += "/*"
+
+                if any(fnmatchcase(path, pattern) for path in paths):
+                    selected.append((node, prop))
+                    break
+
+    return selected
+
+
+def watch(client, properties: List[Tuple[Node, Property]], rate_hz: float, timeout_sec: float,
+          on_cycle: Callable[[List[Sample]], None], count: Optional[int] = None,
+          stats: Optional[Dict[str, PropertyStats]] = None) -> Dict[str, PropertyStats]:
+    """
+    Poll `properties` every 1/`rate_hz` seconds. When a cycle overruns the period, the missed ticks are skipped
+    instead of being caught up on.
+
+    :param client: Client or DaemonClient
+    :param on_cycle: called with the samples of each completed poll cycle
+    :param count: number of poll cycles, None = until interrupted
+    :param stats: updated while running, so that the statistics so far are available to `on_cycle` or after
+                  an interruption
+    :return: statistics by property path
+    """
+    if stats is None:
+        stats = {}
+
+    for node, prop in properties:
+        stats.setdefault(node.get_property_path(prop), PropertyStats())
+
+    queries = [(node, prop, None) for node, prop in properties]
+    period = 1 / rate_hz
+    cycle = 0
+    next_poll = time.monotonic()
+
+    while count is None or cycle < count:
+        delay = next_poll - time.monotonic()
+
+        if delay > 0:
+            time.sleep(delay)
+
+        timestamp = time.time()
+        start = time.monotonic()
+        latencies = [0.0] * len(queries)
+
+        def on_result(i: int, value: Optional[bytes], error: Optional[Exception]):
+            latencies[i] = time.monotonic() - start
+
+        results = client.execute_queries(queries, timeout_sec=timeout_sec, on_result=on_result)
+
+        samples = []
+
+        for (node, prop, _), (value, error), latency in zip(queries, results, latencies):
+            if error is None:
+                try:
+                    decoded = decode_value(prop, value)
+                except Exception:
+                    # e.g. a response of the wrong width; reported like a failed query, the others are unaffected
+                    error = ValueError(f"invalid value [{value.hex(' ')}]")
+
+            if error is None:
+                sample = Sample(node, prop, timestamp, decoded, None, latency)
+            else:
+                sample = Sample(node, prop, timestamp, None, str(error) or type(error).__name__, latency)
+
+            stats[node.get_property_path(prop)].record(sample)
+            samples.append(sample)
+
+        on_cycle(samples)
+
+        cycle += 1
+        next_poll = max(next_poll + period, time.monotonic())
+
+    return stats
+
+
+CSV_HEADER = ["timestamp", "property", "value", "unit", "latency_ms", "error"]
+
+
+def format_csv(samples: List[Sample], header: bool = False) -> str:
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+
+    if header:
+        writer.writerow(CSV_HEADER)
+
+    writer.writerows((f"{sample.timestamp:.3f}", sample.node.get_property_path(sample.property),
+                      sample.value if sample.value is not None else "", sample.property.unit,
+                      f"{sample.latency_sec * 1000:.1f}", sample.error or "")
+                     for sample in samples)
+
+    return out.getvalue()
+
+
+def format_json_lines(samples: List[Sample]) -> str:
+    return "".join(json.dumps(dict(timestamp=round(sample.timestamp, 3),
+                                   property=sample.node.get_property_path(sample.property),
+                                   value=sample.value,
+                                   unit=sample.property.unit,
+                                   latency_ms=round(sample.latency_sec * 1000, 1),
+                                   error=sample.error)) + "\n"
+                   for sample in samples)
+
+
+def format_table(samples: List[Sample], stats: Dict[str, PropertyStats], elapsed_sec: float) -> str:
+    rows = [("PROPERTY", "VALUE", "UNIT", "RATE", "LATENCY", "ERRORS")]
+
+    for sample in samples:
+        path = sample.node.get_property_path(sample.property)
+        property_stats = stats[path]
+        rows.append((path,
+                     f"{sample.value:g}" if sample.value is not None else "-",
+                     sample.property.unit,
+                     f"{property_stats.samples / elapsed_sec:.1f} Hz" if elapsed_sec > 0 else "-",
+                     f"{property_stats.mean_latency_sec * 1000:.1f} ms",
+                     str(property_stats.errors)))
+
+    widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+
+    # home the cursor & clear the screen, then redraw everything in a single write
+    return "\x1b[H\x1b[J" + "".join("  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() + "\n"
+                                    for row in rows)
+
+
+class BufferedOutput:
+    """
+    Writes text to a stream from a background thread, so that a slow consumer (e.g. a pipe into another tool)
+    does not hold up polling. The stream is flushed whenever there is nothing more to write.
+    """
+
+    def __init__(self, stream: TextIO):
+        self._stream = stream
+        self._queue: "queue.SimpleQueue[Optional[str]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="devprop-watch output", daemon=True)
+        self._thread.start()
+
+    def write(self, text: str) -> None:
+        self._queue.put(text)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            text = self._queue.get()
+
+            if text is None:
+                self._stream.flush()
+                return
+
+            self._stream.write(text)
+
+            if self._queue.empty():
+                self._stream.flush()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-b", "--bus")
+    parser.add_argument("-D", "--debug", dest="debug", action="store_true")
+    parser.add_argument("-T", dest="timeout_sec", type=float, default=1)
+    parser.add_argument("--no-daemon", dest="use_daemon", action="store_false")
+    parser.add_argument("-r", "--rate", dest="rate_hz", type=float, default=1, help="poll rate in Hz")
+    parser.add_argument("-n", "--count", type=int, help="stop after this many poll cycles")
+    parser.add_argument("-f", "--format", choices=["csv", "jsonl", "table"],
+                        help="output format (default: table on a terminal, csv otherwise)")
+    parser.add_argument("patterns", nargs="+", metavar="pattern")
+    args = parser.parse_args()
+
+    logging.basicConfig()
+
+    if args.debug:
+        logging.getLogger("devprop").setLevel(logging.DEBUG)
+
+    from .daemon import open_client
+
+    cl = open_client(args.bus, use_daemon=args.use_daemon)
+
+    nodes = cl.enumerate_nodes(timeout_sec=args.timeout_sec)
+    properties = select_properties(nodes, args.patterns)
+
+    if not properties:
+        parser.error("no readable properties match the given patterns")
+
+    output_format = args.format or ("table" if sys.stdout.isatty() else "csv")
+    output = BufferedOutput(sys.stdout)
+    stats: Dict[str, PropertyStats] = {}
+    start = time.monotonic()
+
+    if output_format == "csv":
+        output.write(format_csv([], header=True))
+
+    def on_cycle(samples: List[Sample]):
+        if output_format == "csv":
+            output.write(format_csv(samples))
+        elif output_format == "jsonl":
+            output.write(format_json_lines(samples))
+        else:
+            output.write(format_table(samples, stats, time.monotonic() - start))
+
+    try:
+        watch(cl, properties, rate_hz=args.rate_hz, timeout_sec=args.timeout_sec, on_cycle=on_cycle,
+              count=args.count, stats=stats)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        output.close()
+
+    elapsed_sec = time.monotonic() - start
+
+    for path, property_stats in stats.items():
+        print(f"{path}: {property_stats.samples / elapsed_sec:.1f} Hz, "
+              f"latency mean {property_stats.mean_latency_sec * 1000:.1f} ms "
+              f"max {property_stats.max_latency_sec * 1000:.1f} ms, {property_stats.errors} errors", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
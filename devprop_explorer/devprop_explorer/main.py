@@ -4,12 +4,13 @@ import html
 import logging
 import os
 import sys
+import time
 import traceback
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 
-from PySide2.QtCore import Qt, QThread, Signal, QObject, SignalInstance
+from PySide2.QtCore import Qt, QTimer, Signal, SignalInstance
 from PySide2.QtWidgets import *
-from PySide2.QtGui import QFont
+from PySide2.QtGui import QCloseEvent, QFont
 
 from devprop.can_bus.transport_plugin import get_adapter
 from devprop.client import Client
@@ -19,12 +20,17 @@ from devprop.protocol_can_ext_v1.model import NodeId
 
 # ./venv/bin/pyside2-uic mainwindow.ui -o ui_mainwindow.py
 from .models import NodeListModel, PropertyTableModel, Node
+from .plot import TrendPlot
 from .configtoolsharedlogger import logger
 from .ui_mainwindow import Ui_MainWindow
+from .worker import BusWorker
 
 
 TIMEOUT = 2
 
+# Values streamed from the worker are applied to the table at most this often
+VALUE_FLUSH_INTERVAL_MS = 50
+
 
 def display_exception(parent: QFrame, ex: BaseException):
     traceback.print_exception(type(ex), ex, ex.__traceback__)
@@ -33,50 +39,6 @@ def display_exception(parent: QFrame, ex: BaseException):
     QMessageBox.warning(parent, "Unhandled exception", "\n".join(exc_info) + "\n(see the log for details)")
 
 
-def make_signal_promise(*args):
-    class SignalPromise(QObject):
-        then: SignalInstance = Signal(*args)
-        catch: SignalInstance = Signal(BaseException)
-
-        def reject(self, error: BaseException):
-            if self.catch is not None:
-                self.catch.emit(error)
-            else:
-                traceback.print_exc()
-
-        def resolve(self, *args):
-            self.then.emit(*args)
-
-    return SignalPromise()
-
-
-dumb_thread_list = []
-
-
-def run_async(function):
-    thread = QThread()
-
-    promise = make_signal_promise(dict)
-
-    def func():
-        try:
-            res = function()
-            promise.resolve(res)
-        except BaseException as ex:
-            # necessary to catch all exceptions in QThread.run, otherwise app hangs on quit
-            # import traceback
-            # traceback.print_exc()
-            promise.reject(ex)
-        finally:
-            QApplication.restoreOverrideCursor()
-
-    thread.run = func
-    thread.start()
-    dumb_thread_list.append(thread)
-    QApplication.setOverrideCursor(Qt.WaitCursor)
-    return promise
-
-
 class MainWindow(QMainWindow):
     device_list_model: NodeListModel
     property_table_model: PropertyTableModel
@@ -93,6 +55,7 @@ class MainWindow(QMainWindow):
 
         self.ui.actionScanBus.clicked.connect(self.scan_bus)
         self.ui.actionGetAll.clicked.connect(self.get_all_properties)
+        self.ui.actionPlot.clicked.connect(self.plot_selected)
 
         self.device_list_model = NodeListModel()
         self.ui.deviceList.setModel(self.device_list_model)
@@ -103,6 +66,23 @@ class MainWindow(QMainWindow):
         self.ui.properties.setModel(self.property_table_model)
         self.property_table_model.property_value_changed.connect(self.property_value_changed)
 
+        # coalesces values arriving from the worker into one model update per interval
+        self._pending_values: Dict[str, Optional[float]] = {}
+        self._value_flush_timer = QTimer(self)
+        self._value_flush_timer.setSingleShot(True)
+        self._value_flush_timer.setInterval(VALUE_FLUSH_INTERVAL_MS)
+        self._value_flush_timer.timeout.connect(self.flush_values)
+
+        self._auto_refresh_timer = QTimer(self)
+        self._auto_refresh_timer.timeout.connect(self.auto_refresh)
+        self._auto_refresh_in_flight = False
+        self.ui.autoRefresh.toggled.connect(self.auto_refresh_settings_changed)
+        self.ui.autoRefreshRate.valueChanged.connect(self.auto_refresh_settings_changed)
+
+        # properties polled for the trend plot, on top of the auto-refresh
+        self.trend_plot: Optional[TrendPlot] = None
+        self._plotted: List[Tuple[Node, Property]] = []
+
         class MyLogger(logging.Handler):
             def __init__(self, event: SignalInstance, **kwargs):
                 super().__init__(**kwargs)
@@ -123,17 +103,37 @@ class MainWindow(QMainWindow):
         # self.backend = MockBackend()
         self.client = Client(get_adapter(os.getenv("DEVPROP_BUS")))     # TODO: GUI picker?
 
+        # All bus access goes through this one thread, so actions never race on the client
+        self.worker = BusWorker()
+        self.worker.busy_changed.connect(self.worker_busy_changed)
+        self.worker.progress.connect(self.property_read)
+        self.worker.start()
+
         logger.info("Ready.")
 
+    def closeEvent(self, event: QCloseEvent):
+        self.worker.stop()
+
+        if self.trend_plot is not None:
+            self.trend_plot.close()
+
+        super().closeEvent(event)
+
+    def worker_busy_changed(self, busy: bool):
+        if busy:
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+        else:
+            QApplication.restoreOverrideCursor()
+
     def log_event(self, level: str, message: str):
         self.ui.log.append(f"<b>{level}</b> {html.escape(message)}")
 
     def scan_bus(self):
         self.ui.actionScanBus.setEnabled(False)
 
-        promise = run_async(lambda: self.client.enumerate_nodes(timeout_sec=TIMEOUT))
+        promise = self.worker.submit(lambda: self.client.enumerate_nodes(timeout_sec=TIMEOUT))
         promise.then.connect(self.bus_scan_finished)
-        promise.catch.connect(lambda ex: display_exception(self, ex))
+        promise.catch.connect(lambda ex: [display_exception(self, ex), self.ui.actionScanBus.setEnabled(True)])
 
     def bus_scan_finished(self, nodes: Dict[NodeId, Node]):
         devices = sorted(nodes.values(), key=lambda node: node.name)
@@ -151,7 +151,6 @@ class MainWindow(QMainWindow):
         for dev in self.all_devices_by_name.values():
             if self.device_list_model.is_device_selected(dev.name):
                 for property in dev.manifest.properties:
-                    # FIXME: this trashes already retrieved values; better backing model needed!
                     tuples.append((dev, property))
 
         self.property_table_model.set_property_list(tuples)
@@ -168,28 +167,95 @@ class MainWindow(QMainWindow):
                 for prop in dev.manifest.properties:
                     query.append((dev, prop))
 
-        promise = run_async(lambda: (query, self.client.query_properties(query, timeout_sec=TIMEOUT)))
+        def on_result(i: int, raw_value: Optional[bytes]):
+            # runs in the worker thread; values are streamed to the table as they arrive
+            self.worker.progress.emit((*query[i], raw_value, time.monotonic()))
+
+        promise = self.worker.submit(lambda: self.client.query_properties(query, timeout_sec=TIMEOUT,
+                                                                           on_result=on_result))
         promise.then.connect(self.get_all_finished)
-        promise.catch.connect(lambda ex: display_exception(self, ex))
-        # FIXME: if an exception occurs, button is never re-enabled
+        promise.catch.connect(lambda ex: [display_exception(self, ex), self.ui.actionGetAll.setEnabled(True)])
 
         self.ui.properties.resizeColumnsToContents()
         self.ui.properties.horizontalHeader().setStretchLastSection(True) # TODO init
 
-    def get_all_finished(self, res):
+    def property_read(self, result: Tuple[Node, Property, Optional[bytes], float]):
+        node, property, raw_value, timestamp = result
+
+        # TODO: raw_value can be None on error -- perhaps we should signal it?
+        value = decode_value(property, raw_value) if raw_value is not None else None
+        self._pending_values[node.get_property_path(property)] = value
+
+        if value is not None and self.trend_plot is not None:
+            self.trend_plot.add_sample(node.get_property_path(property), timestamp, value)
+
+        if not self._value_flush_timer.isActive():
+            self._value_flush_timer.start()
+
+    def flush_values(self):
+        values, self._pending_values = self._pending_values, {}
+        self.property_table_model.set_property_values(values)
+
+    def plot_selected(self):
+        self._plotted = [(node, prop) for node, prop in self.property_table_model.selected_tuples() if prop.readable]
+
+        if not self._plotted:
+            self.ui.statusbar.showMessage("No readable properties selected", timeout=5000)
+            return
+
+        if self.trend_plot is None:
+            self.trend_plot = TrendPlot()
+            self.trend_plot.setWindowTitle("Trend")
+
+        self.trend_plot.set_series([node.get_property_path(prop) for node, prop in self._plotted])
+        self.trend_plot.show()
+        self.trend_plot.raise_()
+
+        self.auto_refresh_settings_changed()
+
+    def _is_plotting(self) -> bool:
+        return self.trend_plot is not None and self.trend_plot.isVisible() and bool(self._plotted)
+
+    def auto_refresh_settings_changed(self):
+        if self.ui.autoRefresh.isChecked() or self._is_plotting():
+            self._auto_refresh_timer.start(int(1000 / self.ui.autoRefreshRate.value()))
+        else:
+            self._auto_refresh_timer.stop()
+
+    def auto_refresh(self):
+        # skip a tick rather than piling up requests when the bus cannot keep up
+        if self._auto_refresh_in_flight:
+            return
+
+        if self.ui.autoRefresh.isChecked():
+            query = [(node, prop) for node, prop in self.property_table_model.tuples if prop.readable]
+        else:
+            query = []
+
+        if self._is_plotting():
+            queried = {node.get_property_path(prop) for node, prop in query}
+            query += [(node, prop) for node, prop in self._plotted if node.get_property_path(prop) not in queried]
+        elif not self.ui.autoRefresh.isChecked():
+            # the plot window has been closed
+            self._auto_refresh_timer.stop()
+
+        if not query:
+            return
+
+        def on_result(i: int, raw_value: Optional[bytes]):
+            self.worker.progress.emit((*query[i], raw_value, time.monotonic()))
+
+        def finished(*args):
+            self._auto_refresh_in_flight = False
+
+        self._auto_refresh_in_flight = True
+        promise = self.worker.submit(lambda: self.client.query_properties(query, timeout_sec=TIMEOUT,
+                                                                           on_result=on_result), quiet=True)
+        promise.then.connect(finished)
+        promise.catch.connect(finished)
+
+    def get_all_finished(self, results: List[Optional[bytes]]):
         self.ui.actionGetAll.setEnabled(True)
-        query: List[Tuple[Node, Property]]
-        results: List[bytes]
-        query, results = res
-        # print(query, results)
-
-        self.property_table_model.beginResetModel() # TODO
-        for (node, property), raw_value in zip(query, results):
-            key = node.get_property_path(property)
-            # TODO: raw_value can be None on error -- perhaps we should signal it?
-            value = decode_value(property, raw_value) if raw_value is not None else None
-            self.property_table_model.set_property_value(key, value)
-        self.property_table_model.endResetModel() # TODO
 
         self.ui.statusbar.showMessage(f"Queried {len(results)} properties", timeout=5000)
 
@@ -198,10 +264,9 @@ class MainWindow(QMainWindow):
 
         self.ui.actionGetAll.setEnabled(False)
 
-        promise = run_async(lambda: self.client.set_property(node, property, float(value), timeout_sec=TIMEOUT))
+        promise = self.worker.submit(lambda: self.client.set_property(node, property, float(value), timeout_sec=TIMEOUT))
         promise.then.connect(self.set_finished)
         promise.catch.connect(lambda ex: [display_exception(self, ex), self.ui.actionGetAll.setEnabled(True)])
-        # FIXME: if an exception occurs, button is never re-enabled
 
     def set_finished(self, result):
         self.ui.actionGetAll.setEnabled(True)
@@ -68,7 +68,7 @@ class PropertyTableModel(QAbstractTableModel):
 
     tuples: List[Tuple[Node, Property]]
     property_selected: Dict[str, bool]
-    values: Dict[str, str]
+    values: Dict[str, Any]
 
     property_value_changed: SignalInstance = Signal(Node, Property, str)
 
@@ -77,15 +77,115 @@ class PropertyTableModel(QAbstractTableModel):
 
         self.tuples = []
         self.property_selected = {}
+        # values are kept by property path, so they survive the rows coming and going
         self.values = {}
+        self._row_by_path: Dict[str, int] = {}
 
     def set_property_list(self, tuples: List[Tuple[Node, Property]]):
-        self.beginResetModel()
-        self.tuples = tuples
-        self.endResetModel()
+        """
+        Update the rows in place, inserting & removing only what changed, so that views keep their scroll position
+        and selection.
+        """
+        new_paths = [node.get_property_path(property) for node, property in tuples]
+        new_path_set = set(new_paths)
+
+        # remove rows that are no longer wanted, in contiguous runs from the bottom up
+        row = len(self.tuples) - 1
+
+        while row >= 0:
+            if self._path(row) in new_path_set:
+                row -= 1
+                continue
+
+            last = row
+
+            while row >= 0 and self._path(row) not in new_path_set:
+                row -= 1
+
+            self.beginRemoveRows(QModelIndex(), row + 1, last)
+            del self.tuples[row + 1:last + 1]
+            self.endRemoveRows()
+
+        kept_paths = [self._path(row) for row in range(len(self.tuples))]
+        kept_path_set = set(kept_paths)
+
+        if kept_paths != [path for path in new_paths if path in kept_path_set]:
+            # rows were reordered; not worth the trouble
+            self.beginResetModel()
+            self.tuples = list(tuples)
+            self._update_index()
+            self.endResetModel()
+            return
+
+        # insert new rows, in contiguous runs
+        row = 0
+        i = 0
+
+        while i < len(tuples):
+            if row < len(self.tuples) and self._path(row) == new_paths[i]:
+                # the node may have been re-discovered
+                self.tuples[row] = tuples[i]
+                row += 1
+                i += 1
+                continue
+
+            first = i
+
+            while i < len(tuples) and (row >= len(self.tuples) or self._path(row) != new_paths[i]):
+                i += 1
+
+            self.beginInsertRows(QModelIndex(), row, row + (i - first) - 1)
+            self.tuples[row:row] = tuples[first:i]
+            self.endInsertRows()
+
+            row += i - first
+
+        self._update_index()
+
+    def selected_tuples(self) -> List[Tuple[Node, Property]]:
+        return [(node, property) for node, property in self.tuples
+                if self.property_selected.get(node.get_property_path(property), False)]
 
     def set_property_value(self, key: str, value: Any):
-        self.values[key] = value
+        self.set_property_values({key: value})
+
+    def set_property_values(self, values: Dict[str, Any]):
+        """
+        Store new values; views are only notified of the cells that actually changed.
+        """
+        changed_rows = []
+
+        for path, value in values.items():
+            if path in self.values and self.values[path] == value:
+                continue
+
+            self.values[path] = value
+
+            row = self._row_by_path.get(path)
+
+            if row is not None:
+                changed_rows.append(row)
+
+        # one notification per contiguous run of rows
+        changed_rows.sort()
+        i = 0
+
+        while i < len(changed_rows):
+            first = i
+
+            while i + 1 < len(changed_rows) and changed_rows[i + 1] == changed_rows[i] + 1:
+                i += 1
+
+            self.dataChanged.emit(self.index(changed_rows[first], self.VALUE_COLUMN),
+                                  self.index(changed_rows[i], self.VALUE_COLUMN))
+            i += 1
+
+    def _path(self, row: int) -> str:
+        node, property = self.tuples[row]
+        return node.get_property_path(property)
+
+    def _update_index(self):
+        self._row_by_path = {self._path(row): row for row in range(len(self.tuples))}
 
     def data(self, index, role):
         if role == Qt.TextAlignmentRole:
@@ -119,20 +219,18 @@ class PropertyTableModel(QAbstractTableModel):
 
     def setData(self, index: QModelIndex, value: Any, role) -> bool:
         # print("setData", index, value, role)
-        # TODO: per https://doc.qt.io/qt-5/qabstractitemmodel.html#setData,
-        #       The dataChanged() signal should be emitted if the data was successfully set.
-
         if index.column() == self.ADDRESS_COLUMN and role == Qt.CheckStateRole:
             device, property = self.tuples[index.row()]
             property_path = device.get_property_path(property)
             self.property_selected[property_path] = (value == Qt.Checked)
+            self.dataChanged.emit(index, index)
             return True
         elif index.column() == self.VALUE_COLUMN and role == Qt.EditRole:
             assert isinstance(value, str)
 
             node, property = self.tuples[index.row()]
             property_path = node.get_property_path(property)
-            self.values[property_path] = value
+            self.set_property_value(property_path, value)
 
             self.property_value_changed.emit(node, property, value)
             return True
@@ -0,0 +1,102 @@
+import math
+import time
+from typing import Dict, List, Optional
+
+from PySide2.QtCore import QPointF, Qt, QTimer
+from PySide2.QtGui import QColor, QPainter, QPaintEvent, QPen, QPolygonF
+from PySide2.QtWidgets import QWidget
+
+from .series import RingBuffer, decimate_min_max
+
+
+REDRAW_INTERVAL_MS = 33
+
+SERIES_COLORS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#17becf"]
+
+
+class TrendPlot(QWidget):
+    """
+    Live plot of property values over the last `window_sec` seconds.
+
+    Samples are buffered per property path; redraws happen at a fixed rate and only when new samples have arrived.
+    """
+
+    def __init__(self, parent: Optional[QWidget] = None, window_sec: float = 60.0):
+        super().__init__(parent)
+
+        self.window_sec = window_sec
+        self.buffers: Dict[str, RingBuffer] = {}
+
+        self._dirty = False
+        self._redraw_timer = QTimer(self)
+        self._redraw_timer.timeout.connect(self._redraw_if_dirty)
+        self._redraw_timer.start(REDRAW_INTERVAL_MS)
+
+        self.setMinimumSize(400, 200)
+
+    def set_series(self, paths: List[str]):
+        # buffers of properties which stay plotted are kept
+        self.buffers = {path: self.buffers.get(path) or RingBuffer() for path in paths}
+        self._dirty = True
+
+    def add_sample(self, path: str, timestamp: float, value: float):
+        buffer = self.buffers.get(path)
+
+        if buffer is None or not math.isfinite(value):
+            return
+
+        buffer.append(timestamp, value)
+        self._dirty = True
+
+    def _redraw_if_dirty(self):
+        if self._dirty:
+            self._dirty = False
+            self.update()
+
+    def paintEvent(self, event: QPaintEvent):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.white)
+
+        end = time.monotonic()
+        start = end - self.window_sec
+        width = self.width()
+        height = self.height()
+
+        series = []
+
+        for path, buffer in self.buffers.items():
+            times, values = buffer.get_since(start)
+            series.append((path, *decimate_min_max(times, values, start, end, width)))
+
+        nonempty = [y for _, _, y in series if len(y)]
+
+        if nonempty:
+            y_min = min(y.min() for y in nonempty)
+            y_max = max(y.max() for y in nonempty)
+        else:
+            y_min, y_max = 0.0, 1.0
+
+        if y_max == y_min:
+            y_min, y_max = y_min - 1, y_max + 1
+
+        # leave some room around the curves
+        margin = (y_max - y_min) * 0.05
+        y_min -= margin
+        y_max += margin
+        y_scale = height / (y_max - y_min)
+
+        for i, (path, x, y) in enumerate(series):
+            color = QColor(SERIES_COLORS[i % len(SERIES_COLORS)])
+
+            if len(x):
+                y_px = height - (y - y_min) * y_scale
+                painter.setPen(QPen(color, 1))
+                painter.drawPolyline(QPolygonF([QPointF(px, py) for px, py in zip(x.tolist(), y_px.tolist())]))
+
+            painter.setPen(color)
+            painter.drawText(5, 15 * (i + 1), path)
+
+        painter.setPen(Qt.black)
+        painter.drawText(width - 100, 15, f"{y_max:.6g}")
+        painter.drawText(width - 100, height - 5, f"{y_min:.6g}")
+        painter.end()
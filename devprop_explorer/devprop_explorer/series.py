@@ -0,0 +1,81 @@
+"""
+Sample buffering & decimation for the trend plot; kept free of Qt, so that it can be tested on its own.
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+
+# Samples kept per property; at 20 Hz, this is well over an hour
+RING_BUFFER_CAPACITY = 100_000
+
+
+class RingBuffer:
+    """
+    Fixed-size buffer of (timestamp, value) samples; once full, the oldest samples are overwritten.
+    Timestamps are expected to be non-decreasing.
+    """
+
+    def __init__(self, capacity: int = RING_BUFFER_CAPACITY):
+        self.times = np.empty(capacity, dtype=np.float64)
+        self.values = np.empty(capacity, dtype=np.float64)
+        self._head = 0      # next slot to write
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, timestamp: float, value: float):
+        self.times[self._head] = timestamp
+        self.values[self._head] = value
+        self._head = (self._head + 1) % len(self.times)
+        self._size = min(self._size + 1, len(self.times))
+
+    def get_since(self, start: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: (timestamps, values) of the samples taken at or after `start`, in chronological order
+        """
+        if self._size < len(self.times):
+            segments = [slice(0, self._size)]
+        else:
+            segments = [slice(self._head, len(self.times)), slice(0, self._head)]
+
+        times = []
+        values = []
+
+        # each segment is sorted on its own, so only the visible part is ever copied
+        for segment in segments:
+            segment_times = self.times[segment]
+            first = np.searchsorted(segment_times, start)
+            times.append(segment_times[first:])
+            values.append(self.values[segment][first:])
+
+        return np.concatenate(times), np.concatenate(values)
+
+
+def decimate_min_max(times: np.ndarray, values: np.ndarray, start: float, end: float,
+                     width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reduce samples to at most two points (min, max) per pixel column, which preserves the envelope of the signal,
+    spikes included.
+
+    :return: (x in pixels, values)
+    """
+    if len(times) == 0 or width <= 0 or end <= start:
+        return np.empty(0), np.empty(0)
+
+    columns = ((times - start) * (width / (end - start))).astype(np.int64)
+    np.clip(columns, 0, width - 1, out=columns)
+
+    # columns are non-decreasing, so each one is a contiguous run of samples
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(columns)) + 1))
+    mins = np.minimum.reduceat(values, starts)
+    maxs = np.maximum.reduceat(values, starts)
+
+    x = np.repeat(columns[starts], 2).astype(np.float64)
+    y = np.empty(2 * len(starts))
+    y[0::2] = mins
+    y[1::2] = maxs
+
+    return x, y
@@ -0,0 +1,87 @@
+import queue
+import traceback
+from typing import Callable, Optional
+
+from PySide2.QtCore import QObject, QThread, Signal, SignalInstance
+
+from .configtoolsharedlogger import logger
+
+
+class SignalPromise(QObject):
+    then: SignalInstance = Signal(object)
+    catch: SignalInstance = Signal(BaseException)
+
+    def reject(self, error: BaseException):
+        self.catch.emit(error)
+
+    def resolve(self, result):
+        self.then.emit(result)
+
+
+class BusWorker(QThread):
+    """
+    Single long-lived thread executing all bus commands of the GUI, one after another, in submission order.
+
+    Commands run on the worker thread; their results are delivered through signals, which Qt queues to the receiver's
+    (GUI) thread. Commands may emit `progress` to stream partial results while they are still running.
+    """
+
+    # emitted with True when the worker picks up a command, False once the queue is drained
+    busy_changed: SignalInstance = Signal(bool)
+
+    # free-form partial results, e.g. (node, property, raw value) while reading a batch of properties
+    progress: SignalInstance = Signal(object)
+
+    def __init__(self):
+        super().__init__()
+
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+
+        # promises are referenced until their result has been delivered, lest they be garbage-collected too early
+        self._promises = set()
+
+    def submit(self, function: Callable[[], object], quiet: bool = False) -> SignalPromise:
+        """
+        :param quiet: do not report the worker as busy because of this command (for periodic background commands)
+        """
+        # the promise must be created here, so that it lives in the GUI thread
+        promise = SignalPromise()
+        promise.then.connect(self._forget_promise)
+        promise.catch.connect(self._forget_promise)
+        self._promises.add(promise)
+
+        self._queue.put((function, promise, quiet))
+        return promise
+
+    def _forget_promise(self, *args):
+        self._promises.discard(self.sender())
+
+    def stop(self):
+        self._queue.put(None)
+        self.wait()
+
+    def run(self):
+        busy = False
+
+        while True:
+            if busy and self._queue.empty():
+                busy = False
+                self.busy_changed.emit(False)
+
+            item = self._queue.get()
+
+            if item is None:
+                break
+
+            function, promise, quiet = item
+
+            if not busy and not quiet:
+                busy = True
+                self.busy_changed.emit(True)
+
+            try:
+                promise.resolve(function())
+            except BaseException as ex:
+                # necessary to catch all exceptions here, otherwise the thread dies and the app hangs on quit
+                logger.debug("".join(traceback.format_exception(type(ex), ex, ex.__traceback__)))
+                promise.reject(ex)
@@ -0,0 +1,50 @@
+import numpy as np
+
+from devprop_explorer.series import RingBuffer, decimate_min_max
+
+
+def test_ring_buffer_get_since():
+    buffer = RingBuffer(capacity=5)
+
+    for t in range(3):
+        buffer.append(float(t), t * 10.0)
+
+    times, values = buffer.get_since(1.0)
+    assert times.tolist() == [1.0, 2.0]
+    assert values.tolist() == [10.0, 20.0]
+
+    # wrap around: the oldest samples are overwritten, the order stays chronological
+    for t in range(3, 8):
+        buffer.append(float(t), t * 10.0)
+
+    assert len(buffer) == 5
+    times, values = buffer.get_since(0.0)
+    assert times.tolist() == [3.0, 4.0, 5.0, 6.0, 7.0]
+    assert values.tolist() == [30.0, 40.0, 50.0, 60.0, 70.0]
+
+    times, _ = buffer.get_since(5.5)
+    assert times.tolist() == [6.0, 7.0]
+    assert len(buffer.get_since(8.0)[0]) == 0
+
+
+def test_decimate_min_max():
+    times = np.arange(100) / 10
+    values = np.zeros(100)
+    values[37] = 5.0
+    values[62] = -3.0
+
+    x, y = decimate_min_max(times, values, start=0.0, end=10.0, width=10)
+
+    # one (min, max) pair per pixel column, with the spikes preserved
+    assert x.tolist() == [float(column) for column in range(10) for _ in range(2)]
+    assert y[6:8].tolist() == [0.0, 5.0]
+    assert y[12:14].tolist() == [-3.0, 0.0]
+    assert y.max() == 5.0 and y.min() == -3.0
+
+
+def test_decimate_min_max_empty():
+    x, y = decimate_min_max(np.empty(0), np.empty(0), start=0.0, end=1.0, width=100)
+    assert len(x) == 0 and len(y) == 0
+
+    x, y = decimate_min_max(np.arange(3.0), np.arange(3.0), start=1.0, end=1.0, width=100)
+    assert len(x) == 0
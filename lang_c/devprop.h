@@ -25,10 +25,19 @@ typedef enum dp_ErrorCode {
     DP_VALUE_ERROR = -5,
 } dp_ErrorCode;
 
+enum {
+    // value is fixed at compile time and served directly from the property table, without calling user code
+    DP_PROPERTY_CONST = 1 << 0,
+};
+
+// One entry of the property dispatch table, which is indexed directly by (property index - 1)
 typedef struct dp_Property {
     dp_DataType type;
+    uint8_t width;              // size of the value in bytes
+    uint8_t flags;              // DP_PROPERTY_*
     dp_GenericCallback user_get_value;
     dp_GenericCallback user_set_value;
+    uint32_t const_value;       // raw value, valid only if DP_PROPERTY_CONST is set
 
     // TODO: limits for WRITE operations
 } dp_Property;
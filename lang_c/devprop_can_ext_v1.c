@@ -26,6 +26,7 @@ typedef struct {
 static int get_property_value(dp_Property const* prop, CanMsgBuffer* buffer_out);
 static int set_property_value(dp_Property const* prop, uint8_t const* bytes, size_t length, CanMsgBuffer* buffer_out);
 static void send_error(dp_Node* inst, uint32_t id, dp_ErrorCode error_code);
+static void store_value_le(CanMsgBuffer* buffer_out, uint32_t value, size_t width);
 
 void dp_node_init(dp_Node* inst,
                   int node_id,
@@ -83,7 +84,7 @@ void dp_handle_message_ext(dp_Node* inst, uint32_t id, uint8_t const* data, size
         case DPP_READ_PROPERTY: {
             int real_property_index = property_index - 1;
             if (real_property_index < 0 ||
-                    real_property_index > inst->num_properties ||
+                    real_property_index >= inst->num_properties ||
                     data_length != 0) {
                 send_error(inst, id, DP_PROTOCOL_ERROR);
                 break;
@@ -105,7 +106,7 @@ void dp_handle_message_ext(dp_Node* inst, uint32_t id, uint8_t const* data, size
 
         case DPP_WRITE_PROPERTY: {
             int real_property_index = property_index - 1;
-            if (real_property_index < 0 || real_property_index > inst->num_properties) {
+            if (real_property_index < 0 || real_property_index >= inst->num_properties) {
                 send_error(inst, id, DP_PROTOCOL_ERROR);
                 break;
             }
@@ -128,55 +129,44 @@ void dp_handle_message_ext(dp_Node* inst, uint32_t id, uint8_t const* data, size
 
 static int get_property_value(dp_Property const* prop, CanMsgBuffer* buffer_out) {
     int rc = 0;
+    uint32_t value;
 
-    if (!prop->user_get_value) {
-        return DP_VALUE_ERROR;
+    if (prop->flags & DP_PROPERTY_CONST) {
+        // answered straight from the (flash-resident) property table
+        value = prop->const_value;
     }
+    else {
+        if (!prop->user_get_value) {
+            return DP_VALUE_ERROR;
+        }
 
-    switch (prop->type) {
-        case DP_UINT8: {
-            uint8_t value = ((get_value_uint8_t)(prop->user_get_value))(&rc);
+        switch (prop->type) {
+            case DP_UINT8:
+                value = ((get_value_uint8_t)(prop->user_get_value))(&rc);
+                break;
 
-            if (rc >= 0) {
-                assert(rc == 0);
-                buffer_out->bytes[0] = (value & 0xff);
-                return 1;
-            }
-            break;
-        }
+            case DP_UINT16:
+                value = ((get_value_uint16_t)(prop->user_get_value))(&rc);
+                break;
 
-        case DP_UINT16: {
-            uint16_t value = ((get_value_uint16_t)(prop->user_get_value))(&rc);
+            case DP_UINT32:
+                value = ((get_value_uint32_t)(prop->user_get_value))(&rc);
+                break;
 
-            if (rc >= 0) {
-                assert(rc == 0);
-                buffer_out->bytes[0] = (value & 0xff);
-                buffer_out->bytes[1] = ((value >> 8) & 0xff);
-                return 2;
-            }
-            break;
+            default:
+                // property has an unsupported (or invalid) type
+                return DP_NOT_IMPLEMENTED;
         }
 
-        case DP_UINT32: {
-            uint32_t value = ((get_value_uint32_t)(prop->user_get_value))(&rc);
-
-            if (rc >= 0) {
-                assert(rc == 0);
-                buffer_out->bytes[0] = (value & 0xff);
-                buffer_out->bytes[1] = ((value >> 8) & 0xff);
-                buffer_out->bytes[2] = ((value >> 16) & 0xff);
-                buffer_out->bytes[3] = ((value >> 24) & 0xff);
-                return 4;
-            }
-            break;
+        if (rc < 0) {
+            return rc;
         }
 
-        default:
-            // property has an unsupported (or invalid) type
-            rc = DP_NOT_IMPLEMENTED;
+        assert(rc == 0);
     }
 
-    return rc;
+    store_value_le(buffer_out, value, prop->width);
+    return prop->width;
 }
 
 uint32_t dpp_make_id(int dir, int node_id, dpp_Opcode opcode, int property_index) {
@@ -224,63 +214,44 @@ static int set_property_value(dp_Property const* prop, uint8_t const* value_byte
         return DP_VALUE_ERROR;
     }
 
-    switch (prop->type) {
-        case DP_UINT8: {
-            if (value_length != 1) {
-                return DP_PROTOCOL_ERROR;
-            }
+    if (value_length != prop->width) {
+        return DP_PROTOCOL_ERROR;
+    }
 
-            uint8_t value = value_bytes[0];
-            value = ((set_value_uint8_t)(prop->user_set_value))(value, &rc);
+    uint32_t value = 0;
+    for (size_t i = 0; i < value_length; i++) {
+        value |= (uint32_t) value_bytes[i] << (8 * i);
+    }
 
-            if (rc >= 0) {
-                assert(rc == 0);
-                buffer_out->bytes[0] = (value & 0xff);
-                return 1;
-            }
+    switch (prop->type) {
+        case DP_UINT8:
+            value = ((set_value_uint8_t)(prop->user_set_value))((uint8_t) value, &rc);
             break;
-        }
 
-        case DP_UINT16: {
-            if (value_length != 2) {
-                return DP_PROTOCOL_ERROR;
-            }
-
-            uint16_t value = value_bytes[0] | (value_bytes[1] << 8);
-            value = ((set_value_uint16_t)(prop->user_set_value))(value, &rc);
-
-            if (rc >= 0) {
-                assert(rc == 0);
-                buffer_out->bytes[0] = (value & 0xff);
-                buffer_out->bytes[1] = ((value >> 8) & 0xff);
-                return 2;
-            }
+        case DP_UINT16:
+            value = ((set_value_uint16_t)(prop->user_set_value))((uint16_t) value, &rc);
             break;
-        }
 
-        case DP_UINT32: {
-            if (value_length != 4) {
-                return DP_PROTOCOL_ERROR;
-            }
-
-            uint32_t value = value_bytes[0] | (value_bytes[1] << 8) | (value_bytes[2] << 16) | (value_bytes[3] << 24);
+        case DP_UINT32:
             value = ((set_value_uint32_t)(prop->user_set_value))(value, &rc);
-
-            if (rc >= 0) {
-                assert(rc == 0);
-                buffer_out->bytes[0] = (value & 0xff);
-                buffer_out->bytes[1] = ((value >> 8) & 0xff);
-                buffer_out->bytes[2] = ((value >> 16) & 0xff);
-                buffer_out->bytes[3] = ((value >> 24) & 0xff);
-                return 4;
-            }
             break;
-        }
 
         default:
             // property has an unsupported (or invalid) type
-            rc = DP_NOT_IMPLEMENTED;
+            return DP_NOT_IMPLEMENTED;
     }
 
-    return rc;
+    if (rc < 0) {
+        return rc;
+    }
+
+    assert(rc == 0);
+    store_value_le(buffer_out, value, prop->width);
+    return prop->width;
+}
+
+static void store_value_le(CanMsgBuffer* buffer_out, uint32_t value, size_t width) {
+    for (size_t i = 0; i < width; i++) {
+        buffer_out->bytes[i] = (value >> (8 * i)) & 0xff;
+    }
 }
@@ -38,6 +38,10 @@ int main() {
     id = dpp_make_id(DPP_CLIENT_TO_DEVICE, DP_NODE_ID_FSE10_HELLO, DPP_READ_PROPERTY, INDEX_TEST_UINT16_RW);
     mock_received_message(&inst, id, NULL, 0);
 
+    // simulate client request: READ PROPERTY [6] (const, served from property table)
+    id = dpp_make_id(DPP_CLIENT_TO_DEVICE, DP_NODE_ID_FSE10_HELLO, DPP_READ_PROPERTY, INDEX_TEST_UINT8_CONST);
+    mock_received_message(&inst, id, NULL, 0);
+
     return 0;
 }
 